@@ -0,0 +1,442 @@
+"""Queries for and restores xmatters instance data using asyncio
+
+An alternative to the processor module that runs the same phases (Sites,
+Users, Devices, Groups, and Shifts) on a single thread, keeping many
+requests in flight at once.  The number of concurrent requests is bounded
+by a semaphore sized from config.concurrency and, with config.adaptive, by
+the limit of each endpoint family.
+
+Everything but the transport and the scheduling is taken from the
+processor module: its restore steps (such as processor._restore_user())
+prepare the payloads, decide which requests to make, and keep the shared id
+dictionaries, while this module makes their requests with aiohttp (see
+_run()).  So both engines restore exactly the same data.
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+# pylint: disable=protected-access
+
+import asyncio
+import contextlib
+import functools
+import signal
+import sys
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+import config
+import common_logger
+import concurrency_control
+import processor
+import request_metrics
+import retry_policy
+import scheduler
+
+_logger = None
+_session = None
+_semaphore = None
+_policy = None
+_controller = None
+_metrics = None
+
+
+class _Response():
+    """Holds the status and body of a completed aiohttp response
+
+    Mirrors the parts of a requests Response used by the processor, so that
+    its restore steps can be shared.
+    """
+
+    def __init__(self, status_code: int, content: bytes, headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+async def _request(method: str, url: str, data: bytes = None, params: dict = None,
+                   resilient: bool = False):
+    """Makes a request through the shared aiohttp session
+
+    Waits on the concurrency semaphore before sending, so no more than
+    config.concurrency requests are in flight at once (and, with
+    config.adaptive, on a slot of the URL's endpoint family).  Temporary failures
+    are retried following the run's RetryPolicy, as with the processor's
+    ResilientSession, and every attempt is counted and timed in the run's
+    RequestMetrics.
+
+    Args:
+        method (str): The HTTP method
+        url (str): The location to request
+        data (bytes): The JSON payload to send, if any
+        params (dict): The query parameters, if any
+        resilient (bool): If True, also retry 501, and allow twice the
+            usual attempts
+
+    Return:
+        _Response: The response, or None if the request could not be made
+    """
+    loop = asyncio.get_running_loop()
+    counter = 0
+    while True:
+        counter += 1
+
+        # Hold back while the instance has asked us to slow down
+        pause = _policy.pause()
+        if pause > 0:
+            await asyncio.sleep(pause)
+
+        try:
+            async with _slot(url) as outcome:
+                async with _semaphore:
+                    started = loop.time()
+                    try:
+                        async with _session.request(method, url, data=data, params=params) as resp:
+                            response = _Response(resp.status, await resp.read(), resp.headers)
+                    except (aiohttp.ClientError, asyncio.TimeoutError):
+                        _metrics.record(method, url, None, loop.time() - started)
+                        raise
+                    _metrics.record(method, url, response.status_code, loop.time() - started,
+                                    request_metrics.body_size(data), len(response.content))
+                outcome['status_code'] = response.status_code
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            delay = _policy.backoff(counter, resilient=resilient)
+            if delay is None:
+                _give_up()
+                _logger.error(config.ERR_REQUEST_EXCEPTION_MSG, url, repr(e))
+                return None
+            _logger.warning("Got recoverable error %s from %s %s, retry #%s in %.1fs", repr(e), method, url, counter, delay)
+            await asyncio.sleep(delay)
+            continue
+
+        if _policy.should_retry(response.status_code, resilient):
+            delay = _policy.backoff(counter, response.status_code, response.headers.get('Retry-After'), resilient)
+            if delay is not None:
+                _logger.warning("Got recoverable error [%s] from %s %s, retry #%s in %.1fs", response.status_code, method, url, counter, delay)
+                await asyncio.sleep(delay)
+                continue
+            _give_up()
+
+        return response
+
+@contextlib.asynccontextmanager
+async def _unlimited_slot():
+    yield {}
+
+def _slot(url: str):
+    if _controller is None:
+        return _unlimited_slot()
+    return _controller.async_slot(url)
+
+def _give_up():
+    if _policy.exhausted():
+        _logger.warning('The retry budget of %d retries is spent, so failed requests will no longer be retried.', config.retry_budget)
+
+async def _map_tasks(func, items):
+    """Runs func as a task for each item, with a bounded read-ahead window
+
+    Args:
+        func (coroutine function): Called with each item
+        items (iterable): The items to process
+
+    Returns:
+        object: The result of func for each item, in completion order
+    """
+    max_pending = config.concurrency * 2
+    pending = set()
+    for item in items:
+        if len(pending) >= max_pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+        pending.add(asyncio.ensure_future(func(item)))
+    for task in asyncio.as_completed(pending):
+        yield await task
+
+async def _run(func, *args):
+    """Runs the steps of a restore, making each request they yield
+
+    Runs the generator functions of the processor module (such as
+    processor._add_user()) in the same way as processor._run(), but sends
+    their requests with _request(), so many of them can wait at once.
+
+    Args:
+        func (function): The generator function, e.g. processor._restore_site
+        args: The arguments to call it with
+
+    Return:
+        object: What the steps returned
+    """
+    steps = func(*args)
+    try:
+        request = next(steps)
+        while True:
+            response = await _request(request.method, request.url, request.data,
+                                      request.params, request.resilient)
+            request = steps.send(response)
+    except StopIteration as stop:
+        return stop.value
+
+async def _process_sites():
+    """Reads and restored the instances Site objects, returning True if
+    every one was restored"""
+    num_lines = 0
+    num_sites = 0
+    records = processor._changed(processor._read_capture(config.sites_filename), 'site', {'site'})
+    records = processor._pending(records, 'site', lambda site: site['name'])
+    async for restored in _map_tasks(functools.partial(_run, processor._restore_site), records):
+        num_lines += 1
+        num_sites += 1 if restored else 0
+
+    _logger.info("Restored %d of a possible %d Sites.", num_sites, num_lines)
+    return num_sites == num_lines
+
+async def _process_users(include_devices: bool):
+    """Reads and restored the instances User objects
+
+    Args:
+        include_devices (bool): If True, restore the User's devices too
+
+    Return:
+        bool: True if every User was restored
+    """
+    # Add the users a level at a time, so each one's supervisors exist
+    num_lines = 0
+    num_users = 0
+    restore_user = functools.partial(_run, processor._restore_user, include_devices)
+    levels, spans = processor._order_users({'user', 'devices'} if include_devices else {'user'})
+    for records in processor._read_levels(config.users_filename, levels, spans):
+        async for restored in _map_tasks(restore_user, records):
+            num_lines += 1
+            num_users += 1 if restored else 0
+
+    _logger.info("Restored %d of a possible %d Users.", num_users, num_lines)
+    return num_users == num_lines
+
+async def _process_supervisors():
+    """Updates the supervisors of the restored User objects, returning True
+    if every one was updated"""
+    num_users = 0
+    num_lines = 0
+    later = processor._supervisors_left()
+    async for num_updated in _map_tasks(functools.partial(_run, processor._restore_supervisors), later):
+        num_lines += 1
+        num_users += num_updated
+    _logger.info("Updated supervisors for %d of a possible %d Users.", num_users, len(later))
+    return num_users == num_lines
+
+async def _process_devices():
+    """Reads and restored the instances User's Device objects, returning
+    True if every one was restored"""
+    _logger.info('Processing Devices independent of Users.')
+    max_devices = 0
+    num_devices = 0
+    num_lines = 0
+    records = processor._changed(processor._read_capture(config.users_filename, 'user', config.only_users),
+                                 'user', {'devices'})
+    records = processor._pending(records, 'devices', lambda full_user_obj: full_user_obj['user']['targetName'])
+    async for user_devices in _map_tasks(functools.partial(_run, processor._add_user_devices), records):
+        num_lines += 1
+        max_devices += user_devices[0]
+        num_devices += user_devices[1]
+
+    _logger.info('Restored %d of a possible %d Devices from %d Users.', num_devices, max_devices, num_lines)
+    return num_devices == max_devices
+
+async def _process_shifts():
+    """Reads and restored the instances Group's Shift objects, when the
+    Groups themselves are not being restored, returning True if every Shift
+    and Shift Member was restored"""
+    _logger.info('Processing Shifts and Shift Members.')
+    records = processor._changed(processor._read_capture(config.groups_filename, 'group', config.only_groups),
+                                 'group', {'shifts'})
+    group_shifts = ((full_group_obj['group']['targetName'], full_group_obj['shifts'])
+                    for full_group_obj in records)
+
+    counts = {}
+    group_shifts = processor._pending(group_shifts, 'shifts', lambda group: group[0])
+    async for result in _map_tasks(functools.partial(_run, processor._restore_group_shifts), group_shifts):
+        processor._tally(counts, 'shifts', result)
+
+    processor._log_tally(counts, 'shifts')
+    return processor._tally_complete(counts, 'shifts')
+
+async def _process_groups(include_shifts: bool):
+    """Reads and restored the instances Groups objects, each followed by its
+    Shifts if include_shifts, a level at a time as processor._process_groups()
+
+    Args:
+        include_shifts (bool): If True, restore the Group's shifts too
+
+    Return:
+        tuple: True if every Group was restored, and True if every Shift
+            and Shift Member was
+    """
+    levels, spans, parts, later = processor._order_groups(include_shifts)
+
+    # Keep hold of the Shifts left until every Group exists
+    later_shifts = []
+    def _retain(records):
+        for full_group_obj in records:
+            target_name = full_group_obj['group']['targetName']
+            if target_name in later:
+                later_shifts.append((target_name, full_group_obj['shifts']))
+            yield full_group_obj
+
+    counts = {}
+    restore_group = functools.partial(_run, processor._restore_group_parts, parts)
+    for records in processor._read_levels(config.groups_filename, levels, spans):
+        async for results in _map_tasks(restore_group, _retain(records)):
+            for phase, result in results.items():
+                processor._tally(counts, phase, result)
+    async for result in _map_tasks(functools.partial(_run, processor._restore_group_shifts), later_shifts):
+        processor._tally(counts, 'shifts', result)
+
+    processor._log_tally(counts, 'groups')
+    if include_shifts:
+        processor._log_tally(counts, 'shifts')
+    return (processor._tally_complete(counts, 'groups'), processor._tally_complete(counts, 'shifts'))
+
+async def _run_scheduled(objects_to_process: list):
+    """Runs the requested phases overlapped, as processor._run_scheduled()
+
+    Args:
+        objects_to_process (list): The list of object types to restore.
+    """
+    if set(objects_to_process) & {'sites', 'users', 'groups'}:
+        await _run(processor._prefetch_sites)
+    if config.prefetch and set(objects_to_process) & {'users', 'devices', 'groups', 'shifts'}:
+        await _run(processor._prefetch_users)
+    if config.prefetch and set(objects_to_process) & {'groups', 'shifts'}:
+        await _run(processor._prefetch_groups)
+
+    restore = {
+        'sites': processor._restore_site,
+        'users': functools.partial(processor._restore_user, 'devices' in objects_to_process),
+        'supervisors': processor._restore_supervisors,
+        'devices': processor._add_user_devices,
+        'groups': processor._restore_group,
+        'shifts': processor._restore_group_shifts,
+    }
+    counts = {}
+    async def run(phase, record):
+        processor._tally(counts, phase, await _run(restore[phase], record))
+    def finish(phase):
+        processor._log_tally(counts, phase)
+        processor._finish_tallied(counts, phase)
+
+    tasks = scheduler.AsyncScheduler(config.concurrency, finish)
+    for step in processor._schedule(objects_to_process):
+        if step[0] == 'open':
+            tasks.open(step[1])
+        elif step[0] == 'close':
+            tasks.close(step[1])
+        else:
+            key, record, deps = step[1:]
+            await tasks.submit(key, functools.partial(run, key[0], record), deps)
+    await tasks.wait()
+
+async def _process(objects_to_process: list):
+    """Runs the requested phases on a shared aiohttp session
+
+    Args:
+        objects_to_process (list): The list of object types to restore.
+    """
+    global _session # pylint: disable=global-statement
+    global _semaphore # pylint: disable=global-statement
+    global _policy # pylint: disable=global-statement
+    global _controller # pylint: disable=global-statement
+
+    _semaphore = asyncio.Semaphore(config.concurrency)
+    _policy = retry_policy.RetryPolicy(config.retry_attempts, config.retry_budget)
+    if config.adaptive:
+        _controller = concurrency_control.ConcurrencyController(config.concurrency)
+    connector = aiohttp.TCPConnector(limit=config.concurrency)
+    auth = aiohttp.BasicAuth(config.basic_auth.username, config.basic_auth.password)
+    # Time out stalled connections and responses, rather than the whole
+    # request, as a request may first wait a while for a free connection
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=config.connect_timeout,
+                                    sock_read=config.read_timeout)
+    async with aiohttp.ClientSession(connector=connector, auth=auth, timeout=timeout,
+                                     headers={'Content-Type': 'application/json'}) as session:
+        _session = session
+
+        if config.overlap:
+            await _run_scheduled(objects_to_process)
+            return
+
+        if set(objects_to_process) & {'sites', 'users', 'groups'}:
+            await _run(processor._prefetch_sites)
+        if config.prefetch and set(objects_to_process) & {'users', 'devices', 'groups', 'shifts'}:
+            await _run(processor._prefetch_users)
+
+        finish_phase = processor._finish_phase
+        if 'sites' in objects_to_process and processor._phase_pending('sites'):
+            finish_phase('sites', await _process_sites())
+
+        if 'users' in objects_to_process:
+            users_complete = True
+            if processor._phase_pending('users'):
+                users_complete = await _process_users('devices' in objects_to_process)
+                finish_phase('users', users_complete)
+            if processor._phase_pending('supervisors'):
+                finish_phase('supervisors', await _process_supervisors() and users_complete)
+        elif 'devices' in objects_to_process and processor._phase_pending('devices'):
+            finish_phase('devices', await _process_devices())
+
+        if config.prefetch and set(objects_to_process) & {'groups', 'shifts'}:
+            await _run(processor._prefetch_groups)
+
+        if 'groups' in objects_to_process and processor._phase_pending('groups'):
+            include_shifts = 'shifts' in objects_to_process and processor._phase_pending('shifts')
+            groups_complete, shifts_complete = await _process_groups(include_shifts)
+            finish_phase('groups', groups_complete)
+            if include_shifts:
+                finish_phase('shifts', shifts_complete)
+        elif 'shifts' in objects_to_process and processor._phase_pending('shifts'):
+            finish_phase('shifts', await _process_shifts())
+
+def process(objects_to_process: list):
+    """Restore objects for this instance using the asyncio engine.
+
+    Runs the same phases, in the same order, as processor.process().
+
+    Args:
+        objects_to_process (list): The list of object types to restore.
+    """
+    global _logger # pylint: disable=global-statement
+    global _metrics # pylint: disable=global-statement
+
+    ### Get the current logger (shared with the processor helpers)
+    _logger = common_logger.get_logger()
+    processor._logger = _logger
+    _logger.debug('Starting asyncio engine with a concurrency of %d', config.concurrency)
+
+    processor._journal = processor._open_journal()
+    processor._cache = processor._open_cache()
+    _metrics = request_metrics.RequestMetrics()
+    previous_handler = signal.signal(signal.SIGINT, processor._on_sigint)
+    try:
+        asyncio.run(_process(objects_to_process))
+    except KeyboardInterrupt:
+        _logger.warning(config.ERR_INTERRUPTED_MSG, config.journal_filename)
+        sys.exit(config.ERR_INTERRUPTED_CODE)
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+        processor._journal.close()
+        processor._close_cache()
+        if _policy is not None:
+            _logger.info('Retried %d requests.', _policy.retries)
+        if _controller is not None:
+            _controller.log_limits()
+        processor._write_metrics(_metrics)
+
+def main():
+    """In case we need to execute the module directly"""
+    pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+# encoding: utf-8
+"""Measures how fast a capture restores, against a local mock instance.
+
+Starts mock_server.MockServer on a free port, restores the given capture
+to it with the usual restore-instance-data.py options and command, and
+prints the records and requests per second of each phase: Sites, Users
+(with Devices), and Groups (with Shifts).  With --overlap the phases run
+together, and are reported as one.
+
+The options before -- set up the mock instance; everything after it is
+passed on to the restore, apart from the URL, user and password, which
+always point at the mock.  As with the plan command, the mock starts out
+with the captured objects of the kinds not being restored (e.g. the Sites,
+when benchmarking users), and nothing else.
+
+The journal is kept in a temporary directory, so the capture's own journal
+is left as it is.  The request metrics of each phase are written to the
+capture's out directory as usual, with the phase added to their names
+(e.g. my-instance.np.restore-metrics.20181220-0307.users-devices.json),
+so no phase overwrites another's, and their names are printed at the end.
+
+    $ python3 benchmark.py --latency 0.05 -- -d defaults.json -t 20181220-0307 --workers 8 all
+    $ python3 benchmark.py --throttle-rate 0.02 -- -d defaults.json -e asyncio all
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import capture_reader
+import cli
+import config
+import mock_server
+import planner
+
+_PHASES = (('sites',), ('users', 'devices'), ('groups', 'shifts'))
+
+
+def _count_records(objects: tuple) -> int:
+    """Returns the number of captured records a phase reads"""
+    if 'sites' in objects:
+        filename, kind, selection = config.sites_filename, 'site', None
+    elif 'users' in objects or 'devices' in objects:
+        filename, kind, selection = config.users_filename, 'user', config.only_users
+    else:
+        filename, kind, selection = config.groups_filename, 'group', config.only_groups
+    if selection is None:
+        return sum(1 for _ in capture_reader.read_records(filename))
+    index = capture_reader.load_index(filename, kind)
+    if isinstance(selection, set):
+        return len(selection.intersection(index))
+    return sum(1 for name in index if selection.fullmatch(name))
+
+def _phase_filename(filename: str, phase: list) -> str:
+    """Returns filename with the phase's objects added before its extension"""
+    root, extension = os.path.splitext(filename)
+    return '%s.%s%s' % (root, '-'.join(phase), extension)
+
+def _phases(objects_to_process: list) -> list:
+    """Returns the objects to restore in each phase, in order"""
+    if config.overlap:
+        return [objects_to_process]
+    phases = [[obj for obj in phase if obj in objects_to_process] for phase in _PHASES]
+    return [phase for phase in phases if phase]
+
+def _report(results: list) -> str:
+    """Returns the results as a table of rates per phase"""
+    width = max(len(result[0]) for result in results + [('Phase',)])
+    lines = ['%-*s  %8s  %8s  %8s  %10s  %10s' % (
+        width, 'Phase', 'Records', 'Requests', 'Seconds', 'Records/s', 'Requests/s')]
+    totals = ['Total', 0, 0, 0.0]
+    for result in results + [totals]:
+        name, records, requests, seconds = result
+        lines.append('%-*s  %8d  %8d  %8.2f  %10.1f  %10.1f' % (
+            width, name, records, requests, seconds, records / max(seconds, 1e-9), requests / max(seconds, 1e-9)))
+        if result is not totals:
+            for i in range(1, 4):
+                totals[i] += result[i]
+    return '\n'.join(lines)
+
+def main():
+    """Runs the benchmark, and prints the results"""
+    parser = argparse.ArgumentParser(
+        description="Measures how fast a capture restores, against a local mock instance",
+        usage="%(prog)s [options] -- [restore-instance-data.py options] {command}")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds the mock waits before answering each request [default: %(default)s]")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Share of requests the mock answers with a 503 [default: %(default)s]")
+    parser.add_argument("--throttle-rate", type=float, default=0.0,
+                        help="Share of requests the mock answers with a 429 [default: %(default)s]")
+    parser.add_argument("--retry-after", type=int, default=1,
+                        help="Seconds a 429 asks the restore to wait [default: %(default)s]")
+    parser.add_argument("restore_args", nargs=argparse.REMAINDER,
+                        help="The options and command to restore with, after --")
+    args = parser.parse_args()
+    restore_args = args.restore_args[1:] if args.restore_args[:1] == ['--'] else args.restore_args
+
+    server = mock_server.MockServer(0, args.latency, args.error_rate, args.throttle_rate, args.retry_after)
+    server.start()
+    try:
+        sys.argv[1:] = ['-x', server.url, '-u', 'benchmark', '-p', 'benchmark'] + restore_args
+        restore = cli.process_command_line(None, __doc__)
+        if restore.command_name == 'plan':
+            parser.error('plan does not restore anything to benchmark')
+        config.xmod_url = server.url
+        objects_to_process = cli._COMMAND_OBJECTS[restore.command_name]
+        planner._add_existing(server.instance, objects_to_process)
+
+        results = []
+        metrics_filenames = (config.metrics_filename, config.prometheus_filename)
+        written = []
+        with tempfile.TemporaryDirectory() as directory:
+            config.journal_filename = os.path.join(directory, os.path.basename(config.journal_filename))
+            for phase in _phases(objects_to_process):
+                config.metrics_filename, config.prometheus_filename = (
+                    _phase_filename(filename, phase) for filename in metrics_filenames)
+                written.extend((config.metrics_filename, config.prometheus_filename))
+                records = sum(_count_records(objects) for objects in _PHASES if set(objects) & set(phase))
+                requests = server.requests()
+                started = time.monotonic()
+                cli._get_processor().process(phase)
+                results.append((', '.join(phase), records, server.requests() - requests,
+                                time.monotonic() - started))
+    finally:
+        server.stop()
+
+    print(_report(results))
+    print('Responses by status: %s' % ', '.join('%d: %d' % item for item in sorted(server.statuses.items())))
+    print('Request metrics by phase:')
+    for filename in written:
+        if os.path.exists(filename):
+            print('  %s' % filename)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""Compares the records of a capture with those of an earlier capture.
+
+Each record is split into parts (e.g. a User and its Devices), and a hash
+of each part's content is kept per targetName for the earlier (baseline)
+capture.  A record in the current capture can then be checked for which of
+its parts were added or changed since the baseline without holding either
+capture in memory.
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+
+import hashlib
+import json
+
+import capture_reader
+
+
+def content_hash(obj) -> bytes:
+    """Returns a digest of the JSON content of obj, ignoring key order"""
+    content = json.dumps(obj, sort_keys=True, separators=(',', ':'))
+    return hashlib.blake2b(content.encode('utf-8'), digest_size=16).digest()
+
+def record_hashes(record: dict, parts: dict) -> tuple:
+    """Returns the content hash of each part of a record
+
+    Args:
+        record (dict): The captured record
+        parts (dict): A function per part name, returning that part
+
+    Return:
+        tuple: The hash of each part, in the order of parts
+    """
+    return tuple(content_hash(part(record)) for part in parts.values())
+
+def load_hashes(filename: str, key, parts: dict) -> dict:
+    """Reads the content hashes of every record in a capture file
+
+    Args:
+        filename (str): Name of the capture file to read from
+        key (function): Returns the name (e.g. targetName) of a record
+        parts (dict): A function per part name, returning that part
+
+    Return:
+        dict: The record_hashes() of each record by name
+    """
+    hashes = {}
+    for record in capture_reader.read_records(filename):
+        hashes[key(record)] = record_hashes(record, parts)
+    return hashes
+
+def changed_parts(baseline: dict, name: str, record: dict, parts: dict) -> set:
+    """Returns the names of the parts added or changed since the baseline
+
+    Args:
+        baseline (dict): The load_hashes() of the baseline capture
+        name (str): The name of the record
+        record (dict): The record from the current capture
+        parts (dict): A function per part name, returning that part
+
+    Return:
+        set: The changed part names; all of them if the record is new
+    """
+    old_hashes = baseline.get(name)
+    if old_hashes is None:
+        return set(parts)
+    new_hashes = record_hashes(record, parts)
+    return {part for part, old, new in zip(parts, old_hashes, new_hashes) if old != new}
@@ -0,0 +1,362 @@
+"""Incrementally reads the records from a capture file.
+
+Capture files hold a single JSON array of records.  Rather than loading the
+whole array (or relying on one record per line), the file is read in chunks
+and each record is decoded as soon as it is complete, so memory use stays
+at one chunk plus one record regardless of how the file is laid out.
+
+A file of concatenated records without the surrounding array (JSON Lines)
+is read the same way.  A record that fills the rest of its line is decoded
+with the codec module (orjson when installed) in one go.
+
+To restore only a few records, a sidecar index (the capture filename plus
+".idx") maps each record's targetName to its byte offset and length in the
+capture, so the selected records can be read directly.  The index is built
+on first use and rebuilt whenever the capture file changes.  A restore
+that reads every record instead takes the offsets from the same pass that
+decodes them (see scan_records()).
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+
+import json
+import operator
+import os
+import re
+from io import TextIOBase
+
+import codec
+
+CHUNK_SIZE = 1 << 16
+INDEX_SUFFIX = '.idx'
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_decoder = json.JSONDecoder()
+
+
+class CaptureReader:
+    """Yields the records of an opened capture file one at a time
+
+    Attributes:
+        capture_file (TextIOBase): The opened capture file
+        chunk_size (int): Number of characters to read at a time
+        latin1 (bool): True if the file was opened as latin-1 (so offsets
+            are byte positions), in which case a record holding non-ASCII
+            text is decoded from its UTF-8 bytes instead
+    """
+
+    def __init__(self, capture_file: TextIOBase, chunk_size: int = CHUNK_SIZE, latin1: bool = False):
+        self.capture_file = capture_file
+        self.chunk_size = chunk_size
+        self.latin1 = latin1
+        self._buf = ''
+        self._pos = 0
+        self._base = 0
+        self._eof = False
+
+    def _fill(self, min_size: int = 0) -> bool:
+        """Appends the next chunk to the unconsumed part of the buffer
+
+        Args:
+            min_size (int): Read at least this many characters
+
+        Return:
+            bool: False once the end of the file has been reached
+        """
+        if self._eof:
+            return False
+        chunk = self.capture_file.read(max(self.chunk_size, min_size))
+        if not chunk:
+            self._eof = True
+            return False
+        self._base += self._pos
+        self._buf = self._buf[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def _peek(self) -> str:
+        """Skips whitespace and returns the next character ('' at the end)"""
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ''
+
+    def _decode_line(self):
+        """Decodes the object starting at the current position, if it is the
+        rest of its line
+
+        Captures usually hold one record per line (as JSON Lines, or in the
+        array followed by a comma), and decoding the whole line with the
+        codec is much faster than raw_decode.  Pretty-printed records don't
+        end their first line, so they are left to _decode().
+
+        Return:
+            dict: The record, or None if it doesn't end its line
+        """
+        end = self._buf.find('\n', self._pos)
+        if end < 0:
+            return None
+        text = self._buf[self._pos:end].rstrip()
+        if text.endswith(','):
+            text = text[:-1].rstrip()
+        if not text.endswith('}'):
+            return None
+        try:
+            obj = codec.loads(text)
+        except codec.DecodeError:
+            return None
+        self._pos += len(text)
+        return obj
+
+    def _decode(self):
+        """Decodes the record starting at the current position
+
+        A record cut off by the end of the buffer fails to decode (or, for
+        a bare number, may decode short), so the buffer is grown and the
+        record decoded again.  Growing by at least the unconsumed length
+        keeps records larger than a chunk from being rescanned too often.
+        """
+        if self._buf.startswith('{', self._pos):
+            obj = self._decode_line()
+            if obj is not None:
+                return obj
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._fill(len(self._buf) - self._pos):
+                    continue
+                raise
+            if end == len(self._buf) and self._fill(len(self._buf) - self._pos):
+                continue
+            self._pos = end
+            return obj
+
+    def _line_spans(self, comma: bool):
+        """Yields the records laid out one to a line, for as long as they are
+
+        Captures usually hold one record per line, so whole lines are
+        decoded straight from the buffer, without looking for the
+        separators and whitespace between them.  Stops (leaving the
+        position at the start of the line) at the first line that isn't a
+        single record, such as the last record of an array or a
+        pretty-printed one, which are left to the general parsing.
+
+        Args:
+            comma (bool): True in an array, where every record but the last
+                is followed by a comma on its line
+
+        Returns:
+            tuple: The offset, the length, and the record
+        """
+        loads = codec.loads
+        suffix = '},' if comma else '}'
+        trim = len(suffix) - 1
+        latin1 = self.latin1
+        while True:
+            buf = self._buf
+            pos = self._pos
+            end = buf.find('\n', pos)
+            while end >= 0:
+                if buf.endswith(suffix, pos, end):
+                    stop = end - trim
+                else:
+                    # Trailing whitespace, such as a Windows line ending
+                    stop = pos + len(buf[pos:end].rstrip())
+                    if not buf.endswith(suffix, pos, stop):
+                        return
+                    stop -= trim
+                text = buf[pos:stop]
+                try:
+                    if latin1 and not text.isascii():
+                        obj = loads(text.encode('latin-1'))
+                    else:
+                        obj = loads(text)
+                except codec.DecodeError:
+                    return
+                yield (self._base + pos, len(text), obj)
+                pos = self._pos = end + 1
+                end = buf.find('\n', pos)
+            if not self._fill():
+                return
+
+    def _error(self, msg: str):
+        return json.JSONDecodeError(msg, self._buf, self._pos)
+
+    def _span(self):
+        """Decodes the next record, along with where it sits in the file
+
+        Return:
+            tuple: The offset and length (in characters read) and the record
+        """
+        self._peek()
+        start = self._base + self._pos
+        obj = self._decode()
+        length = self._base + self._pos - start
+        if self.latin1:
+            text = self._buf[self._pos - length:self._pos]
+            if not text.isascii():
+                obj = codec.loads(text.encode('latin-1'))
+        return (start, length, obj)
+
+    def __iter__(self):
+        return map(operator.itemgetter(2), self.spans())
+
+    def spans(self):
+        """Yields each record along with its offset and length
+
+        The offset and length count the characters read from the file, so
+        they are byte positions when the file is opened as latin-1.
+
+        Returns:
+            tuple: The offset, the length, and the record
+        """
+        char = self._peek()
+        if char == '':
+            return
+        if char != '[':
+            # JSON Lines, or other whitespace separated records
+            while char != '':
+                yield from self._line_spans(False)
+                if self._peek() == '':
+                    return
+                yield self._span()
+                char = self._peek()
+            return
+
+        self._pos += 1
+        if self._peek() == ']':
+            return
+        while True:
+            if self._peek() == '':
+                raise self._error('Unterminated capture array')
+            # The records and commas up to the last record (usually all of
+            # them), then the last record or one not on a line of its own
+            yield from self._line_spans(True)
+            if self._peek() == '':
+                raise self._error('Unterminated capture array')
+            yield self._span()
+            char = self._peek()
+            if char == ']':
+                return
+            if char == '':
+                raise self._error('Unterminated capture array')
+            if char != ',':
+                raise self._error("Expecting ',' delimiter")
+            self._pos += 1
+
+
+def read_records(filename: str, chunk_size: int = CHUNK_SIZE):
+    """Yields the records of a capture file, decoding each one only once
+
+    Args:
+        filename (str): Name of the capture file to read from
+        chunk_size (int): Number of characters to read at a time
+
+    Returns:
+        dict: The next record
+    """
+    with open(filename) as capture_file:
+        yield from CaptureReader(capture_file, chunk_size)
+
+
+def scan_records(filename: str, chunk_size: int = CHUNK_SIZE):
+    """Yields the records of a capture file, with their byte offsets
+
+    Reads the file as latin-1, as build_index() does, so the offsets can be
+    passed straight to read_spans().  A record holding any non-ASCII text
+    is decoded from its UTF-8 bytes, so every record comes out the same as
+    from read_records().
+
+    Args:
+        filename (str): Name of the capture file to read from
+        chunk_size (int): Number of characters to read at a time
+
+    Returns:
+        tuple: The offset, the length, and the record
+    """
+    with open(filename, encoding='latin-1', newline='') as capture_file:
+        yield from CaptureReader(capture_file, chunk_size, latin1=True).spans()
+
+
+def _from_latin1(text: str) -> str:
+    """Restores a UTF-8 string that was decoded as latin-1"""
+    try:
+        return text.encode('latin-1').decode('utf-8')
+    except UnicodeError:
+        # Already decoded, e.g. from a \u escape
+        return text
+
+def build_index(filename: str, kind: str) -> dict:
+    """Scans a capture file for the byte offset of each record
+
+    Decoding as latin-1 maps every byte to one character, so the character
+    positions from the reader are byte offsets.  Multi-byte UTF-8 only
+    appears inside JSON strings, so the parsing is unaffected.
+
+    Args:
+        filename (str): Name of the capture file to index
+        kind (str): The record's object key holding the targetName
+            (e.g. 'user' or 'group')
+
+    Return:
+        dict: [offset, length] of each record by targetName
+    """
+    records = {}
+    with open(filename, encoding='latin-1', newline='') as capture_file:
+        for offset, length, record in CaptureReader(capture_file).spans():
+            records[_from_latin1(record[kind]['targetName'])] = [offset, length]
+    return records
+
+def load_index(filename: str, kind: str) -> dict:
+    """Returns the sidecar index of a capture file, building it if needed
+
+    The index is rebuilt when the capture file's size or modification time
+    no longer match the ones recorded with it.  If the index can't be saved
+    next to the capture file, it is only kept for this run.
+
+    Args:
+        filename (str): Name of the capture file
+        kind (str): The record's object key holding the targetName
+
+    Return:
+        dict: [offset, length] of each record by targetName
+    """
+    stat = os.stat(filename)
+    index_filename = filename + INDEX_SUFFIX
+    try:
+        with open(index_filename) as index_file:
+            index = json.load(index_file)
+        if (index['size'] == stat.st_size and index['mtime'] == stat.st_mtime_ns
+                and index['kind'] == kind):
+            return index['records']
+    except (OSError, ValueError, KeyError):
+        pass
+
+    records = build_index(filename, kind)
+    try:
+        with open(index_filename, 'w') as index_file:
+            json.dump({'size': stat.st_size, 'mtime': stat.st_mtime_ns,
+                       'kind': kind, 'records': records}, index_file)
+    except OSError:
+        pass
+    return records
+
+def read_spans(filename: str, spans: list):
+    """Yields the records at the given byte offsets of a capture file
+
+    Args:
+        filename (str): Name of the capture file to read from
+        spans (list): The [offset, length] of each record, from the index
+
+    Returns:
+        dict: The next record
+    """
+    with open(filename, 'rb') as capture_file:
+        for offset, length in sorted(spans):
+            capture_file.seek(offset)
+            yield codec.loads(capture_file.read(length))
@@ -8,62 +8,89 @@ import argparse
 from datetime import datetime
 import getpass
 import json
+import os
+import re
 import sys
 import time
 
 from requests import auth
 
+import async_processor
 import config
 import common_logger
+import planner
 import processor
 
 
+def _get_processor():
+    """Returns the processor module for the requested engine"""
+    if config.engine == 'asyncio':
+        return async_processor
+    return processor
+
 def process_sites(args):
     """Called when command line specifies Sites"""
     common_logger.get_logger().debug('Processing Sites only')
-    processor.process(['sites'])
+    _get_processor().process(['sites'])
     return
 
 def process_users_only(args):
     """Called when command line specifies Users only"""
     common_logger.get_logger().debug('Processing Users only')
-    processor.process(['users'])
+    _get_processor().process(['users'])
     return
 
 def process_users(args):
     """Called when command line specifies Users and their Devices"""
     common_logger.get_logger().debug('Processing Users and Devices only')
-    processor.process(['users', 'devices'])
+    _get_processor().process(['users', 'devices'])
     return
 
 def process_devices(args):
     """Called when command line specifies Devices"""
     common_logger.get_logger().debug('Processing Devices only')
-    processor.process(['devices'])
+    _get_processor().process(['devices'])
     return
 
 def process_groups_only(args):
     """Called when command line specifies Groups"""
     common_logger.get_logger().debug('Processing Groups only')
-    processor.process(['groups'])
+    _get_processor().process(['groups'])
     return
 
 def process_groups(args):
     """Called when command line specifies Groups and their Shifts"""
     common_logger.get_logger().debug('Processing Groups and Shifts only')
-    processor.process(['groups', 'shifts'])
+    _get_processor().process(['groups', 'shifts'])
     return
 
 def process_shifts(args):
     """Called when command line specifies Shifts"""
     common_logger.get_logger().debug('Processing Shifts only')
-    processor.process(['shifts'])
+    _get_processor().process(['shifts'])
+    return
+
+_COMMAND_OBJECTS = {
+    'sites': ['sites'],
+    'users': ['users', 'devices'],
+    'users-only': ['users'],
+    'devices': ['devices'],
+    'groups': ['groups', 'shifts'],
+    'groups-only': ['groups'],
+    'shifts': ['shifts'],
+    'all': ['sites', 'users', 'devices', 'groups', 'shifts'],
+}
+
+def process_plan(args):
+    """Called when command line specifies a plan of another command"""
+    common_logger.get_logger().debug('Planning %s', args.planned_command)
+    planner.plan(_COMMAND_OBJECTS[args.planned_command])
     return
 
 def process_all(args):
     """Called when command line specifies all operations"""
     common_logger.get_logger().debug('Processing Sites, Users, Devices, Groups, and Shifts')
-    processor.process(['sites', 'users', 'devices', 'groups', 'shifts'])
+    _get_processor().process(['sites', 'users', 'devices', 'groups', 'shifts'])
     return
 
 class _CLIError(Exception):
@@ -79,6 +106,25 @@ class _CLIError(Exception):
     def __unicode__(self):
         return self.msg
 
+def _get_selection(value: str):
+    """Returns the targetNames to restore from a list file or a pattern
+
+    Args:
+        value (str): The name of a file listing one targetName per line, or
+            a regular expression the targetNames must fully match
+
+    Return:
+        set or Pattern: The listed targetNames, or the compiled expression
+    """
+    if os.path.isfile(value):
+        with open(value) as names_file:
+            return {line.strip() for line in names_file if line.strip()}
+    try:
+        return re.compile(value)
+    except re.error as exc:
+        raise(_CLIError(config.ERR_CLI_BAD_SELECTION_MSG % (value, exc),
+                        config.ERR_CLI_BAD_SELECTION_CODE))
+
 class __Password(argparse.Action):
     """Container to get and/or hold incoming password"""
     def __call__(self, parser, namespace, values, option_string): # pylint: disable=signature-differs
@@ -119,6 +165,14 @@ USAGE
             formatter_class=argparse.RawDescriptionHelpFormatter)
         subparsers = parser.add_subparsers(dest='command_name')
         # Add common arguments
+        parser.add_argument("--adaptive", dest="adaptive",
+                            action='store_true', default=None,
+                            help=(
+                                "If specified, adapts the number of requests "
+                                "in flight to each kind of endpoint (up to "
+                                "--workers or --concurrency), raising it while "
+                                "responses stay fast and healthy, and lowering"
+                                " it on 429, 502-504, or slow responses."))
         parser.add_argument("-b", "--basename", dest="base_name",
                             default=None,
                             help=(
@@ -126,17 +180,48 @@ USAGE
                                 "-b to specify the base name of the input "
                                 "file. The names ie expected to have a "
                                 "timestamp and .json appended to the end."))
+        parser.add_argument("--baseline", dest="baseline_time_str",
+                            default=None,
+                            help=(
+                                "Specifies the time string of an earlier "
+                                "capture to compare with.  Only the Sites, "
+                                "Users, Devices, Groups, and Shifts that were "
+                                "added or changed since then are restored."))
+        parser.add_argument("--cache", dest="cache_filename",
+                            default=None,
+                            help=(
+                                "If not specified in the defaults file, use "
+                                "--cache to name a local database that "
+                                "remembers the payloads restored to this "
+                                "instance.  Sites, Users, Devices, and Groups"
+                                " whose payload is unchanged since they were "
+                                "last restored are skipped."))
         parser.add_argument("-c", "--console", dest="noisy",
                             action='store_true',
                             help=(
                                 "If specified, will echo all log output to "
                                 "the console at the requested verbosity based "
                                 "on the -v option"))
+        parser.add_argument("--concurrency", dest="concurrency",
+                            type=int, default=None,
+                            help=(
+                                "If not specified in the defaults file, use "
+                                "--concurrency to specify the maximum number "
+                                "of requests the asyncio engine keeps in "
+                                "flight. [default: %d]" % config.concurrency))
         parser.add_argument("-d", "--defaults", dest="defaults_filename",
                             default="defaults.json",
                             help=(
                                 "Specifes the name of the file containing "
                                 "default settings [default: %(default)s]"))
+        parser.add_argument("-e", "--engine", dest="engine",
+                            default=None,
+                            choices=['requests', 'asyncio'],
+                            help=(
+                                "Specifies whether to restore with blocking "
+                                "requests (optionally across --workers "
+                                "threads), or with asyncio on a single thread."
+                                " [default: %s]" % config.engine))
         parser.add_argument("-i", "--itype", dest="instance_type",
                             default=None,
                             choices=['np', 'prod'],
@@ -152,18 +237,128 @@ USAGE
                                 "-l to specify the base name of the log file. "
                                 "The name will have a timestamp and .log "
                                 "appended to the end."))
+        parser.add_argument("--latency", dest="plan_latency",
+                            type=float, default=None,
+                            help=(
+                                "If not specified in the defaults file, use "
+                                "--latency to specify the seconds each "
+                                "request is expected to take, for the plan "
+                                "command's estimate. [default: %.2f]"
+                                % config.plan_latency))
         parser.add_argument("-o", "--odir", dest="out_directory",
                             default=None,
                             help=(
                                   "If not specified in the defaults file, use -o"
                                   " to specify the file system location where "
                                   "the output files were written."))
+        parser.add_argument("--only-groups", dest="only_groups",
+                            default=None,
+                            help=(
+                                  "Only restores the Groups (and their "
+                                  "Shifts) whose targetName is listed in this"
+                                  " file (one per line), or fully matches "
+                                  "this regular expression.  The records are "
+                                  "read directly using an index built next to"
+                                  " the capture file."))
+        parser.add_argument("--only-users", dest="only_users",
+                            default=None,
+                            help=(
+                                  "Only restores the Users (and their "
+                                  "Devices) whose targetName is listed in this"
+                                  " file (one per line), or fully matches "
+                                  "this regular expression.  The records are "
+                                  "read directly using an index built next to"
+                                  " the capture file."))
         parser.add_argument('-p', action=__Password, nargs='?',
                             dest='password', default=None,
                             help=(
                                   "If not specified in the defaults file, use -p"
                                   " to specify a password either on the command"
                                   " line, or be prompted"))
+        parser.add_argument("--poolsize", dest="pool_size",
+                            type=int, default=None,
+                            help=(
+                                  "If not specified in the defaults file, use"
+                                  " --poolsize to specify the number of "
+                                  "keep-alive connections to hold open to "
+                                  "the xmatters instance. [default: %d]"
+                                  % config.pool_size))
+        parser.add_argument("--overlap", dest="overlap",
+                            action='store_true', default=None,
+                            help=(
+                                  "If specified, starts restoring each record "
+                                  "as soon as the records it depends on are "
+                                  "restored (e.g. a Group once its Site and "
+                                  "supervisors are), instead of restoring all "
+                                  "of one kind of object before the next."))
+        parser.add_argument("--prefetch", dest="prefetch",
+                            action='store_true', default=None,
+                            help=(
+                                  "If specified, retrieves the existing Users "
+                                  "and Groups in pages of %d before restoring,"
+                                  " instead of looking each one up "
+                                  "individually."
+                                  % config.page_size))
+        parser.add_argument("--reconcile", dest="reconcile",
+                            action='store_true', default=None,
+                            help=(
+                                  "If specified, compares each Group's "
+                                  "existing Shifts to the captured ones, and "
+                                  "only replaces the Shifts that changed, "
+                                  "instead of deleting and recreating all of "
+                                  "them.  As xMatters can't update a Shift, a"
+                                  " changed Shift is still deleted and "
+                                  "recreated with only its captured Members,"
+                                  " so any others are lost even without "
+                                  "--prune.  Only missing Members are added "
+                                  "to the unchanged Shifts."))
+        parser.add_argument("--prune", dest="prune_members",
+                            action='store_true', default=None,
+                            help=(
+                                  "If specified with --reconcile, also removes"
+                                  " any existing Shift Members that were not "
+                                  "captured."))
+        parser.add_argument("--retries", dest="retry_attempts",
+                            type=int, default=None,
+                            help=(
+                                  "If not specified in the defaults file, use"
+                                  " --retries to specify the number of times a"
+                                  " request is attempted when it fails with a "
+                                  "temporary error (429 or 502-504), waiting "
+                                  "longer between each attempt. [default: %d]"
+                                  % config.retry_attempts))
+        parser.add_argument("--retry-budget", dest="retry_budget",
+                            type=int, default=None,
+                            help=(
+                                  "If not specified in the defaults file, use"
+                                  " --retry-budget to specify the most retries"
+                                  " made over the whole restore, after which "
+                                  "failed requests are no longer retried. "
+                                  "[default: %d]" % config.retry_budget))
+        parser.add_argument("--connect-timeout", dest="connect_timeout",
+                            type=float, default=None,
+                            help=(
+                                  "If not specified in the defaults file, use"
+                                  " --connect-timeout to specify the seconds "
+                                  "to wait for a connection to the instance, "
+                                  "before the attempt fails and is retried. "
+                                  "[default: %g]" % config.connect_timeout))
+        parser.add_argument("--read-timeout", dest="read_timeout",
+                            type=float, default=None,
+                            help=(
+                                  "If not specified in the defaults file, use"
+                                  " --read-timeout to specify the seconds to "
+                                  "wait for the instance to respond, before "
+                                  "the attempt fails and is retried. "
+                                  "[default: %g]" % config.read_timeout))
+        parser.add_argument("--resume", dest="resume",
+                            action='store_true', default=None,
+                            help=(
+                                  "If specified, carries on from where an "
+                                  "interrupted restore of the same capture "
+                                  "left off, skipping whatever its journal "
+                                  "shows as already restored.  Records that "
+                                  "failed are tried again."))
         parser.add_argument("-t", "--time", dest="time_str",
                             default=None,
                             help=(
@@ -187,6 +382,15 @@ USAGE
                                 "WARNING logging, a double v (-vv) means add "
                                 "INFO logging, and a tripple v (-vvv) means "
                                 "add DEBUG logging [default: %(default)s]"))
+        parser.add_argument("--workers", dest="workers",
+                            type=int, default=None,
+                            help=(
+                                  "If not specified in the defaults file, use"
+                                  " --workers to specify how many Users (with "
+                                  "their Devices), Groups, and Shifts, or with"
+                                  " --overlap records of any kind, are "
+                                  "restored in parallel. [default: %d]"
+                                  % config.workers))
         parser.add_argument("-x", "--xmodurl", dest="xmod_url",
                             default=None,
                             help=("If not specified in the defaults file, use "
@@ -227,6 +431,15 @@ USAGE
             help=("Use this command in order to restore all objects "
                   "to the instance: Sites, Users, Devices, Groups, Shifts."))
         all_parser.set_defaults(func=process_all)
+        plan_parser = subparsers.add_parser(
+            'plan', description=("Plans a restore without sending any requests"),
+            help=("Use this command to count the requests the given command "
+                  "(all by default) would make, and estimate how long they "
+                  "would take, without connecting to the instance."))
+        plan_parser.add_argument("planned_command", nargs='?', default='all',
+                                 choices=list(_COMMAND_OBJECTS),
+                                 help="The command to plan [default: %(default)s]")
+        plan_parser.set_defaults(func=process_plan)
 
         # Process arguments
         args = parser.parse_args()
@@ -234,24 +447,62 @@ USAGE
         # Dereference the arguments into the configuration object
         user = None
         password = None
+        if args.adaptive:
+            config.adaptive = args.adaptive
         if args.base_name:
             config.base_name = args.base_name
+        if args.baseline_time_str:
+            config.baseline_time_str = args.baseline_time_str
+        if args.cache_filename:
+            config.cache_filename = args.cache_filename
         if args.instance_type:
             config.instance_type = args.instance_type
         if args.log_filename:
             config.log_filename = args.log_filename
+        if args.plan_latency:
+            config.plan_latency = args.plan_latency
         if args.out_directory:
             config.out_directory = args.out_directory
         if args.noisy > 0:
             config.noisy = args.noisy
+        if args.concurrency:
+            config.concurrency = args.concurrency
+        if args.engine:
+            config.engine = args.engine
+        if args.only_groups:
+            config.only_groups = _get_selection(args.only_groups)
+        if args.only_users:
+            config.only_users = _get_selection(args.only_users)
         if args.password:
             password = args.password
+        if args.overlap:
+            config.overlap = args.overlap
+        if args.pool_size:
+            config.pool_size = args.pool_size
+        if args.retry_attempts is not None:
+            config.retry_attempts = args.retry_attempts
+        if args.retry_budget is not None:
+            config.retry_budget = args.retry_budget
+        if args.connect_timeout:
+            config.connect_timeout = args.connect_timeout
+        if args.read_timeout:
+            config.read_timeout = args.read_timeout
+        if args.prefetch:
+            config.prefetch = args.prefetch
+        if args.reconcile:
+            config.reconcile = args.reconcile
+        if args.prune_members:
+            config.prune_members = args.prune_members
+        if args.resume:
+            config.resume = args.resume
         if args.time_str:
             config.time_str = args.time_str
         if args.user:
             user = args.user
         if args.verbose > 0:
             config.verbosity = args.verbose
+        if args.workers:
+            config.workers = args.workers
         if args.xmod_url:
             config.xmod_url = args.xmod_url
 
@@ -286,6 +537,36 @@ USAGE
                 config.verbosity = cfg['verbosity']
         if config.instance_type is None and 'instance' in cfg:
             config.instance_type = cfg['instance']
+        if args.pool_size is None and 'poolSize' in cfg:
+            config.pool_size = cfg['poolSize']
+        if args.workers is None and 'workers' in cfg:
+            config.workers = cfg['workers']
+        if args.engine is None and 'engine' in cfg:
+            config.engine = cfg['engine']
+        if args.concurrency is None and 'concurrency' in cfg:
+            config.concurrency = cfg['concurrency']
+        if args.retry_attempts is None and 'retries' in cfg:
+            config.retry_attempts = cfg['retries']
+        if args.retry_budget is None and 'retryBudget' in cfg:
+            config.retry_budget = cfg['retryBudget']
+        if args.connect_timeout is None and 'connectTimeout' in cfg:
+            config.connect_timeout = cfg['connectTimeout']
+        if args.read_timeout is None and 'readTimeout' in cfg:
+            config.read_timeout = cfg['readTimeout']
+        if args.plan_latency is None and 'latency' in cfg:
+            config.plan_latency = cfg['latency']
+        if args.overlap is None and 'overlap' in cfg:
+            config.overlap = cfg['overlap']
+        if args.prefetch is None and 'prefetch' in cfg:
+            config.prefetch = cfg['prefetch']
+        if args.reconcile is None and 'reconcile' in cfg:
+            config.reconcile = cfg['reconcile']
+        if args.prune_members is None and 'prune' in cfg:
+            config.prune_members = cfg['prune']
+        if args.adaptive is None and 'adaptive' in cfg:
+            config.adaptive = cfg['adaptive']
+        if args.cache_filename is None and 'cacheFilename' in cfg:
+            config.cache_filename = cfg['cacheFilename']
 
         # Validate and default instance type to non production
         if config.instance_type is None:
@@ -314,6 +595,31 @@ USAGE
         config.groups_filename = (
             config.out_directory + config.dir_sep + config.base_name + '.' +
             config.instance_type + '.groups.' + config.time_str + '.json')
+        if config.baseline_time_str:
+            config.baseline_sites_filename = (
+                config.out_directory + config.dir_sep + config.base_name + '.' +
+                config.instance_type + '.sites.' + config.baseline_time_str +
+                '.json')
+            config.baseline_users_filename = (
+                config.out_directory + config.dir_sep + config.base_name + '.' +
+                config.instance_type + '.users.' + config.baseline_time_str +
+                '.json')
+            config.baseline_groups_filename = (
+                config.out_directory + config.dir_sep + config.base_name + '.' +
+                config.instance_type + '.groups.' + config.baseline_time_str +
+                '.json')
+        config.journal_filename = (
+            config.out_directory + config.dir_sep + config.base_name + '.' +
+            config.instance_type + '.restore-journal.' + config.time_str +
+            '.jsonl')
+        config.metrics_filename = (
+            config.out_directory + config.dir_sep + config.base_name + '.' +
+            config.instance_type + '.restore-metrics.' + config.time_str +
+            '.json')
+        config.prometheus_filename = (
+            config.out_directory + config.dir_sep + config.base_name + '.' +
+            config.instance_type + '.restore-metrics.' + config.time_str +
+            '.prom')
 
         # Initialize logging
         llogger = common_logger.get_logger()
@@ -329,12 +635,12 @@ USAGE
                             config.ERR_CLI_MISSING_XMOD_URL_CODE))
         if user:
             llogger.info("User is: %s", user)
-        else:
+        elif args.command_name != 'plan':
             raise(_CLIError(config.ERR_CLI_MISSING_USER_MSG,
                             config.ERR_CLI_MISSING_USER_CODE))
         if password:
             llogger.info("Password was provided.")
-        else:
+        elif args.command_name != 'plan':
             raise(_CLIError(config.ERR_CLI_MISSING_PASSWORD_MSG,
                             config.ERR_CLI_MISSING_PASSWORD_CODE))
         if config.base_name:
@@ -359,6 +665,10 @@ USAGE
             raise(_CLIError(config.ERR_CLI_MISSING_TIMESTR_MSG,
                             config.ERR_CLI_MISSING_TIMESTR_CODE))
 
+        if config.engine == 'asyncio' and async_processor.aiohttp is None:
+            raise(_CLIError(config.ERR_CLI_MISSING_AIOHTTP_MSG,
+                            config.ERR_CLI_MISSING_AIOHTTP_CODE))
+
         # Setup the basic auth object for subsequent REST calls
         config.basic_auth = auth.HTTPBasicAuth(user, password)
 
@@ -0,0 +1,60 @@
+"""Encodes and decodes the JSON of capture records, payloads and responses.
+
+Uses orjson when it is installed (pip install orjson), which is several
+times faster than the standard json module, and falls back to json
+otherwise.  Without orjson, text is decoded by the json module's scanner
+directly, which is still a little faster than json.loads.  Either way,
+payloads are encoded straight to the UTF-8 bytes sent as the request body,
+so each one is encoded only once, and the debug log shows the same bytes
+rather than encoding the payload again.
+
+The payload hashes of the cache and the baseline comparison keep using the
+json module (see capture_diff.content_hash), so they don't change with the
+codec in use.
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DecodeError = orjson.JSONDecodeError if orjson is not None else json.JSONDecodeError
+
+# The json module's scanner, which json.loads calls through two layers of
+# Python and two whitespace checks
+_scan_once = json.JSONDecoder().scan_once
+
+
+def dumps(obj) -> bytes:
+    """Returns obj encoded as compact JSON, in UTF-8 bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+def loads(data):
+    """Returns the object decoded from JSON bytes or str
+
+    Raises:
+        DecodeError: If data is not a single JSON value (a subclass of
+            ValueError, whichever codec is in use)
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, str):
+        # Captures and payloads are compact, so a text holding exactly one
+        # value is decoded by the scanner directly; anything else (such as
+        # surrounding whitespace, or an error to report) goes through
+        # json.loads
+        try:
+            obj, end = _scan_once(data, 0)
+            if end == len(data):
+                return obj
+        except (StopIteration, json.JSONDecodeError):
+            pass
+    return json.loads(data)
@@ -1,5 +1,10 @@
 """Creates and manages a singleton logger instance.
 
+    Records are handed to a queue on the logging thread, and written to the
+    log file and console by a background listener thread, so that neither
+    the restore's workers nor its event loop wait on file I/O or contend on
+    the handlers' locks.  close() writes out whatever is still queued.
+
     Attributes:
         _logger (Logger): Holds the instance of the shared logger
 
@@ -8,13 +13,37 @@
 
 """
 
+import atexit
 import logging
 from logging import config as logging_config
+from logging import handlers as logging_handlers
 from logging import Logger
+import queue
 
+import codec
 import config
 
 __logger = None
+__listener = None
+
+
+class LazyJson:
+    """Formats an object as JSON only if the log record is written
+
+    Pass one as a logging argument in place of json.dumps(obj), so that
+    payloads aren't serialized for messages below the logger's level.  A
+    payload already encoded to bytes (see codec.dumps()) is just decoded.
+    """
+
+    __slots__ = ('obj',)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __str__(self):
+        if isinstance(self.obj, bytes):
+            return self.obj.decode('utf-8')
+        return codec.dumps(self.obj).decode('utf-8')
 
 def get_logger() -> Logger:
     """Returns the existing logger or creates a new one if the first time
@@ -39,6 +68,7 @@ def get_logger() -> Logger:
         Logger: __logger
     """
     global __logger# pylint: disable=global-statement
+    global __listener# pylint: disable=global-statement
     verbosity = config.verbosity
     log_path = config.log_filename
     noisy = config.noisy
@@ -75,14 +105,38 @@ def get_logger() -> Logger:
             'loggers': {
                 'default': {
                     'level': level,
-                    'handlers': handlers
+                    'handlers': []
+                },
+                # Holds the handlers the listener writes through
+                'default.output': {
+                    'level': level,
+                    'handlers': handlers,
+                    'propagate': False
                 }
             },
             'disable_existing_loggers': False
         })
         __logger = logging.getLogger(name)
+        records = queue.SimpleQueue()
+        __listener = logging_handlers.QueueListener(
+            records, *logging.getLogger(name + '.output').handlers, respect_handler_level=True)
+        __logger.addHandler(logging_handlers.QueueHandler(records))
+        __listener.start()
+        atexit.register(close)
     return __logger
 
+def close():
+    """Writes out the queued records, and stops the background listener
+
+    Anything logged afterwards is written directly, on the logging thread.
+    """
+    global __listener# pylint: disable=global-statement
+    if __listener is None:
+        return
+    __listener.stop()
+    __logger.handlers = list(__listener.handlers)
+    __listener = None
+
 def main():
     """ Only needed by convention """
     pass
@@ -0,0 +1,221 @@
+"""Adapts the number of requests in flight to how the instance is coping.
+
+Each family of endpoints (sites, people, devices, groups, and shifts with
+their members) gets its own limit, since they are served very differently:
+a Shift Member POST is far slower than a Person POST.  The limits follow
+AIMD (additive increase, multiplicative decrease), as TCP does:
+
+* While responses come back healthy, the limit grows: by one per response
+  at first (slow start), then by about one per round of responses.
+* A 429, a 502-504, a connection error, or a response much slower than
+  the usual for that family cuts the limit in half (by a quarter for
+  slowness) and ends slow start.  Cuts are at most one per typical response
+  time, so a burst of failures from the same round only counts once.
+* Any other status is an answer about the request rather than the load on
+  the instance (e.g. the 501 for a Shift that already exists), so it is
+  treated as healthy.
+
+The limits never go above the engine's maximum (--workers or
+--concurrency), and are logged as they change.
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+
+import asyncio
+import contextlib
+import threading
+import time
+import urllib.parse
+
+import common_logger
+
+CONGESTION_STATUSES = frozenset([429, 502, 503, 504])
+INITIAL_LIMIT = 4
+LATENCY_TOLERANCE = 2.0
+LOG_INTERVAL = 10.0
+
+_API_PATH = '/api/xm/1/'
+
+
+def endpoint_family(url: str) -> str:
+    """Returns the family of endpoints a request URL belongs to
+
+    Args:
+        url (str): The request URL
+
+    Return:
+        str: One of 'sites', 'people', 'devices', 'groups', 'shifts', or
+            'other'
+    """
+    path = urllib.parse.urlsplit(url).path
+    if _API_PATH not in path:
+        return 'other'
+    parts = path.split(_API_PATH, 1)[1].split('/')
+    if parts[0] == 'groups' and 'shifts' in parts:
+        return 'shifts'
+    if parts[0] == 'people' and 'devices' in parts:
+        return 'devices'
+    if parts[0] in ('sites', 'people', 'devices', 'groups'):
+        return parts[0]
+    return 'other'
+
+
+class AdaptiveLimit:
+    """AIMD concurrency limit of one endpoint family
+
+    Attributes:
+        family (str): The endpoint family
+        maximum (int): The most requests ever allowed in flight
+        limit (float): The number of requests currently allowed in flight
+        in_flight (int): The number of requests currently in flight
+    """
+
+    def __init__(self, family: str, maximum: int, initial: int = INITIAL_LIMIT):
+        self.family = family
+        self.maximum = maximum
+        self.limit = float(min(initial, maximum))
+        self.in_flight = 0
+        self._slow_start = True
+        self._latency = None
+        self._baseline = None
+        self._last_decrease = 0.0
+
+    def allowed(self) -> int:
+        """Returns the number of requests currently allowed in flight"""
+        return max(1, int(self.limit))
+
+    def update(self, latency: float, status_code: int = None):
+        """Adjusts the limit from the outcome of a request
+
+        Args:
+            latency (float): Seconds the request took
+            status_code (int): The response status, or None for an error
+
+        Return:
+            str: Why the limit was cut, or None if it was not
+        """
+        healthy = status_code is not None and status_code not in CONGESTION_STATUSES
+        if healthy:
+            # Smoothed latency, and a baseline that follows it only slowly,
+            # so a sudden climb stands out
+            self._latency = latency if self._latency is None else 0.8 * self._latency + 0.2 * latency
+            if self._baseline is None or self._latency < self._baseline:
+                self._baseline = self._latency
+            else:
+                self._baseline += 0.01 * (self._latency - self._baseline)
+
+        if not healthy:
+            return self._decrease(0.5, 'error %s' % (status_code or 'connecting'))
+        if self._latency > LATENCY_TOLERANCE * self._baseline:
+            return self._decrease(0.75, 'latency %.2fs' % self._latency)
+
+        if self._slow_start:
+            self.limit += 1
+        else:
+            self.limit += 1 / self.limit
+        self.limit = min(self.limit, float(self.maximum))
+        return None
+
+    def _decrease(self, factor: float, reason: str):
+        now = time.monotonic()
+        if now - self._last_decrease < (self._latency or 0.0):
+            return None
+        self._last_decrease = now
+        self._slow_start = False
+        self.limit = max(1.0, self.limit * factor)
+        return reason
+
+
+class ConcurrencyController:
+    """Adaptive concurrency limits for every endpoint family
+
+    Requests wait for a slot of their family with slot() on threads, or
+    async_slot() on the asyncio engine, and report their status through it.
+
+    Attributes:
+        maximum (int): The most requests ever allowed in flight per family
+    """
+
+    def __init__(self, maximum: int):
+        self.maximum = maximum
+        self._limits = {}
+        self._lock = threading.Lock()
+        self._conditions = {}
+        self._last_log = time.monotonic()
+        self._logged = {}
+        self._logger = common_logger.get_logger()
+
+    def _get(self, family: str) -> AdaptiveLimit:
+        limit = self._limits.get(family)
+        if limit is None:
+            limit = self._limits[family] = AdaptiveLimit(family, self.maximum)
+        return limit
+
+    def _update(self, limit: AdaptiveLimit, started: float, status_code: int):
+        reason = limit.update(time.monotonic() - started, status_code)
+        if reason:
+            self._logger.info('Lowered the concurrency limit for %s to %d (%s).',
+                              limit.family, limit.allowed(), reason)
+        if time.monotonic() - self._last_log >= LOG_INTERVAL:
+            self.log_limits()
+
+    def log_limits(self):
+        """Logs the current limit of each family that changed since last time"""
+        self._last_log = time.monotonic()
+        current = {family: limit.allowed() for family, limit in sorted(self._limits.items())}
+        if current != self._logged:
+            self._logged = current
+            self._logger.info('Concurrency limits: %s',
+                              ', '.join('%s %d' % item for item in current.items()))
+
+    @contextlib.contextmanager
+    def slot(self, url: str):
+        """Waits on the calling thread until a request to url may be sent
+
+        Yields:
+            dict: Set 'status_code' to the response status once received;
+                if it is left unset, the request is counted as failed
+        """
+        with self._lock:
+            limit = self._get(endpoint_family(url))
+            condition = self._conditions.get(limit.family)
+            if condition is None:
+                condition = self._conditions[limit.family] = threading.Condition(self._lock)
+            condition.wait_for(lambda: limit.in_flight < limit.allowed())
+            limit.in_flight += 1
+        outcome = {'status_code': None}
+        started = time.monotonic()
+        try:
+            yield outcome
+        finally:
+            with self._lock:
+                limit.in_flight -= 1
+                self._update(limit, started, outcome['status_code'])
+                condition.notify_all()
+
+    @contextlib.asynccontextmanager
+    async def async_slot(self, url: str):
+        """Waits on the event loop until a request to url may be sent
+
+        Yields:
+            dict: Set 'status_code' to the response status once received;
+                if it is left unset, the request is counted as failed
+        """
+        limit = self._get(endpoint_family(url))
+        condition = self._conditions.get(limit.family)
+        if condition is None:
+            condition = self._conditions[limit.family] = asyncio.Condition()
+        async with condition:
+            await condition.wait_for(lambda: limit.in_flight < limit.allowed())
+            limit.in_flight += 1
+        outcome = {'status_code': None}
+        started = time.monotonic()
+        try:
+            yield outcome
+        finally:
+            limit.in_flight -= 1
+            self._update(limit, started, outcome['status_code'])
+            async with condition:
+                condition.notify_all()
@@ -31,6 +31,25 @@ new_default_shift_name = "Default Shift"
 old_default_shift_name = "24x7"
 time_str = None
 page_size = 1000
+pool_size = 10
+workers = 1
+engine = 'requests'
+concurrency = 100
+adaptive = False
+retry_attempts = 5
+retry_budget = 1000
+connect_timeout = 10.0
+read_timeout = 60.0
+plan_latency = 0.25
+prefetch = False
+overlap = False
+reconcile = False
+prune_members = False
+only_users = None
+only_groups = None
+resume = False
+baseline_time_str = None
+cache_filename = None
 xmod_url = None
 out_directory = None
 properties_filename = None
@@ -46,6 +65,12 @@ sites_filename = None
 users_filename = None
 devices_filename = None
 groups_filename = None
+journal_filename = None
+metrics_filename = None
+prometheus_filename = None
+baseline_sites_filename = None
+baseline_users_filename = None
+baseline_groups_filename = None
 
 # Error codes
 ERR_CLI_EXCEPTION = -1
@@ -82,6 +107,15 @@ ERR_INITIAL_REQUEST_FAILED_MSG = ("Error %d on initial request to %s.\nPlease "
 ERR_CLI_MISSING_TIMESTR_CODE = -13
 ERR_CLI_MISSING_TIMESTR_MSG = ("Time string to use to open the appropriate "
                                "data files was not specified")
+ERR_CLI_MISSING_AIOHTTP_CODE = -14
+ERR_CLI_MISSING_AIOHTTP_MSG = ("The asyncio engine requires the aiohttp module "
+                               "(pip install aiohttp)")
+ERR_CLI_BAD_SELECTION_CODE = -15
+ERR_CLI_BAD_SELECTION_MSG = ("%s is neither a list file nor a valid regular "
+                             "expression: %s")
+ERR_INTERRUPTED_CODE = -16
+ERR_INTERRUPTED_MSG = ("Restore interrupted.  Progress has been saved to %s, "
+                       "rerun with --resume to carry on from there.")
 
 def main():
     """ To pass conventions, in case we need to execute main """
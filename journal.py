@@ -0,0 +1,133 @@
+"""Records the progress of a restore so an interrupted one can be resumed.
+
+The journal is a JSON Lines file that is only ever appended to.  Each line
+either records a restored object (with any value needed to carry on without
+asking xMatters again, such as its new id), or the completion of a phase:
+
+    {"kind": "user", "name": "jsmith", "value": {"id": "...", ...}}
+    {"phase": "users"}
+
+Lines are buffered, and flushed at most FLUSH_INTERVAL seconds apart, at
+the end of each phase, and when the journal is closed.  A line cut short by
+a crash is ignored when the journal is read back.
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+
+import json
+import os
+import threading
+import time
+
+FLUSH_INTERVAL = 1.0
+
+
+class Journal:
+    """Append-only record of the objects and phases already restored
+
+    Attributes:
+        filename (str): Name of the journal file
+        resumed (bool): True if entries were read back from an earlier run
+    """
+
+    def __init__(self, filename: str, resume: bool = False):
+        """Opens the journal, reading back the earlier entries if resuming
+
+        Args:
+            filename (str): Name of the journal file
+            resume (bool): If True, keep and read back the existing entries,
+                otherwise start a new journal
+        """
+        self.filename = filename
+        self.resumed = False
+        self._entries = {}
+        self._phases = set()
+        self._lock = threading.RLock()
+        self._last_flush = time.monotonic()
+
+        if resume and os.path.exists(filename):
+            self._load()
+            self.resumed = True
+        self._file = open(filename, 'a' if resume else 'w')
+        if self.resumed and not self._ends_with_newline():
+            # Keep the next entry off the end of a partly written line
+            self._file.write('\n')
+
+    def _load(self):
+        """Reads back the entries written by an earlier run"""
+        with open(self.filename) as journal_file:
+            for line in journal_file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if 'phase' in entry:
+                    self._phases.add(entry['phase'])
+                else:
+                    self._entries.setdefault(entry['kind'], {})[entry['name']] = entry.get('value')
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.filename, 'rb') as journal_file:
+            journal_file.seek(0, os.SEEK_END)
+            if journal_file.tell() == 0:
+                return True
+            journal_file.seek(-1, os.SEEK_END)
+            return journal_file.read(1) == b'\n'
+
+    def _write(self, entry: dict):
+        with self._lock:
+            self._file.write(json.dumps(entry) + '\n')
+            if time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+                self._flush()
+
+    def _flush(self):
+        self._file.flush()
+        self._last_flush = time.monotonic()
+
+    def record(self, kind: str, name: str, value=None):
+        """Records that an object has been restored
+
+        Args:
+            kind (str): The kind of object (e.g. 'user', 'group')
+            name (str): The object's name or targetName
+            value: Anything needed to carry on from here, e.g. its new id
+        """
+        self._write({'kind': kind, 'name': name, 'value': value})
+
+    def is_done(self, kind: str, name: str) -> bool:
+        """Returns True if the object was restored by an earlier run"""
+        return name in self._entries.get(kind, {})
+
+    def get(self, kind: str) -> dict:
+        """Returns the values recorded by an earlier run, by name"""
+        return self._entries.get(kind, {})
+
+    def finish_phase(self, phase: str):
+        """Records that a phase has completed, and saves it to disk"""
+        self._write({'phase': phase})
+        self.flush(sync=True)
+
+    def phase_done(self, phase: str) -> bool:
+        """Returns True if the phase was completed by an earlier run"""
+        return phase in self._phases
+
+    def flush(self, sync: bool = False):
+        """Writes out the buffered entries
+
+        Args:
+            sync (bool): If True, also wait for them to reach the disk
+        """
+        with self._lock:
+            if self._file.closed:
+                return
+            self._flush()
+            if sync:
+                os.fsync(self._file.fileno())
+
+    def close(self):
+        """Saves the buffered entries to disk and closes the journal"""
+        self.flush(sync=True)
+        with self._lock:
+            self._file.close()
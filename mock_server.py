@@ -0,0 +1,171 @@
+# encoding: utf-8
+"""Serves a stand-in for the xMatters REST API, to restore to locally.
+
+Answers the /api/xm/1/ requests for sites, people, devices, groups, and
+their shifts and members that a restore makes, from an instance held in
+memory (see planner.SimulatedInstance), which starts out empty.  Each
+request can be slowed down by a fixed latency, and a share of them can be
+answered with a 503 (a temporary error, which the restore retries) or a
+429 with a Retry-After header, to see how a restore copes.
+
+Used by benchmark.py, or run on its own and restore to it with -x, e.g.:
+
+    $ python3 mock_server.py --port 8765 --latency 0.05 --throttle-rate 0.01
+    $ python3 restore-instance-data.py -x http://127.0.0.1:8765 -d defaults.json all
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+
+import argparse
+import collections
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import threading
+import time
+import urllib.parse
+
+import planner
+
+
+class MockServer(ThreadingHTTPServer):
+    """HTTP server answering the restore's requests from a simulated instance
+
+    Attributes:
+        instance (SimulatedInstance): The objects restored so far
+        latency (float): Seconds to wait before answering each request
+        error_rate (float): Share of requests answered with a 503
+        throttle_rate (float): Share of requests answered with a 429
+        retry_after (int): Seconds a 429 asks the client to wait
+        counts (Counter): The number of requests by (method, endpoint)
+        statuses (Counter): The number of responses by status code
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency: float = 0.0, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, retry_after: int = 1):
+        """
+        Args:
+            port (int): The port to listen on, or 0 for any free port
+            latency (float): Seconds to wait before answering each request
+            error_rate (float): Share of requests answered with a 503
+            throttle_rate (float): Share of requests answered with a 429
+            retry_after (int): Seconds a 429 asks the client to wait
+        """
+        super(MockServer, self).__init__(('127.0.0.1', port), _Handler)
+        self.instance = planner.SimulatedInstance()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.counts = collections.Counter()
+        self.statuses = collections.Counter()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """The base URL to restore to, e.g. 'http://127.0.0.1:8765'"""
+        return 'http://%s:%d' % self.server_address[:2]
+
+    def requests(self) -> int:
+        """Returns the number of requests answered so far"""
+        with self._lock:
+            return sum(self.statuses.values())
+
+    def start(self):
+        """Starts answering requests on a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops answering requests, and closes the socket"""
+        self.shutdown()
+        self.server_close()
+
+    def answer(self, method: str, path: str, params: dict, body) -> tuple:
+        """Returns the status, headers and object to answer a request with"""
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.counts[(method, planner.endpoint(path))] += 1
+        draw = random.random()
+        if draw < self.throttle_rate:
+            status, headers, obj = 429, {'Retry-After': str(self.retry_after)}, None
+        elif draw < self.throttle_rate + self.error_rate:
+            status, headers, obj = 503, {}, None
+        else:
+            status, obj = self.instance.handle(method, path.split(planner._API_PATH, 1)[-1], params, body)
+            headers = {}
+        with self._lock:
+            self.statuses[status] += 1
+        if obj is None and status >= 400:
+            obj = {'code': status, 'reason': 'Mock', 'message': 'Answered by the mock server'}
+        return status, headers, obj
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Hands each request to the MockServer, keeping connections alive"""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args): # pylint: disable=redefined-builtin
+        pass
+
+    def _handle(self, method: str):
+        url = urllib.parse.urlsplit(self.path)
+        params = {key: values[-1] for key, values in urllib.parse.parse_qs(url.query).items()}
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length)) if length else None
+        status, headers, obj = self.server.answer(method, url.path, params, body)
+        content = json.dumps(obj if obj is not None else {}).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self): # pylint: disable=invalid-name
+        self._handle('GET')
+
+    def do_POST(self): # pylint: disable=invalid-name
+        self._handle('POST')
+
+    def do_DELETE(self): # pylint: disable=invalid-name
+        self._handle('DELETE')
+
+
+def main():
+    """Serves until interrupted, then prints the requests answered"""
+    parser = argparse.ArgumentParser(description="Serves a stand-in for the xMatters REST API")
+    parser.add_argument("--port", type=int, default=8765,
+                        help="The port to listen on [default: %(default)s]")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds to wait before answering each request [default: %(default)s]")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Share of requests answered with a 503 [default: %(default)s]")
+    parser.add_argument("--throttle-rate", type=float, default=0.0,
+                        help="Share of requests answered with a 429 [default: %(default)s]")
+    parser.add_argument("--retry-after", type=int, default=1,
+                        help="Seconds a 429 asks the client to wait [default: %(default)s]")
+    args = parser.parse_args()
+
+    server = MockServer(args.port, args.latency, args.error_rate, args.throttle_rate, args.retry_after)
+    print('Serving a mock xMatters instance at %s, until interrupted.' % server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    for (method, name), count in sorted(server.counts.items(), key=lambda item: (item[0][1], item[0][0])):
+        print('  %-6s  %-40s  %8d' % (method, name, count))
+    print('Responses by status: %s' % ', '.join('%d: %d' % item for item in sorted(server.statuses.items())))
+
+if __name__ == '__main__':
+    main()
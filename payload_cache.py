@@ -0,0 +1,89 @@
+"""Remembers the payloads last restored to each xMatters instance.
+
+A small sqlite database holds, for each instance URL, object kind, and
+name, the hash of the payload last successfully sent and the id xMatters
+returned for it.  When the same payload is about to be sent again, the
+request (and the lookups that precede it) can be skipped.
+
+The cache is only as good as the assumption that nobody changed the
+objects in the instance since they were restored.  Delete the database
+(or leave out --cache) to send every payload again.
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+
+import sqlite3
+import threading
+
+COMMIT_INTERVAL = 500
+
+
+class PayloadCache:
+    """Payload hashes and ids of the objects restored to an instance
+
+    Attributes:
+        filename (str): Name of the sqlite database
+        url (str): The base URL of the xMatters instance
+        hits (int): Number of payloads found unchanged so far
+    """
+
+    def __init__(self, filename: str, url: str):
+        self.filename = filename
+        self.url = url
+        self.hits = 0
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._db = sqlite3.connect(filename, check_same_thread=False)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS payloads ('
+            ' url TEXT NOT NULL, kind TEXT NOT NULL, name TEXT NOT NULL,'
+            ' hash BLOB NOT NULL, id TEXT,'
+            ' PRIMARY KEY (url, kind, name))')
+        self._db.commit()
+
+    def lookup(self, kind: str, name: str, digest: bytes):
+        """Returns the id of the object if its payload is unchanged
+
+        Args:
+            kind (str): The kind of object (e.g. 'user', 'device')
+            name (str): The object's name or targetName
+            digest (bytes): The hash of the payload about to be sent
+
+        Return:
+            str: The id returned when the same payload was last sent, or
+                None if it has not been sent (or has changed) since
+        """
+        with self._lock:
+            row = self._db.execute(
+                'SELECT hash, id FROM payloads WHERE url = ? AND kind = ? AND name = ?',
+                (self.url, kind, name)).fetchone()
+            if row is None or row[0] != digest:
+                return None
+            self.hits += 1
+            return row[1]
+
+    def store(self, kind: str, name: str, digest: bytes, obj_id: str):
+        """Records the payload that was just sent successfully
+
+        Args:
+            kind (str): The kind of object (e.g. 'user', 'device')
+            name (str): The object's name or targetName
+            digest (bytes): The hash of the payload that was sent
+            obj_id (str): The id xMatters returned for the object
+        """
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO payloads (url, kind, name, hash, id) VALUES (?, ?, ?, ?, ?)',
+                (self.url, kind, name, digest, obj_id))
+            self._pending += 1
+            if self._pending >= COMMIT_INTERVAL:
+                self._db.commit()
+                self._pending = 0
+
+    def close(self):
+        """Saves the recorded payloads and closes the database"""
+        with self._lock:
+            self._db.commit()
+            self._db.close()
@@ -0,0 +1,411 @@
+"""Plans a restore: the requests it would make, and how long they would take.
+
+The plan goes through the same code as a restore with the requests engine
+(processor._run_phases()), reading the same capture files, baseline,
+journal (with --resume) and payload cache (with --cache), but with the HTTP
+session replaced by one that answers from a SimulatedInstance in memory.
+Nothing is sent to xMatters, and neither the journal nor the cache is
+written to.
+
+The simulated instance starts out empty, as the target of a disaster
+recovery would, apart from the captured objects of the kinds not being
+restored (e.g. the Sites, when planning users), and keeps what the restore
+creates.  So every lookup, supervisor update, device lookup, Shift delete,
+and Default Shift cleanup is counted just as the restore would make it.
+
+The estimated wall time assumes every request takes the same latency.
+Records that a restore spreads over --workers threads (or --concurrency
+tasks with the asyncio engine) are assumed to run that many at once, but no
+faster than their slowest record, while everything else runs one request
+at a time.  Retries, throttling and --overlap are not taken into account.
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+
+import collections
+import datetime
+import os
+import shutil
+import tempfile
+import threading
+import urllib.parse
+import uuid
+
+import capture_reader
+import codec
+import common_logger
+import config
+import payload_cache
+import processor
+
+_API_PATH = '/api/xm/1/'
+
+
+def endpoint(url: str) -> str:
+    """Returns the endpoint of a request URL, with its ids and names left out
+
+    Args:
+        url (str): The request URL
+
+    Return:
+        str: The path below the API, e.g. '/groups/{id}/shifts'
+    """
+    path = urllib.parse.urlsplit(url).path
+    parts = path.split(_API_PATH, 1)[-1].strip('/').split('/')
+    return '/' + '/'.join(part if i % 2 == 0 else '{id}' for i, part in enumerate(parts))
+
+
+class SimulatedInstance:
+    """An xMatters instance held in memory, answering the restore's requests
+
+    Only the requests a restore makes are supported, with just enough of
+    xMatters' behaviour for the restore to follow the same path it would on
+    a real instance: e.g. a new Group comes with a Default Shift, a Site,
+    User or Group can't be created twice (409), and neither can a Shift
+    (which xMatters answers with a 501).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sites = {}
+        self._people = {}
+        self._devices = {}
+        self._groups = {}
+
+    def add(self, collection: str, obj: dict, shifts: list = ()):
+        """Adds an object as though it already existed in the instance
+
+        Args:
+            collection (str): 'sites', 'people' or 'groups'
+            obj (dict): The captured object, keeping its captured id
+            shifts (list): The captured Shifts of a Group
+        """
+        obj = dict(obj)
+        obj.setdefault('id', str(uuid.uuid4()))
+        with self._lock:
+            if collection == 'groups':
+                obj['_shifts'] = {shift['name']: {'id': shift.get('id', str(uuid.uuid4())),
+                                                  'name': shift['name'], '_members': []}
+                                  for shift in shifts}
+            {'sites': self._sites, 'people': self._people, 'groups': self._groups}[collection][obj['id']] = obj
+
+    def handle(self, method: str, path: str, params: dict = None, body=None) -> tuple:
+        """Answers a request
+
+        Args:
+            method (str): 'GET', 'POST' or 'DELETE'
+            path (str): The path below the API, e.g. 'groups/abc/shifts'
+            params (dict): The query parameters (offset and limit)
+            body (dict): The decoded request body, for a POST
+
+        Return:
+            tuple: The status code, then the object to return as JSON (or
+                None for an error)
+        """
+        parts = [urllib.parse.unquote(part) for part in path.strip('/').split('/')]
+        handler = {
+            'sites': self._site_request,
+            'people': self._person_request,
+            'devices': self._device_request,
+            'groups': self._group_request,
+        }.get(parts[0])
+        if handler is None:
+            return 404, None
+        with self._lock:
+            return handler(method, parts, params or {}, body)
+
+    @staticmethod
+    def _page(objects: list, params: dict) -> dict:
+        offset = int(params.get('offset', 0))
+        limit = int(params.get('limit', config.page_size))
+        data = [SimulatedInstance._public(obj) for obj in objects[offset:offset + limit]]
+        return {'count': len(data), 'total': len(objects), 'data': data}
+
+    @staticmethod
+    def _public(obj: dict) -> dict:
+        return {key: value for key, value in obj.items() if not key.startswith('_')}
+
+    @staticmethod
+    def _find(objects: dict, key: str, name: str = 'targetName'):
+        """Returns the object with key as its id or name, or None"""
+        if key in objects:
+            return objects[key]
+        return next((obj for obj in objects.values() if obj.get(name) == key), None)
+
+    @staticmethod
+    def _save(objects: dict, body: dict, name: str = 'targetName') -> tuple:
+        """Updates the object with the body's id, or creates a new one
+
+        Creating an object whose name is already taken is refused with a 409,
+        as xMatters does.  The restore looks each Site, User and Group up
+        first, so it only gets a 409 if the object appeared in between, and
+        then treats the request as failed.
+        """
+        if body.get('id') in objects:
+            objects[body['id']].update(body)
+            return 200, SimulatedInstance._public(objects[body['id']])
+        if body.get(name) is not None and SimulatedInstance._find(objects, body[name], name) is not None:
+            return 409, None
+        body['id'] = str(uuid.uuid4())
+        objects[body['id']] = body
+        return 201, SimulatedInstance._public(body)
+
+    def _site_request(self, method: str, parts: list, params: dict, body: dict) -> tuple:
+        if method == 'GET' and len(parts) == 1:
+            return 200, self._page(list(self._sites.values()), params)
+        if method == 'GET':
+            site = self._find(self._sites, parts[1], 'name')
+            return (200, site) if site else (404, None)
+        if method == 'POST':
+            return self._save(self._sites, body, 'name')
+        return 405, None
+
+    def _person_request(self, method: str, parts: list, params: dict, body: dict) -> tuple:
+        if method == 'GET' and len(parts) == 1:
+            return 200, self._page(list(self._people.values()), params)
+        if method == 'POST' and len(parts) == 1:
+            return self._save(self._people, body)
+        person = self._find(self._people, parts[1]) if len(parts) > 1 else None
+        if person is None or method != 'GET':
+            return 404, None
+        if len(parts) == 3:
+            devices = [device for device in self._devices.values() if device['owner'] == person['id']]
+            return 200, self._page(devices, params)
+        return 200, person
+
+    def _device_request(self, method: str, parts: list, params: dict, body: dict) -> tuple:
+        if method == 'GET' and len(parts) == 1:
+            return 200, self._page(list(self._devices.values()), params)
+        if method == 'GET':
+            device = self._find(self._devices, parts[1])
+            return (200, device) if device else (404, None)
+        if method == 'POST':
+            owner = self._people.get(body.get('owner'))
+            if owner is None:
+                return 400, None
+            body['targetName'] = owner['targetName'] + '|' + body['name']
+            return self._save(self._devices, body, 'id')
+        return 405, None
+
+    def _group_request(self, method: str, parts: list, params: dict, body: dict) -> tuple: # pylint: disable=too-many-return-statements
+        if method == 'GET' and len(parts) == 1:
+            return 200, self._page(list(self._groups.values()), params)
+        if method == 'POST' and len(parts) == 1:
+            status, group = self._save(self._groups, body)
+            if status == 201:
+                body['_shifts'] = {config.new_default_shift_name: {
+                    'id': str(uuid.uuid4()), 'name': config.new_default_shift_name, '_members': []}}
+            return status, group
+        group = self._find(self._groups, parts[1])
+        if group is None:
+            return 404, None
+        if len(parts) == 2:
+            return (200, self._public(group)) if method == 'GET' else (405, None)
+
+        shifts = group['_shifts']
+        if len(parts) == 3:
+            if method == 'GET':
+                return 200, self._page(list(shifts.values()), params)
+            if body['name'] in shifts:
+                # xMatters answers a Shift that already exists with a 501
+                return 501, None
+            body['id'] = str(uuid.uuid4())
+            body['_members'] = []
+            shifts[body['name']] = body
+            return 201, self._public(body)
+        shift = shifts.get(parts[3]) or self._find(shifts, parts[3], 'id')
+        if shift is None:
+            return 404, None
+        if len(parts) == 4:
+            if method == 'DELETE':
+                del shifts[shift['name']]
+            return 200, self._public(shift)
+
+        members = shift['_members']
+        if len(parts) == 5 and method == 'GET':
+            return 200, self._page(members, params)
+        if len(parts) == 5:
+            recipient_id = body['recipient']['id']
+            if recipient_id is None:
+                return 400, None
+            # Recipients restored by an earlier run aren't known here
+            recipient = self._people.get(recipient_id) or self._groups.get(recipient_id) or {}
+            member = dict(body, recipient=dict(body['recipient'], targetName=recipient.get('targetName')))
+            members[:] = [old for old in members if old['recipient']['id'] != recipient_id] + [member]
+            return 201, member
+        remaining = [member for member in members if member['recipient']['id'] != parts[5]]
+        if method != 'DELETE' or len(remaining) == len(members):
+            return 404, None
+        members[:] = remaining
+        return 200, {}
+
+
+class _Response:
+    """Just enough of a requests.Response for the processor"""
+
+    def __init__(self, status_code: int, obj):
+        self.status_code = status_code
+        self.headers = {}
+        self.content = codec.dumps(obj if obj is not None else {
+            'code': status_code, 'reason': 'Simulated', 'message': 'Answered by the restore plan'})
+
+
+class PlanningSession:
+    """Stands in for the HTTP session, counting the requests made through it
+
+    Attributes:
+        instance (SimulatedInstance): Answers the requests
+        counts (Counter): The number of requests by (method, endpoint)
+    """
+
+    def __init__(self, instance: SimulatedInstance, on_request=None):
+        """
+        Args:
+            instance (SimulatedInstance): Answers the requests
+            on_request (callable): Called without arguments for each request
+        """
+        self.instance = instance
+        self.counts = collections.Counter()
+        self._on_request = on_request
+        self._lock = threading.Lock()
+
+    def request(self, method, url, params=None, data=None, **kwargs): # pylint: disable=unused-argument
+        """Answers a request from the simulated instance, and counts it"""
+        with self._lock:
+            self.counts[(method, endpoint(url))] += 1
+            if self._on_request is not None:
+                self._on_request()
+        path = urllib.parse.urlsplit(url).path.split(_API_PATH, 1)[-1]
+        body = codec.loads(data) if data else None
+        return _Response(*self.instance.handle(method, path, params, body))
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+
+class Estimate:
+    """Adds up the wall time of the planned requests
+
+    Attributes:
+        latency (float): Seconds each request is assumed to take
+        concurrency (int): The most records restored at once
+        seconds (float): The estimated wall time so far
+    """
+
+    def __init__(self, latency: float, concurrency: int):
+        self.latency = latency
+        self.concurrency = max(1, concurrency)
+        self.seconds = 0.0
+        self._batch = None
+
+    def request(self):
+        """Adds one request, to the record being planned if there is one"""
+        if self._batch is None:
+            self.seconds += self.latency
+        else:
+            self._batch[-1] += 1
+
+    def map_items(self, func, items):
+        """Plans the records a restore spreads over its workers
+
+        Stands in for processor._map_workers(), applying func to each item
+        in turn, and adding the time the batch of records would take.
+        """
+        batch = self._batch = []
+        try:
+            for item in items:
+                batch.append(0)
+                yield func(item)
+        finally:
+            self._batch = None
+            if batch:
+                self.seconds += max(sum(batch) / self.concurrency, max(batch)) * self.latency
+
+
+def _add_existing(instance: SimulatedInstance, objects_to_process: list):
+    """Adds the captured objects that are not to be restored to the instance
+
+    Restoring only some kinds of object assumes the others already exist,
+    e.g. that the Sites of the Users restored by users-only do.
+    """
+    existing = []
+    if 'sites' not in objects_to_process:
+        existing.append((config.sites_filename, lambda site: [('sites', site, ())]))
+    if 'users' not in objects_to_process:
+        existing.append((config.users_filename, lambda user: [('people', user['user'], ())]))
+    if 'groups' not in objects_to_process:
+        existing.append((config.groups_filename, lambda group: [('groups', group['group'], group['shifts'])]))
+    for filename, objects in existing:
+        try:
+            for record in capture_reader.read_records(filename):
+                for collection, obj, shifts in objects(record):
+                    instance.add(collection, obj, shifts)
+        except FileNotFoundError:
+            pass
+
+class _ReadOnlyCache(payload_cache.PayloadCache):
+    """The payload cache, left as it is by the plan"""
+
+    def store(self, kind: str, name: str, digest: bytes, obj_id: str):
+        pass
+
+
+def _report(objects_to_process: list, session: PlanningSession, estimate: Estimate) -> str:
+    """Returns the plan as a table of the requests and the estimated time"""
+    width = max([len(name) for _, name in session.counts] + [len('Total')])
+    lines = ['Requests to restore %s:' % ', '.join(objects_to_process)]
+    for (method, name), count in sorted(session.counts.items(), key=lambda item: (item[0][1], item[0][0])):
+        lines.append('  %-6s  %-*s  %8d' % (method, width, name, count))
+    lines.append('  %-6s  %-*s  %8d' % ('', width, 'Total', sum(session.counts.values())))
+    lines.append('Estimated time: %s at %.3fs per request, with %d %s at once.' % (
+        datetime.timedelta(seconds=round(estimate.seconds)), estimate.latency, estimate.concurrency,
+        'tasks' if config.engine == 'asyncio' else 'workers'))
+    return '\n'.join(lines)
+
+def plan(objects_to_process: list):
+    """Plans the restore of objects_to_process, and prints the plan
+
+    Args:
+        objects_to_process (list): The list of object types to restore.
+    """
+    logger = common_logger.get_logger()
+    concurrency = config.concurrency if config.engine == 'asyncio' else config.workers
+    estimate = Estimate(config.plan_latency, concurrency)
+    instance = SimulatedInstance()
+    _add_existing(instance, objects_to_process)
+    session = PlanningSession(instance, estimate.request)
+
+    # Work on a copy of the journal, so the plan leaves it as it is
+    journal_filename = config.journal_filename
+    map_workers = processor._map_workers
+    with tempfile.TemporaryDirectory() as directory:
+        config.journal_filename = os.path.join(directory, os.path.basename(journal_filename))
+        if config.resume and os.path.exists(journal_filename):
+            shutil.copyfile(journal_filename, config.journal_filename)
+
+        processor._logger = logger
+        processor._session = session
+        processor._journal = processor._open_journal()
+        processor._cache = None
+        if config.cache_filename and os.path.exists(config.cache_filename):
+            processor._cache = _ReadOnlyCache(config.cache_filename, config.xmod_url)
+        processor._map_workers = estimate.map_items
+        try:
+            processor._run_phases(objects_to_process)
+        finally:
+            processor._map_workers = map_workers
+            processor._journal.close()
+            processor._close_cache()
+            config.journal_filename = journal_filename
+
+    report = _report(objects_to_process, session, estimate)
+    logger.info(report)
+    print(report)
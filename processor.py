@@ -5,27 +5,64 @@
 
 """
 
+import collections
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import contextlib
+import functools
 from io import TextIOBase
-import json
 import pprint
+import signal
 import sys
+import threading
 import time
 import urllib.parse
 
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
 from requests import Session
 
+import capture_diff
+import capture_reader
+import codec
 import config
 import common_logger
+import concurrency_control
+import journal
+import payload_cache
+import request_metrics
+import retry_policy
+import scheduler
 
 _logger = None
+_session = None
+_journal = None
+_cache = None
 _users = None
 _site_dict = {}
 _user_dict = {}
 _supervisor_dict = {}
+_deferred_supervisors = {}
 _group_dict = {}
+_new_shifts = set()
+_dict_lock = threading.RLock()
+_sites_prefetched = False
+_users_prefetched = False
+_groups_prefetched = False
+_baselines = {}
+
+# The key and parts compared against the baseline capture, per record kind
+_CAPTURE_PARTS = {
+    'site': (lambda site: site['name'],
+             {'site': lambda site: site}),
+    'user': (lambda record: record['user']['targetName'],
+             {'user': lambda record: record['user'],
+              'devices': lambda record: record.get('devices')}),
+    'group': (lambda record: record['group']['targetName'],
+              {'group': lambda record: record['group'],
+               'shifts': lambda record: record.get('shifts')}),
+}
 
 
 def _log_xm_error(url, response):
@@ -37,16 +74,368 @@ def _log_xm_error(url, response):
         url (str): The location being requested that caused the error
         response (object): JSON object that holds the error response
     """
-    body = response.json()
+    body = codec.loads(response.content)
     if response.status_code == 404:
         _logger.warn(config.ERR_INITIAL_REQUEST_FAILED_MSG,
                      response.status_code, url)
     else:
-        _logger.error(f'Response - ' \
-                      f'code: {body["code"] if "code" in body else "none"}, ' \
-                      f'reason: {body["reason"] if "reason" in body else "none"}, ' \
-                      f'message: {body["message"] if "message" in body else "none"}, ' \
-                      f'\n\tURL: {url}')
+        _logger.error('Response - code: %s, reason: %s, message: %s, \n\tURL: %s',
+                      body.get('code', 'none'), body.get('reason', 'none'), body.get('message', 'none'), url)
+
+def _create_session() -> Session:
+    """Creates the pooled HTTP session shared by every request
+
+    Builds a single keep-alive session so connections (and their TLS
+    handshakes) are reused across the whole restore, instead of opening a
+    new connection per request.  The connection pool is sized from
+    config.pool_size (but never below config.workers, so no worker waits
+    for a connection), and the authentication, content type, and default
+    timeouts are attached once to the session rather than to every call.
+
+    Returns:
+        Session: session
+    """
+    controller = (concurrency_control.ConcurrencyController(config.workers)
+                  if config.adaptive else None)
+    session = ResilientSession(
+        retry_policy.RetryPolicy(config.retry_attempts, config.retry_budget), controller,
+        request_metrics.RequestMetrics(), (config.connect_timeout, config.read_timeout))
+    session.pool_size = max(config.pool_size, config.workers)
+    adapter = HTTPAdapter(pool_connections=session.pool_size,
+                          pool_maxsize=session.pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.auth = config.basic_auth
+    session.headers.update({'Content-Type': 'application/json'})
+    return session
+
+def _read_capture(filename: str, kind: str = None, selection=None):
+    """Yields the records from a capture file, or only the selected ones
+
+    Selected records are read directly using the capture's sidecar index
+    rather than by scanning the whole file.
+
+    Args:
+        filename (str): Name of the capture file to read from
+        kind (str): The record's object key holding the targetName
+        selection: None for every record, or a set of targetNames or a
+            compiled pattern that the targetNames must fully match
+
+    Returns:
+        dict: The next record
+    """
+    if selection is None:
+        return capture_reader.read_records(filename)
+    return capture_reader.read_spans(filename, _selected_spans(filename, kind, selection))
+
+def _scan_capture(filename: str, kind: str, selection=None):
+    """Yields the records from a capture file along with their byte offsets
+
+    Reads the same records as _read_capture(), and only uses the capture's
+    sidecar index when records are selected.
+
+    Args:
+        filename (str): Name of the capture file to read from
+        kind (str): The record's object key holding the targetName
+        selection: None for every record, or a set of targetNames or a
+            compiled pattern that the targetNames must fully match
+
+    Returns:
+        tuple: The offset, the length, and the record
+    """
+    if selection is None:
+        yield from capture_reader.scan_records(filename)
+        return
+    spans = sorted(_selected_spans(filename, kind, selection))
+    for (offset, length), record in zip(spans, capture_reader.read_spans(filename, spans)):
+        yield (offset, length, record)
+
+def _selected_spans(filename: str, kind: str, selection) -> list:
+    """Returns the [offset, length] of each selected record, from the index"""
+    index = capture_reader.load_index(filename, kind)
+    if isinstance(selection, set):
+        names = [name for name in selection if name in index]
+        for name in selection.difference(names):
+            _logger.warning('Unable to find %s "%s" in %s.', kind, name, filename)
+    else:
+        names = [name for name in index if selection.fullmatch(name)]
+    _logger.info('Restoring %d selected of %d captured records from %s.', len(names), len(index), filename)
+    return [index[name] for name in names]
+
+def _open_journal():
+    """Opens the restore journal, reloading the ids from it when resuming
+
+    Return:
+        Journal: The journal for this run
+    """
+    restore_journal = journal.Journal(config.journal_filename, config.resume)
+    if restore_journal.resumed:
+        with _dict_lock:
+            _site_dict.update(restore_journal.get('site'))
+            for target_name, user in restore_journal.get('user').items():
+                _user_dict[target_name] = user['id']
+                _supervisor_dict[user['id']] = user['supervisors']
+            _group_dict.update(restore_journal.get('group'))
+        _logger.info('Resuming from journal %s with %d Sites, %d Users and %d Groups already restored.',
+                     config.journal_filename, len(restore_journal.get('site')),
+                     len(restore_journal.get('user')), len(restore_journal.get('group')))
+    elif config.resume:
+        _logger.warning('No journal found at %s, so starting from the beginning.', config.journal_filename)
+    return restore_journal
+
+def _open_cache():
+    """Opens the payload cache, if one was requested
+
+    Return:
+        PayloadCache: The cache for this instance, or None
+    """
+    if not config.cache_filename:
+        return None
+    _logger.info('Skipping payloads unchanged since last restored, per %s.', config.cache_filename)
+    return payload_cache.PayloadCache(config.cache_filename, config.xmod_url)
+
+def _close_cache():
+    """Saves and closes the payload cache, if one was opened"""
+    if _cache is not None:
+        _logger.info('Skipped %d payloads that were unchanged since last restored.', _cache.hits)
+        _cache.close()
+
+def _phase_pending(phase: str) -> bool:
+    """Returns False (and says so) if the journal shows the phase completed"""
+    if _journal.phase_done(phase):
+        _logger.info('Skipping %s, as they were restored by the run being resumed.', phase.capitalize())
+        return False
+    return True
+
+def _finish_phase(phase: str, complete: bool):
+    """Journals a phase as finished, unless any of its records failed
+
+    A phase left open runs again when resumed, and only retries the records
+    that the journal does not show as restored.
+
+    Args:
+        phase (str): The phase that has run
+        complete (bool): True if every one of its records was restored
+    """
+    if complete:
+        _journal.finish_phase(phase)
+    else:
+        _logger.warning('Not every one of the %s was restored, so --resume will try the rest again.',
+                        phase.capitalize())
+
+def _pending(records, kind: str, key):
+    """Yields the records that the journal does not show as restored
+
+    Args:
+        records (iterable): The captured records
+        kind (str): The kind of object the journal recorded them as
+        key (function): Returns the name of a record
+
+    Returns:
+        dict: The next record still to restore
+    """
+    skipped = 0
+    for record in records:
+        if _journal.is_done(kind, key(record)):
+            skipped += 1
+            continue
+        yield record
+    if skipped:
+        _logger.info('Skipped %d %s records restored by the run being resumed.', skipped, kind)
+
+def _baseline_filename(kind: str) -> str:
+    return {'site': config.baseline_sites_filename,
+            'user': config.baseline_users_filename,
+            'group': config.baseline_groups_filename}[kind]
+
+def _changed_parts(kind: str, record: dict) -> set:
+    """Returns which parts of a record changed since the baseline capture
+
+    The baseline capture is read once, on first use, into the content hash
+    of each of its records.
+
+    Args:
+        kind (str): The kind of record ('site', 'user' or 'group')
+        record (dict): The record from the capture being restored
+
+    Return:
+        set: The changed part names; all of them if there is no baseline
+    """
+    key, parts = _CAPTURE_PARTS[kind]
+    if config.baseline_time_str is None:
+        return set(parts)
+    if kind not in _baselines:
+        filename = _baseline_filename(kind)
+        try:
+            _baselines[kind] = capture_diff.load_hashes(filename, key, parts)
+            _logger.info('Read %d baseline records from %s.', len(_baselines[kind]), filename)
+        except FileNotFoundError:
+            _logger.warning('Baseline capture %s not found, so restoring every %s.', filename, kind)
+            _baselines[kind] = {}
+    return capture_diff.changed_parts(_baselines[kind], key(record), record, parts)
+
+def _changed(records, kind: str, parts: set):
+    """Yields the records with any of parts added or changed since the baseline
+
+    Args:
+        records (iterable): The captured records
+        kind (str): The kind of record ('site', 'user' or 'group')
+        parts (set): The part names to compare
+
+    Returns:
+        dict: The next record to restore
+    """
+    if config.baseline_time_str is None:
+        yield from records
+        return
+    unchanged = 0
+    for record in records:
+        if _changed_parts(kind, record) & parts:
+            yield record
+        else:
+            unchanged += 1
+    _logger.info('Skipped %d %s records unchanged since the %s capture.', unchanged, kind, config.baseline_time_str)
+
+def _payload_hash(payload: dict, exclude: str = 'id'):
+    """Returns the hash of a payload for the cache, or None without a cache
+
+    Args:
+        payload (dict): The payload about to be sent
+        exclude (str): A field to leave out, such as an id that is only
+            looked up once the payload is known to have changed
+    """
+    if _cache is None:
+        return None
+    return capture_diff.content_hash({k: v for k, v in payload.items() if k != exclude})
+
+def _cached_id(kind: str, name: str, digest: bytes):
+    """Returns the object's id if the same payload was last sent for it"""
+    if digest is None:
+        return None
+    obj_id = _cache.lookup(kind, name, digest)
+    if obj_id is not None:
+        _logger.debug('%s "%s" is unchanged since it was last restored.  Skipping.', kind.capitalize(), name)
+    return obj_id
+
+def _cache_payload(kind: str, name: str, digest: bytes, obj_id: str):
+    """Records a payload that was sent successfully, when caching"""
+    if digest is not None:
+        _cache.store(kind, name, digest, obj_id)
+
+def _write_metrics(metrics: request_metrics.RequestMetrics):
+    """Writes the request metrics of the run, and logs them per endpoint"""
+    _logger.info('Requests by endpoint:\n%s', metrics.summary())
+    try:
+        metrics.write(config.metrics_filename, config.prometheus_filename)
+    except OSError as e:
+        _logger.error('Unable to write the request metrics: %s', e)
+        return
+    _logger.info('Wrote the request metrics to %s and %s.', config.metrics_filename, config.prometheus_filename)
+
+def _on_sigint(signum, frame):
+    """Saves the journal before letting the interrupt stop the restore"""
+    _journal.flush(sync=True)
+    raise KeyboardInterrupt
+
+def _map_workers(func, items):
+    """Applies func to each item, using a bounded pool of worker threads
+
+    When config.workers is 1 (the default) the items are processed in order
+    on the calling thread.  Otherwise up to config.workers items are processed
+    concurrently, and only a small window of items is read ahead from the
+    iterable so that large capture files are never fully loaded.
+
+    Args:
+        func (callable): Called with each item
+        items (iterable): The items to process
+
+    Returns:
+        object: The result of func for each item, in completion order
+    """
+    if config.workers <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    max_pending = config.workers * 2
+    with ThreadPoolExecutor(max_workers=config.workers) as executor:
+        pending = set()
+        for item in items:
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(executor.submit(func, item))
+        for future in pending:
+            yield future.result()
+
+# A request to xMatters, yielded by the steps of a restore (see _run())
+_Request = collections.namedtuple('_Request', 'method url data params resilient',
+                                  defaults=(None, None, False))
+
+def _run(func, *args):
+    """Runs the steps of a restore, making each request they yield
+
+    The functions that talk to xMatters (such as _add_user()) are
+    generators that yield a _Request for each request they need, and are
+    sent back the response, or None if the request could not be made.  This
+    makes the requests with the shared session, on the calling thread, while
+    the asyncio engine runs the same steps with its own transport.
+
+    Args:
+        func (function): The generator function, e.g. _restore_site
+        args: The arguments to call it with
+
+    Return:
+        object: What the steps returned
+    """
+    steps = func(*args)
+    try:
+        request = next(steps)
+        while True:
+            try:
+                response = _session.request(request.method, request.url, data=request.data,
+                                            params=request.params, resilient=request.resilient)
+            except requests.exceptions.RequestException as e:
+                _logger.error(config.ERR_REQUEST_EXCEPTION_MSG, request.url, repr(e))
+                response = None
+            request = steps.send(response)
+    except StopIteration as stop:
+        return stop.value
+
+class _ListingError(Exception):
+    """Raised when a page of an xMatters list could not be retrieved"""
+
+def _get_paged(url: str, objects: dict, key, value=None):
+    """Retrieves every object from a paged xMatters list
+
+    Pages through the list at url, config.page_size objects at a time.
+
+    Args:
+        url (str): The location of the list to retrieve
+        objects (dict): Filled with the objects from the list, by key
+        key (function): Returns the key of an object
+        value (function): Returns what to keep of an object, if not all of it
+
+    Raises:
+        _ListingError: If a page could not be retrieved, after the objects
+            of the earlier pages were added
+    """
+    offset = 0
+    while True:
+        _logger.debug('Retrieving page at offset %d, url=%s', offset, url)
+        response = yield _Request('GET', url, params={'offset': offset, 'limit': config.page_size})
+        if response is None:
+            raise _ListingError(url)
+        if response.status_code not in [200]:
+            _log_xm_error(url, response)
+            raise _ListingError(url)
+        page = codec.loads(response.content)
+        for obj in page['data']:
+            objects[key(obj)] = obj if value is None else value(obj)
+        offset += page['count']
+        if page['count'] == 0 or offset >= page['total']:
+            return
 
 def _open_in_file(filename: str) -> TextIOBase:
     """Opens data file to restore
@@ -60,54 +449,46 @@ def _open_in_file(filename: str) -> TextIOBase:
     inFile = open(filename)
     return inFile
 
-def _add_site(site_json):
-    """Attempst to add a new Site object from the JSON string.
+def _add_site(site_obj: dict):
+    """Attempst to add a new Site object from the captured record.
         
     Creates a dict object to pass to xMatters to create a new Site
         
     Args:
-        site_json: The JSON payload representing the Site to add
+        site_obj (dict): The captured Site to add
     """
-    # Conver the Site JSON string to an object
-    site_obj = json.loads(site_json)
+    # Skip the Site if it was last restored with the same payload
+    digest = _payload_hash(site_obj)
+    site_id = _cached_id('site', site_obj['name'], digest)
+    if site_id is not None:
+        return dict(site_obj, id=site_id)
+
+    # Find the existing site (from the prefetched Sites) so the request
+    # either updates it or creates a new one, rather than causing a 409
+    existing_site = yield from _get_site(site_obj['name'])
+    if existing_site is not None:
+        site_obj['id'] = existing_site['id']
+    else:
+        site_obj.pop('id', None)
     
     # Set our resource URLs
     url = config.xmod_url + '/api/xm/1/sites'
-    _logger.debug('Attempting to create Site with body:\n\t "%s"\n\tvia url: %s', site_json, url)
+    site_json = codec.dumps(site_obj)
+    _logger.debug('Attempting to create Site with body:\n\t "%s"\n\tvia url: %s', common_logger.LazyJson(site_json), url)
 
     # Initialize loop with first request
-    try:
-        response = requests.post(url,
-                                 headers = {'Content-Type': 'application/json'},
-                                 data = site_json,
-                                 auth=config.basic_auth)
-    except requests.exceptions.RequestException as e:
-        _logger.error(config.ERR_REQUEST_EXCEPTION_CODE, url, repr(e))
+    response = yield _Request('POST', url, site_json)
+    if response is None:
         return None
 
-    # If the response from the first attempt is a 409, find the existing site
-    # and update the ID and try again.
-    if response.status_code in [409]:
-        existing_site = _get_site(site_obj['name'])
-        if existing_site is not None:
-            site_obj['id'] = existing_site['id']
-        _logger.debug('Retrying to create Site after 409 with body:\n\t "%s"\n\tvia url: %s', site_json, url)
-        try:
-            response = requests.post(url,
-                                    headers = {'Content-Type': 'application/json'},
-                                    data = json.dumps(site_obj),
-                                    auth=config.basic_auth)
-        except requests.exceptions.RequestException as e:
-            _logger.error(config.ERR_REQUEST_EXCEPTION_CODE, url, repr(e))
-            return None
-
     # If the initial response fails, log and return null
     if response.status_code not in [200, 201]:
         _log_xm_error(url, response)
         return None
 
     # Process the response
-    site_obj = response.json()
+    site_obj = codec.loads(response.content)
+    _cache_payload('site', site_obj['name'], digest, site_obj['id'])
     _logger.info('Created/Updated Site "%s" - Id: %s', site_obj['name'], site_obj['id'])
     # _logger.debug('Created/Updated Site "%s" - json body: %s', site_obj['name'], pprint.pformat(site_obj))
     return site_obj
@@ -122,22 +503,34 @@ def _process_sites():
         None
 
     Return:
-        None
+        bool: True if every Site was restored
     """
-    with open(config.sites_filename) as sites_file:
-        num_lines = 0
-        num_sites = 0
-        for site_json in sites_file:
-            # Ignore the opening array markers ("[\n" and "]\n")
-            if len(site_json) > 2:
-                # Remove trailing ",\n" or trailing "\n"
-                site_json = site_json[:-2] if site_json[-2:] == ',\n' else site_json[:-1]
-                num_lines += 1
-                site_obj = _add_site(site_json)
-                _site_dict[site_obj['name']] = site_obj
-                num_sites += 0 if site_obj == None else 1
+    num_lines = 0
+    num_sites = 0
+    records = _changed(_read_capture(config.sites_filename), 'site', {'site'})
+    for site_obj in _pending(records, 'site', lambda site: site['name']):
+        num_lines += 1
+        num_sites += 1 if _run(_restore_site, site_obj) else 0
 
     _logger.info("Restored %d of a possible %d Sites.", num_sites, num_lines)
+    return num_sites == num_lines
+
+def _restore_site(site_obj: dict) -> bool:
+    """Restores a Site, then adds it to the Site dictionary and the journal
+
+    Args:
+        site_obj (dict): The captured Site
+
+    Return:
+        bool: True if the Site was restored
+    """
+    site_obj = yield from _add_site(site_obj)
+    if not site_obj:
+        return False
+    with _dict_lock:
+        _site_dict[site_obj['name']] = site_obj
+    _journal.record('site', site_obj['name'], site_obj)
+    return True
 
 def _get_site(name: str):
     """Get a site object by name
@@ -150,28 +543,81 @@ def _get_site(name: str):
     Return:
         site (dict): The found site object
     """
-    if name in _site_dict:
+    # Once every Site has been prefetched, anything else is known not to exist
+    if _sites_prefetched or name in _site_dict:
         _logger.debug('Found Site "%s"', name)
-        return _site_dict[name]
+        return _site_dict.get(name)
 
     # Initialize conditions
     url = config.xmod_url + '/api/xm/1/sites/' + urllib.parse.quote(name)
     _logger.debug('Retrieving Site, url=%s', url)
 
     # Get the site records
-    response = requests.get(url, auth=config.basic_auth)
+    response = yield _Request('GET', url)
+    if response is None:
+        return None
     if response.status_code not in [200]:
         _log_xm_error(url, response)
         return None
 
     # Process the responses
-    site = response.json()
-    _site_dict[name] = site
+    site = codec.loads(response.content)
+    with _dict_lock:
+        _site_dict[name] = site
     _logger.debug('Retrieved Site "%s"', name)
 
     return site
 
-def _add_devices(user_id: str, target_name: str, devices: list):
+def _prefetch_sites():
+    """Retrieves every existing Site in one paged scan
+
+    Fills the Site dictionary with every site already in the target
+    instance, so that Sites, Users, and Groups resolve their sites locally.
+
+    Args:
+        None
+
+    Return:
+        None
+    """
+    global _sites_prefetched # pylint: disable=global-statement
+
+    url = config.xmod_url + '/api/xm/1/sites'
+    sites = {}
+    try:
+        yield from _get_paged(url, sites, lambda site: site['name'])
+    except _ListingError:
+        _logger.warning('Only %d existing Sites could be prefetched, so the rest will be looked up one at a time.', len(sites))
+        return
+    finally:
+        with _dict_lock:
+            _site_dict.update(sites)
+    _sites_prefetched = True
+    _logger.info("Prefetched %d existing Sites.", len(sites))
+
+def _prepare_device(device: dict, user_id: str, device_id: str):
+    """Prepares a captured Device object to be added back in
+
+    Args:
+        device (dict): The captured Device, updated in place
+        user_id (str): The UUID of the User that owns the Device
+        device_id (str): The UUID of the existing Device, or None if it
+            needs to be recreated
+    """
+    device['owner'] = user_id
+    if device_id:
+        device['id'] = device_id
+    else:
+        del device['id']
+    del device['targetName']
+    del device['links']
+    if 'timeframes' in device:
+        if device['timeframes']['total'] > 0 and 'data' in device['timeframes']:
+            device['timeframes'] = device['timeframes']['data']
+        else:
+            del device['timeframes']
+
+def _add_devices(user_id: str, target_name: str, devices: list, existing_devices: dict = None):
     """Attempst to add the Device objects from the Device list.
         
     Creates Device objects based on the device_list
@@ -180,46 +626,45 @@ def _add_devices(user_id: str, target_name: str, devices: list):
         user_id (str): The UUID of the User to add the devices to
         target_name (str): The targetName field for the User to add devices to
         devices (list): The list object containing the Devices to add
+        existing_devices (dict): The ids of the User's existing Devices by
+            name.  If None, they are retrieved with a single request, or
+            looked up one at a time if that fails.
     """
     dev_count = 0
+    pending = []
     for device in devices:
-
-        # Update the device
-        device['owner'] = user_id
-        tempID = device['id']
-    
-        # Attempt to get the group from XM based on targetName
-        # If not found, remove the UUID so it can be recreated
-        xmDeviceID = _get_device( device['targetName'] )
-    
-        if xmDeviceID:
-            device['id'] = xmDeviceID
+        # Prepare the device without its UUID first, so a device last
+        # restored with the same payload can be skipped before looking up
+        # the User's existing devices
+        _prepare_device(device, user_id, None)
+        name = target_name + '|' + device['name']
+        digest = _payload_hash(device)
+        if _cached_id('device', name, digest) is not None:
+            dev_count += 1
         else:
-            del device['id']
+            pending.append((device, name, digest))
 
+    if pending and existing_devices is None:
+        existing_devices = yield from _get_user_devices(user_id, target_name)
 
-        del device['targetName']
-        del device['links']
-        if 'timeframes' in device:
-            if device['timeframes']['total'] > 0 and 'data' in device['timeframes']:
-                device['timeframes'] = device['timeframes']['data']
-            else:
-                del device['timeframes']
-        
+    for device, name, digest in pending:
 
+        # Match the device to the User's existing devices by name
+        if existing_devices is not None:
+            xmDeviceID = existing_devices.get(device['name'])
+        else:
+            xmDeviceID = yield from _get_device(name)
+        if xmDeviceID:
+            device['id'] = xmDeviceID
 
         # Set our resource URLs
         url = config.xmod_url + '/api/xm/1/devices'
-        _logger.debug('Attempting to create Device "%s" for User Id "%s"\n\tvia url: %s\n\twith payload: %s', device['name'], user_id, url, json.dumps(device))
+        device_json = codec.dumps(device)
+        _logger.debug('Attempting to create Device "%s" for User Id "%s"\n\tvia url: %s\n\twith payload: %s', device['name'], user_id, url, common_logger.LazyJson(device_json))
 
         # Initialize loop with first request
-        try:
-            response = requests.post(url,
-                                    headers = {'Content-Type': 'application/json'},
-                                    data = json.dumps(device),
-                                    auth=config.basic_auth)
-        except requests.exceptions.RequestException as e:
-            _logger.error(config.ERR_REQUEST_EXCEPTION_CODE, url, repr(e))
+        response = yield _Request('POST', url, device_json)
+        if response is None:
             continue
 
         # If the initial response fails, log and return null
@@ -228,80 +673,100 @@ def _add_devices(user_id: str, target_name: str, devices: list):
             continue
 
         # Process the response
-        user_device = response.json()
-        _logger.info(f'Created/Updated Device "{target_name}|{user_device["name"]}" - Id: {user_device["id"]}')
+        user_device = codec.loads(response.content)
+        _cache_payload('device', name, digest, user_device['id'])
+        _logger.info('Created/Updated Device "%s|%s" - Id: %s', target_name, user_device["name"], user_device["id"])
         dev_count += 1
         # _logger.debug('Created/Updated Device "%s" - json body: %s', user_device['name'], pprint.pformat(user_device))
 
-    _logger.debug(f'Added {dev_count} of a possible ' \
-                f'{len(devices)} devices for ' \
-                f'{target_name}')
+    _logger.debug('Added %d of a possible %d devices for %s', dev_count, len(devices), target_name)
 
     return dev_count
 
-def _get_device(targetName: str ):
+def _get_user_devices(user_id: str, target_name: str):
+    """Get the ids of a User's existing devices
+
+    Retrieves every device owned by the User from xMatters in one listing,
+    so each captured device can be matched locally by name.
+
+    Args:
+        user_id (str): The UUID of the User that owns the devices
+        target_name (str): The targetName field for the User
+
+    Return:
+        devices (dict): The found device IDs by device name, or None if
+            they could not all be retrieved
+    """
+    if user_id is None:
+        return {}
+
+    # Initialize conditions
+    url = config.xmod_url + '/api/xm/1/people/' + user_id + '/devices'
+    devices = {}
+    try:
+        yield from _get_paged(url, devices, lambda device: device['name'], lambda device: device['id'])
+    except _ListingError:
+        _logger.warning('Unable to list the Devices of User "%s", so they will be looked up one at a time.', target_name)
+        return None
+    _logger.debug('Retrieved %d existing Devices for User "%s"', len(devices), target_name)
+
+    return devices
+
+def _get_device(targetName: str):
     """Get a device id by targetName
 
     Retrieves the device object record from xMatters based on it's targetName.
 
     Args:
-        targetName (str): Target Name to retrieve
-        deviceName (str): The device name to retrieve (Work Phone)
+        targetName (str): Target Name to retrieve ("user|Work Phone")
 
     Return:
         device_id (str): The found device ID or None
     """
 
     # Initialize conditions
-    url = config.xmod_url + '/api/xm/1/devices/' + urllib.parse.quote( targetName )
+    url = config.xmod_url + '/api/xm/1/devices/' + urllib.parse.quote(targetName)
     _logger.debug('Retrieving device, url=%s', url)
 
-    # Get the site records
-    response = requests.get(url, auth=config.basic_auth)
-    if response.status_code in [404]:
+    # Get the device record
+    response = yield _Request('GET', url)
+    if response is None or response.status_code in [404]:
         return None
-        
     if response.status_code not in [200]:
         _log_xm_error(url, response)
-        _user_dict[targetName] = None
         return None
 
     # Process the responses
-    device = response.json()
+    device = codec.loads(response.content)
     _logger.debug('Retrieved Device "%s"', device['targetName'])
 
     return device['id']
 
+def _prepare_user(user_obj: dict):
+    """Prepares a captured User object to be added back in
 
+    Removes the links, flattens the roles to their names, and empties the
+    supervisors.  The site and supervisors are left for the caller to
+    resolve.
 
-def _add_user(include_devices: bool, user_json: str):
-    """Attempst to add a new User object from the JSON string.
-        
-    Creates a dict object to pass to xMatters to create a new User
-    
     Args:
-        include_devices (bool): If True, restore the User's devices too
-        user_json (str): The JSON payload representing the User to add
-    """
-    # Convert the User JSON string to an object
-    full_user_obj = json.loads(user_json)
-    user_obj = full_user_obj['user']
+        user_obj (dict): The captured User, updated in place
 
-    # Prepare the object for adding back in
+    Return:
+        supervisors (list): The targetNames of the User's supervisors, or None
+            if the User is a Company Admin and can not be restored
+    """
     del user_obj['links']
-    site = _get_site(user_obj['site']['name'])
-    del user_obj['site']
-    user_obj['site'] = site['id']
     role_list = []
     is_comp_admin = False
     for role in user_obj['roles']['data']:
         if role['name'] == 'Company Admin': is_comp_admin = True
         role_list.append(role['name'])
     # If a Company Admin, return as there is nothing to do
-    if is_comp_admin: 
-        _logger.warn('Unable to add internal xMatters User with Role "Company Admin": %s', 
+    if is_comp_admin:
+        _logger.warn('Unable to add internal xMatters User with Role "Company Admin": %s',
             user_obj['firstName'] + ' ' + user_obj['lastName'] + ' (' + user_obj['targetName'] + ')')
-        return
+        return None
 
     # Continue user preprocessing
     del user_obj['roles']
@@ -315,12 +780,94 @@ def _add_user(include_devices: bool, user_json: str):
                 supervisors.append(supervisor['targetName'])
         del user_obj['supervisors']
     user_obj['supervisors'] = []
-    # ?
-    tempID = user_obj['id']
+    return supervisors
+
+def _later_supervisors(target_name: str) -> set:
+    """Returns the supervisors of a User that are left for the second pass
+
+    The supervisors are restored before the User (see _order_users()), so
+    their ids go into the same request that restores the User.  Only the
+    supervisors in a cycle with the User are added once it exists, along
+    with the rest again, as the update replaces the User's supervisors.
+    """
+    return _deferred_supervisors.get(target_name, set())
+
+def _prepare_supervisors(user_obj: dict, supervisors: list, supervisor_ids: dict) -> list:
+    """Adds the ids of a User's supervisors to the prepared User
+
+    Args:
+        user_obj (dict): The prepared User, updated in place
+        supervisors (list): The supervisors' targetNames
+        supervisor_ids (dict): The UUID of each supervisor to add now by
+            targetName, or None if the supervisor was not found
+
+    Return:
+        list: The targetNames of the supervisors to set in the second pass,
+            which are all of them if any were left for it, otherwise an
+            empty list
+    """
+    for supervisor, super_id in supervisor_ids.items():
+        if super_id:
+            user_obj['supervisors'].append(super_id)
+        else:
+            _logger.warn('Unable to find Supervisor (%s) for User (%s).', supervisor, user_obj['targetName'])
+    if all(supervisor in supervisor_ids for supervisor in supervisors):
+        return []
+    # The second pass replaces the supervisors added now, so it sets them
+    # too, and looks again for any that were not found
+    return list(supervisors)
+
+def _add_user(include_devices: bool, full_user_obj: dict):
+    """Attempst to add a new User object from the captured record.
+        
+    Creates a dict object to pass to xMatters to create a new User
+    
+    Args:
+        include_devices (bool): If True, restore the User's devices too
+        full_user_obj (dict): The captured User (and Devices) to add
+
+    Return:
+        tuple: The restored User (or None), and True if every one of its
+            supervisors was found and, with include_devices, every one of
+            its Devices added
+    """
+    user_obj = full_user_obj['user']
+
+    # Prepare the object for adding back in
+    supervisors = _prepare_user(user_obj)
+    # If a Company Admin, return as there is nothing to do
+    if supervisors is None:
+        return (None, False)
+    site = yield from _get_site(user_obj['site']['name'])
+    if site is None:
+        _logger.error('Unable to find Site (%s) for User (%s).', user_obj['site']['name'], user_obj['targetName'])
+        return (None, False)
+    user_obj['site'] = site['id']
+    later = _later_supervisors(user_obj['targetName'])
+    supervisor_ids = {}
+    for supervisor in supervisors:
+        if supervisor not in later:
+            supervisor_ids[supervisor] = yield from _get_user(supervisor, False)
+    found = all(supervisor_ids.values())
+    supervisors = _prepare_supervisors(user_obj, supervisors, supervisor_ids)
+
+    # Skip the User if it was last restored with the same payload, only
+    # restoring any Devices that changed
+    digest = _payload_hash(user_obj)
+    user_id = _cached_id('user', user_obj['targetName'], digest)
+    if user_id is not None:
+        with _dict_lock:
+            _user_dict[user_obj['targetName']] = user_id
+            _supervisor_dict[user_id] = supervisors
+        dev_count = 0
+        if include_devices and 'devices' in full_user_obj:
+            dev_count = yield from _add_devices(user_id, user_obj['targetName'], full_user_obj['devices'])
+            found = found and dev_count == len(full_user_obj['devices'])
+        return ({'targetName': user_obj['targetName'], 'id': user_id}, found)
 
     # Attempt to get the user from XM based on targetName
     # If not found, remove the UUID so it can be recreated
-    xmUserID = _get_user( user_obj['targetName'], True )
+    xmUserID = yield from _get_user( user_obj['targetName'], True )
 
     if xmUserID:
         user_obj['id'] = xmUserID
@@ -330,29 +877,27 @@ def _add_user(include_devices: bool, user_json: str):
 
     # Set our resource URLs
     url = config.xmod_url + '/api/xm/1/people'
-    _logger.debug('Attempting to create User with body:\n\t "%s"\n\tvia url: %s', json.dumps(user_obj), url)
+    user_json = codec.dumps(user_obj)
+    _logger.debug('Attempting to create User with body:\n\t "%s"\n\tvia url: %s', common_logger.LazyJson(user_json), url)
 
 
     # Initialize loop with first request
-    try:
-        response = requests.post(url,
-                                 headers = {'Content-Type': 'application/json'},
-                                 data = json.dumps(user_obj),
-                                 auth=config.basic_auth)
-    except requests.exceptions.RequestException as e:
-        _logger.error(config.ERR_REQUEST_EXCEPTION_CODE, url, repr(e))
-        return None
+    response = yield _Request('POST', url, user_json)
+    if response is None:
+        return (None, False)
 
     # If the initial response fails, log and return null
     if response.status_code not in [200, 201]:
         _log_xm_error(url, response)
-        return None
+        return (None, False)
 
     
     # Process the response
-    new_user_obj = response.json()
-    _user_dict[new_user_obj['targetName']] = new_user_obj['id']
-    _supervisor_dict[new_user_obj['id']] = supervisors
+    new_user_obj = codec.loads(response.content)
+    with _dict_lock:
+        _user_dict[new_user_obj['targetName']] = new_user_obj['id']
+        _supervisor_dict[new_user_obj['id']] = supervisors
+    _cache_payload('user', new_user_obj['targetName'], digest, new_user_obj['id'])
 
     #_logger.debug( f'full_user_obj: {full_user_obj}' )
     # If we need to add devices, do that now
@@ -361,16 +906,18 @@ def _add_user(include_devices: bool, user_json: str):
     try:
         devices = full_user_obj['devices']
         if include_devices:
-            dev_count = _add_devices(new_user_obj['id'], new_user_obj['targetName'], devices )
+            # A newly created User can not have any devices yet
+            existing_devices = {} if response.status_code == 201 else None
+            dev_count = yield from _add_devices(new_user_obj['id'], new_user_obj['targetName'], devices, existing_devices)
+            found = found and dev_count == len(devices)
     except KeyError:
-        _logger.debug( f'No devices found in capture file' )
+        _logger.debug( 'No devices found in capture file' )
 
-    _logger.info(f'Created/Updated User "{new_user_obj["targetName"]}" - Id: {new_user_obj["id"]} '\
-                 f'and added {dev_count} Devices.')
+    _logger.info('Created/Updated User "%s" - Id: %s and added %d Devices.', new_user_obj["targetName"], new_user_obj["id"], dev_count)
     #_logger.debug(f'Created/Updated User "{new_user_obj["targetName"]}" - Id: {new_user_obj["id"]} '\
     #             f'and added {dev_count} Devices.' \
     #             f'\n\tUser Obj: {pprint.pformat(new_user_obj)}')
-    return new_user_obj
+    return (new_user_obj, found)
 
 def _get_user(targetName: str, fromAPI: bool):
     """Get a User's id by targetName
@@ -383,8 +930,9 @@ def _get_user(targetName: str, fromAPI: bool):
     Return:
         user_id (str): The found User ID
     """
-    if targetName in _user_dict and not fromAPI:
-        user_id = _user_dict[targetName]
+    # Once every User has been prefetched, anything else is known not to exist
+    if _users_prefetched or (targetName in _user_dict and not fromAPI):
+        user_id = _user_dict.get(targetName)
         _logger.debug('Found ID "%s" for User "%s"', user_id, targetName)
         return user_id
 
@@ -393,22 +941,52 @@ def _get_user(targetName: str, fromAPI: bool):
     _logger.debug('Retrieving User, url=%s', url)
 
     # Get the site records
-    response = requests.get(url, auth=config.basic_auth)
-    if response.status_code in [404]:
+    response = yield _Request('GET', url)
+    if response is None or response.status_code in [404]:
         return None
 
     if response.status_code not in [200]:
         _log_xm_error(url, response)
-        _user_dict[targetName] = None
+        with _dict_lock:
+            _user_dict[targetName] = None
         return None
 
     # Process the responses
-    user = response.json()
-    _user_dict[user['targetName']] = user['id']
+    user = codec.loads(response.content)
+    with _dict_lock:
+        _user_dict[user['targetName']] = user['id']
     _logger.debug('Retrieved User "%s"', user['targetName'])
 
     return user['id']
 
+def _prefetch_users():
+    """Retrieves the ids of every existing User in one paged scan
+
+    Fills the User dictionary with the id of every person already in the
+    target instance, so that later lookups by targetName are resolved
+    locally instead of with one request per User.
+
+    Args:
+        None
+
+    Return:
+        None
+    """
+    global _users_prefetched # pylint: disable=global-statement
+
+    url = config.xmod_url + '/api/xm/1/people'
+    users = {}
+    try:
+        yield from _get_paged(url, users, lambda user: user['targetName'], lambda user: user['id'])
+    except _ListingError:
+        _logger.warning('Only %d existing Users could be prefetched, so the rest will be looked up one at a time.', len(users))
+        return
+    finally:
+        with _dict_lock:
+            _user_dict.update(users)
+    _users_prefetched = True
+    _logger.info("Prefetched %d existing Users.", len(users))
+
 def _add_user_supervisors(user_id: str, target_name: str):
     """Attempts to update the new User object with supervisors.
         
@@ -417,6 +995,10 @@ def _add_user_supervisors(user_id: str, target_name: str):
     Args:
         user_id (str): The User's Id to add supervisors
         target_name (str): The User's targetName to add supervisors
+
+    Return:
+        int: 1 if the supervisors were updated, and every one was found,
+            otherwise 0
     """
     # Is there anything to do
     if not user_id in _supervisor_dict or len(_supervisor_dict[user_id]) == 0:
@@ -428,29 +1010,32 @@ def _add_user_supervisors(user_id: str, target_name: str):
     user['id'] = user_id
     user['targetName'] = target_name
     supervisors = []
+    found = 1
     for targetName in _supervisor_dict[user_id]:
-        super_id = _get_user(targetName, False)
+        super_id = yield from _get_user(targetName, False)
         if super_id:
             supervisors.append(super_id)
         else:
             _logger.warn('Unable to find Supervisor (%s) for User (%s).', targetName, target_name)
+            found = 0
     if len(supervisors) == 0:
         _logger.debug('No valid supervisors for user_id: %s, target_name: %s', user_id, target_name) 
         return 0
     user['supervisors'] = supervisors
 
+    # Skip the update if the same supervisors were last restored
+    digest = _payload_hash(user, exclude=None)
+    if _cached_id('supervisors', target_name, digest) is not None:
+        return found
+
     # Set our resource URLs
     url = config.xmod_url + '/api/xm/1/people'
-    _logger.debug('Attempting to update the Supervisors for User:\n\t "%s"\n\tvia url: %s', json.dumps(user), url)
+    user_json = codec.dumps(user)
+    _logger.debug('Attempting to update the Supervisors for User:\n\t "%s"\n\tvia url: %s', common_logger.LazyJson(user_json), url)
 
     # Initialize loop with first request
-    try:
-        response = requests.post(url,
-                                 headers = {'Content-Type': 'application/json'},
-                                 data = json.dumps(user),
-                                 auth=config.basic_auth)
-    except requests.exceptions.RequestException as e:
-        _logger.error(config.ERR_REQUEST_EXCEPTION_CODE, url, repr(e))
+    response = yield _Request('POST', url, user_json)
+    if response is None:
         return 0
 
     # If the initial response fails, log and return null
@@ -459,10 +1044,127 @@ def _add_user_supervisors(user_id: str, target_name: str):
         return 0
 
     # Process the response
-    upd_user_obj = response.json()
+    upd_user_obj = codec.loads(response.content)
+    _cache_payload('supervisors', target_name, digest, upd_user_obj['id'])
     _logger.info('Updated Supervisors for User "%s" - Id: %s', upd_user_obj['targetName'], upd_user_obj['id'])
     # _logger.debug('Created/Updated User "%s" - json body: %s', upd_user_obj['targetName'], pprint.pformat(upd_user_obj))
-    return 1
+    return found
+
+def _dependency_levels(dependencies: dict) -> tuple:
+    """Orders records so that the records they depend on are restored first
+
+    Records depending on none of the records being restored are on level 0,
+    and every other record is one level above its highest dependency.
+    Where dependencies form a cycle (including a record depending on
+    itself), one dependency in the cycle is deferred, so the rest of the
+    cycle can be ordered.
+
+    Args:
+        dependencies (dict): The names of the records each record being
+            restored depends on, by name, in capture order
+
+    Return:
+        tuple: The level of each record by name, then the deferred
+            dependencies (as a set), by name
+    """
+    waiting = {name: {dependency for dependency in names if dependency in dependencies}
+               for name, names in dependencies.items()}
+    dependents = collections.defaultdict(list)
+    for name, names in waiting.items():
+        for dependency in names:
+            dependents[dependency].append(name)
+    counts = {name: len(names) for name, names in waiting.items()}
+    levels = {}
+    deferred = {}
+    ready = collections.deque(name for name, count in counts.items() if count == 0)
+
+    while len(levels) < len(dependencies):
+        if not ready:
+            # Only cycles (and the records above them) are left, so follow
+            # the dependencies of the first one until a record repeats, and
+            # leave that record's dependency in the cycle for later.  A record
+            # passed over by an earlier break may still be in another cycle,
+            # so the search starts again from the first record each time.
+            name = next(name for name in dependencies if name not in levels)
+            following = {}
+            while name not in following:
+                following[name] = next(dependency for dependency in sorted(waiting[name])
+                                       if dependency not in levels
+                                       and dependency not in deferred.get(name, ()))
+                name = following[name]
+            deferred.setdefault(name, set()).add(following[name])
+            counts[name] -= 1
+            if counts[name] == 0:
+                ready.append(name)
+            continue
+
+        name = ready.popleft()
+        placed = waiting[name].difference(deferred.get(name, ()))
+        levels[name] = max((levels[dependency] + 1 for dependency in placed), default=0)
+        for dependent in dependents[name]:
+            if name in deferred.get(dependent, ()):
+                continue
+            counts[dependent] -= 1
+            if counts[dependent] == 0:
+                ready.append(dependent)
+
+    return levels, deferred
+
+def _order_users(parts: set) -> tuple:
+    """Works out the order to restore the Users in, supervisors first
+
+    Scans the capture for the supervisors of each User still to restore,
+    and keeps the supervisors left for the second pass (only those in a
+    cycle) in _deferred_supervisors.  The same scan notes where each User
+    sits in the capture, so _read_levels() can read them back directly.
+
+    Args:
+        parts (set): The part names to compare with the baseline
+
+    Return:
+        tuple: The level of each User to restore by targetName (see
+            _dependency_levels()), and the [offset, length] of each one
+    """
+    supervisors = {}
+    spans = {}
+    def _note_spans(scanned):
+        for offset, length, full_user_obj in scanned:
+            spans[full_user_obj['user']['targetName']] = [offset, length]
+            yield full_user_obj
+
+    records = _changed(_note_spans(_scan_capture(config.users_filename, 'user', config.only_users)), 'user', parts)
+    for full_user_obj in _pending(records, 'user', lambda full_user_obj: full_user_obj['user']['targetName']):
+        user_obj = full_user_obj['user']
+        supervisors[user_obj['targetName']] = _supervisor_names(user_obj)
+    levels, deferred = _dependency_levels(supervisors)
+    _deferred_supervisors.update(deferred)
+    if levels:
+        _logger.info('Restoring %d Users in %d levels, supervisors first.',
+                     len(levels), max(levels.values()) + 1)
+    if deferred:
+        _logger.info('Found %d Users with supervisors in a cycle, which are added once the cycle exists.',
+                     len(deferred))
+    return levels, spans
+
+def _read_levels(filename: str, levels: dict, spans: dict):
+    """Yields the records on each level, lowest first
+
+    Each level is read directly from the capture, at the offsets noted
+    when the levels were worked out, in the order of the file.
+
+    Args:
+        filename (str): Name of the capture file to read from
+        levels (dict): The level of each record to restore, by targetName
+        spans (dict): The [offset, length] of each record, by targetName
+
+    Returns:
+        iterable: The records on the next level
+    """
+    level_spans = collections.defaultdict(list)
+    for name, level in levels.items():
+        level_spans[level].append(spans[name])
+    for level in range(len(level_spans)):
+        yield capture_reader.read_spans(filename, level_spans[level])
 
 def _process_users(include_devices: bool):
     """Reads and restored the instances User objects
@@ -474,31 +1176,117 @@ def _process_users(include_devices: bool):
         include_devices (bool): If True, restore the User's devices too
 
     Return:
-        None
+        bool: True if every User was restored
     """
-    # First add the users without supervisors
-    with open(config.users_filename) as users_file:
-        num_lines = 0
-        num_users = 0
-        for user_json in users_file:
-            # Ignore the opening array markers ("[\n" and "]\n")
-            if len(user_json) > 2:
-                # Remove trailing ",\n" or trailing "\n"
-                user_json = user_json[:-2] if user_json[-2:] == ',\n' else user_json[:-1]
-                num_lines += 1
-                user_obj = _add_user(include_devices, user_json)
-                if user_obj:
-                    _user_dict[user_obj['targetName']] = user_obj['id']
-                    num_users += 0 if user_obj == None else 1
+    # Add the users a level at a time, so each one's supervisors exist
+    num_lines = 0
+    num_users = 0
+    restore_user = functools.partial(_run, _restore_user, include_devices)
+    levels, spans = _order_users({'user', 'devices'} if include_devices else {'user'})
+    for records in _read_levels(config.users_filename, levels, spans):
+        for restored in _map_workers(restore_user, records):
+            num_lines += 1
+            num_users += 1 if restored else 0
 
     _logger.info("Restored %d of a possible %d Users.", num_users, num_lines)
+    return num_users == num_lines
 
-    # Next add the users supervisors
+def _restore_user(include_devices: bool, full_user_obj: dict) -> bool:
+    """Restores a User, then adds it to the User dictionary and the journal
+
+    Args:
+        include_devices (bool): If True, restore the User's devices too
+        full_user_obj (dict): The captured User (and Devices)
+
+    Return:
+        bool: True if the User was restored with every one of its
+            supervisors (and, with include_devices, its Devices)
+    """
+    user_obj, complete = yield from _add_user(include_devices, full_user_obj)
+    if not user_obj:
+        return False
+    with _dict_lock:
+        _user_dict[user_obj['targetName']] = user_obj['id']
+        supervisors = _supervisor_dict[user_obj['id']]
+    # Leave a User restored without all of its supervisors or Devices out
+    # of the journal, so that a resumed run restores it again
+    if not complete:
+        return False
+    _journal.record('user', user_obj['targetName'],
+                    {'id': user_obj['id'], 'supervisors': supervisors})
+    return True
+
+def _process_supervisors():
+    """Updates the supervisors of the restored User objects
+
+    Runs once every User has been restored, so each supervisor exists.
+    Only the supervisors in a cycle are left to add by then, so only the
+    Users they belong to are updated, each with all of its supervisors.
+
+    Args:
+        None
+
+    Return:
+        bool: True if the supervisors of every User were updated
+    """
     num_users = 0
-    user_dict = {x:y for x,y in _user_dict.items()}
-    for target_name, user_id in user_dict.items():
-        num_users += _add_user_supervisors(user_id, target_name)
-    _logger.info("Updated supervisors for %d of a possible %d Users.", num_users, len(_user_dict))
+    num_lines = 0
+    later = _supervisors_left()
+    for num_updated in _map_workers(functools.partial(_run, _restore_supervisors), later):
+        num_lines += 1
+        num_users += num_updated
+    _logger.info("Updated supervisors for %d of a possible %d Users.", num_users, len(later))
+    return num_users == num_lines
+
+def _supervisors_left() -> dict:
+    """Returns the supervisors left for the second pass, by User targetName
+
+    Covers the Users restored by this run (see _order_users()) and by the
+    run being resumed, as recorded in the journal, less those whose second
+    pass the journal shows as done.  Restoring a User again replaces its
+    supervisors, so a User restored by this run always has a second pass.
+    """
+    later = {target_name: user['supervisors'] for target_name, user in _journal.get('user').items()
+             if not _journal.is_done('supervisors', target_name)}
+    later.update(_deferred_supervisors)
+    return {target_name: supervisors for target_name, supervisors in later.items() if supervisors}
+
+def _restore_supervisors(target_name: str) -> int:
+    """Updates the supervisors of a restored User, and journals it if updated
+
+    Args:
+        target_name (str): The User's targetName
+
+    Return:
+        int: 1 if the supervisors were updated, otherwise 0
+    """
+    with _dict_lock:
+        user_id = _user_dict.get(target_name)
+    num_updated = yield from _add_user_supervisors(user_id, target_name)
+    if num_updated:
+        _journal.record('supervisors', target_name)
+    return num_updated
+
+def _add_user_devices(full_user_obj: dict):
+    """Attempts to add the Devices of a User from the captured record.
+
+    The User is journaled once every one of its Devices has been added.
+
+    Args:
+        full_user_obj (dict): The captured User and Devices
+
+    Return:
+        tuple: The number of Devices in the record, and the number added
+    """
+    user_obj = full_user_obj['user']
+    # Try to get the "id" from the user dictionary, otherwise
+    # retrieve "id" field directly from xMatters as it may have
+    # changed upon recovery
+    user_id = yield from _get_user(user_obj['targetName'], False)
+    num_devices = yield from _add_devices(user_id, user_obj['targetName'], full_user_obj['devices'])
+    if num_devices == len(full_user_obj['devices']):
+        _journal.record('devices', user_obj['targetName'])
+    return (len(full_user_obj['devices']), num_devices)
 
 def _process_devices():
     """Reads and restored the instances User's Device objects
@@ -510,30 +1298,23 @@ def _process_devices():
         None
 
     Return:
-        None
+        bool: True if every Device was restored
     """
     _logger.info('Processing Devices independent of Users.')
     # Go through the Users file and pull out the device info
-    with open(config.users_filename) as users_file:
-        max_devices = 0
-        num_devices = 0
-        num_lines = 0
-        for user_json in users_file:
-            # Ignore the opening array markers ("[\n" and "]\n")
-            if len(user_json) > 2:
-                # Remove trailing ",\n" or trailing "\n"
-                user_json = user_json[:-2] if user_json[-2:] == ',\n' else user_json[:-1]
-                num_lines += 1
-                full_user_obj = json.loads(user_json)
-                user_obj = full_user_obj['user']
-                max_devices += len(full_user_obj['devices'])
-                # Try to get the "id" from the user dictionary, otherwise
-                # retrieve "id" field directly from xMatters as it may have
-                # changed upon recovery
-                user_id = _get_user(user_obj['targetName'], False)
-                num_devices += _add_devices(user_id, user_obj['targetName'], full_user_obj['devices'])
-
-    _logger.info(f"Restored {num_devices} of a possible {max_devices} Devices from {num_lines} Users.")
+    max_devices = 0
+    num_devices = 0
+    num_lines = 0
+    records = _changed(_read_capture(config.users_filename, 'user', config.only_users),
+                       'user', {'devices'})
+    records = _pending(records, 'devices', lambda full_user_obj: full_user_obj['user']['targetName'])
+    for user_devices in _map_workers(functools.partial(_run, _add_user_devices), records):
+        num_lines += 1
+        max_devices += user_devices[0]
+        num_devices += user_devices[1]
+
+    _logger.info('Restored %d of a possible %d Devices from %d Users.', num_devices, max_devices, num_lines)
+    return num_devices == max_devices
 
 def _get_group(targetName: str, fromAPI: str):
     """Get a Group's id by targetName
@@ -546,9 +1327,10 @@ def _get_group(targetName: str, fromAPI: str):
     Return:
         user_id (str): The found User ID
     """
-    if targetName in _group_dict and not fromAPI:
-        group_id = _group_dict[targetName]
-        _logger.debug(f'Found ID "{group_id}" for Group "{targetName}"')
+    # Once every Group has been prefetched, anything else is known not to exist
+    if _groups_prefetched or (targetName in _group_dict and not fromAPI):
+        group_id = _group_dict.get(targetName)
+        _logger.debug('Found ID "%s" for Group "%s"', group_id, targetName)
         return group_id
 
 
@@ -557,19 +1339,51 @@ def _get_group(targetName: str, fromAPI: str):
     _logger.debug('Retrieving Group, url=%s', url)
 
     # Get the site records
-    response = requests.get(url, auth=config.basic_auth)
+    response = yield _Request('GET', url)
+    if response is None:
+        return None
     if response.status_code not in [200]:
         _log_xm_error(url, response)
-        _group_dict[targetName] = None
+        with _dict_lock:
+            _group_dict[targetName] = None
         return None
 
     # Process the responses
-    group = response.json()
-    _group_dict[group['targetName']] = group['id']
-    _logger.debug(f'Retrieved Group "{group["targetName"]}"')
+    group = codec.loads(response.content)
+    with _dict_lock:
+        _group_dict[group['targetName']] = group['id']
+    _logger.debug('Retrieved Group "%s"', group["targetName"])
 
     return group['id']
 
+def _prefetch_groups():
+    """Retrieves the ids of every existing Group in one paged scan
+
+    Fills the Group dictionary with the id of every group already in the
+    target instance, so that the existence check for each Group and the
+    resolution of Group members are done locally.
+
+    Args:
+        None
+
+    Return:
+        None
+    """
+    global _groups_prefetched # pylint: disable=global-statement
+
+    url = config.xmod_url + '/api/xm/1/groups'
+    groups = {}
+    try:
+        yield from _get_paged(url, groups, lambda group: group['targetName'], lambda group: group['id'])
+    except _ListingError:
+        _logger.warning('Only %d existing Groups could be prefetched, so the rest will be looked up one at a time.', len(groups))
+        return
+    finally:
+        with _dict_lock:
+            _group_dict.update(groups)
+    _groups_prefetched = True
+    _logger.info("Prefetched %d existing Groups.", len(groups))
+
 def _get_shift(group_id: str, target_name: str, shift_name: str):
     """Get a Group's shift by name
 
@@ -581,29 +1395,85 @@ def _get_shift(group_id: str, target_name: str, shift_name: str):
         shift_name (str): Name of Shift to retrieve
 
     Return:
-        shift_id (str): The found Shift ID
+        shift_id (str): The found Shift ID, None if there is no such Shift,
+            or False if it could not be looked up
     """
     # Initialize conditions
     url = config.xmod_url + '/api/xm/1/groups/' + group_id + '/shifts/'+ urllib.parse.quote(shift_name)
     _logger.debug('Attempting to retrieve Shift, url=%s', url)
 
     # Get the site records
-    response = requests.get(url, auth=config.basic_auth)
+    response = yield _Request('GET', url)
+    if response is None:
+        return False
     if response.status_code in [404]:
         # Not found, ignore and return None
-        _logger.debug(f'Shift {shift_name} was not found in {target_name}')
+        _logger.debug('Shift %s was not found in %s', shift_name, target_name)
         return None
     elif response.status_code not in [200]:
         _log_xm_error(url, response)
-        return None
+        return False
 
     # Process the responses
-    shift = response.json()
-    _logger.debug(f'Retrieved Shift "{target_name}|{shift["name"]}"')
+    shift = codec.loads(response.content)
+    _logger.debug('Retrieved Shift "%s|%s"', target_name, shift["name"])
 
     return shift['id']
 
-def _add_member(group_id: str, group_name: str, shift_name: str, member_obj: dict):
+def _get_shifts(group_id: str, target_name: str):
+    """Get all of a Group's existing shifts
+
+    Retrieves every Shift of the Group from xMatters in one listing.
+
+    Args:
+        group_id (str): Group's UUID
+        target_name (str): Group's name
+
+    Return:
+        shifts (dict): The found Shift objects by name, or None if they
+            could not all be retrieved
+    """
+    url = config.xmod_url + '/api/xm/1/groups/' + group_id + '/shifts'
+    shifts = {}
+    try:
+        yield from _get_paged(url, shifts, lambda shift: shift['name'])
+    except _ListingError:
+        return None
+    _logger.debug('Retrieved %d existing Shifts for Group "%s"', len(shifts), target_name)
+
+    return shifts
+
+def _shift_matches(existing_shift: dict, shift: dict):
+    """Determines if an existing Shift already matches the captured Shift
+
+    Args:
+        existing_shift (dict): The Shift retrieved from xMatters
+        shift (dict): The captured Shift, after _prepare_shift
+
+    Return:
+        bool: True if every captured field has the same value
+    """
+    return all(existing_shift.get(key) == value for key, value in shift.items())
+
+def _prepare_member(member_obj: dict):
+    """Prepares a captured Shift Member object to be added back in
+
+    Args:
+        member_obj (dict): The captured Member, updated in place
+
+    Return:
+        tuple: The recipientType and targetName of the Member's recipient,
+            whose id is left for the caller to resolve
+    """
+    del member_obj['shift']
+    recip_type = member_obj['recipient']['recipientType']
+    recip_target_name = member_obj['recipient']['targetName']
+    del member_obj['recipient']
+    member_obj['recipient'] = {}
+    member_obj['recipient']['recipientType'] = recip_type
+    return (recip_type, recip_target_name)
+
+def _add_member(group_id: str, group_name: str, shift_name: str, member_obj: dict, existing_members: dict = None):
     """Attempst to add a new Member object to the specified Shift
         
     Creates a dict object to pass to xMatters to create a new Member in an
@@ -614,31 +1484,35 @@ def _add_member(group_id: str, group_name: str, shift_name: str, member_obj: dic
         group_name (str): The targetName field for the Group to add members to
         shift_name (str): The targetName field for the Shift to add members to
         member_obj (str): The JSON payload representing the Membrer to add
+        existing_members (dict): The Shift's existing Members by recipient
+            id, if known.  Members that already exist are not added again.
     """
     # Prepare the object by processing Recipient
-    del member_obj['shift']
-    recip_type = member_obj['recipient']['recipientType']
-    recip_target_name = member_obj['recipient']['targetName']
-    del member_obj['recipient']
-    member_obj['recipient'] = {}
-    member_obj['recipient']['recipientType'] = recip_type
+    recip_type, recip_target_name = _prepare_member(member_obj)
     if recip_type == 'GROUP':
-        member_obj['recipient']['id'] = _get_group(recip_target_name, False)
+        member_obj['recipient']['id'] = yield from _get_group(recip_target_name, False)
     else:
-        member_obj['recipient']['id'] = _get_user(recip_target_name, False)
+        member_obj['recipient']['id'] = yield from _get_user(recip_target_name, False)
+
+    # Rather than posting a Member without a recipient, leave it out
+    if member_obj['recipient']['id'] is None:
+        _logger.warning('Unable to find %s (%s) for Shift Member of (%s|%s).',
+                        'Group' if recip_type == 'GROUP' else 'User', recip_target_name, group_name, shift_name)
+        return None
+
+    # Nothing to do if the recipient is already a member
+    if existing_members and member_obj['recipient']['id'] in existing_members:
+        _logger.debug('Shift Member "%s" already exists in "%s|%s".', recip_target_name, group_name, shift_name)
+        return existing_members[member_obj['recipient']['id']]
     
     # Set our resource URLs
     url = config.xmod_url + '/api/xm/1/groups/' + group_id + '/shifts/' + urllib.parse.quote(shift_name) + '/members'
-    _logger.debug(f'Attempting to add Shift Member with body:\n\t "{json.dumps(member_obj)}"\n\tvia url: {url}')
+    member_json = codec.dumps(member_obj)
+    _logger.debug('Attempting to add Shift Member with body:\n\t "%s"\n\tvia url: %s', common_logger.LazyJson(member_json), url)
 
     # Perform request
-    try:
-        response = requests.post(url,
-                                 headers = {'Content-Type': 'application/json'},
-                                 data = json.dumps(member_obj),
-                                 auth=config.basic_auth)
-    except requests.exceptions.RequestException as e:
-        _logger.error(config.ERR_REQUEST_EXCEPTION_CODE, url, repr(e))
+    response = yield _Request('POST', url, member_json)
+    if response is None:
         return None
 
     # If the initial response fails, log and return null
@@ -647,8 +1521,8 @@ def _add_member(group_id: str, group_name: str, shift_name: str, member_obj: dic
         return None
 
     # Process the response
-    new_obj = response.json()
-    _logger.info(f'Created Shift Member "{recip_target_name}" - Id: {new_obj["recipient"]["id"]}')
+    new_obj = codec.loads(response.content)
+    _logger.info('Created Shift Member "%s" - Id: %s', recip_target_name, new_obj["recipient"]["id"])
     #_logger.debug(f'Created Shift Member "{recip_name}" - json body: {pprint.pformat(new_obj)}')
     return new_obj
 
@@ -665,14 +1539,11 @@ def _del_shift(group_id: str, target_name: str, shift_name: str):
     """
     # Set our resource URLs
     url = config.xmod_url + '/api/xm/1/groups/' + group_id + '/shifts/' + urllib.parse.quote(shift_name)
-    _logger.debug(f'Attempting to delete Shift "{shift_name}" for Group "{target_name}"\n\tvia url: {url}')
+    _logger.debug('Attempting to delete Shift "%s" for Group "%s"\n\tvia url: %s', shift_name, target_name, url)
 
     # Make request
-    try:
-        response = requests.delete(url,
-                                auth=config.basic_auth)
-    except requests.exceptions.RequestException as e:
-        _logger.error(config.ERR_REQUEST_EXCEPTION_CODE, url, repr(e))
+    response = yield _Request('DELETE', url)
+    if response is None:
         return False
 
     # If the initial response fails, log and return null
@@ -680,41 +1551,122 @@ def _del_shift(group_id: str, target_name: str, shift_name: str):
         _log_xm_error(url, response)
         return False
 
-    _logger.info(f'Deleted Shift "{shift_name}" from Group "{target_name}"')
+    _logger.info('Deleted Shift "%s" from Group "%s"', shift_name, target_name)
     return True
 
 class ResilientSession(Session):
     """
-    This class is supposed to retry requests that return temporary errors.
-    At this moment it supports: 501
+    This class retries requests that fail with temporary errors, following
+    the run's RetryPolicy: connection errors and timeouts, 429, and 502-504,
+    with exponential backoff and jitter, honouring Retry-After.
+    Requests made with resilient=True (such as re-creating a Shift that was
+    just deleted) also retry 501, and are allowed twice the usual attempts.
+    With a ConcurrencyController, each attempt also waits for a slot of its
+    endpoint family, so the worker threads back off when the instance
+    struggles.  With RequestMetrics, each attempt is counted and timed.
+    Requests made without a timeout use the session's (connect, read)
+    timeout, so a stalled connection fails and is retried rather than
+    holding its worker forever.
     """
 
-    def request(self, method, url, **kwargs):
+    def __init__(self, policy: retry_policy.RetryPolicy,
+                 controller: concurrency_control.ConcurrencyController = None,
+                 metrics: request_metrics.RequestMetrics = None,
+                 timeout: tuple = None):
+        super(ResilientSession, self).__init__()
+        self.policy = policy
+        self.controller = controller
+        self.metrics = metrics
+        self.timeout = timeout
+        self.pool_size = None
+
+    def _slot(self, url):
+        if self.controller is None:
+            return contextlib.nullcontext({})
+        return self.controller.slot(url)
+
+    def request(self, method, url, resilient=False, **kwargs): # pylint: disable=arguments-differ
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
         counter = 0
 
         while True:
             counter += 1
 
-            r = super(ResilientSession, self).request(method, url, **kwargs)
-
-            if r.status_code in [ 501, 502, 503, 504 ]:
-                delay = 3 * counter
-                _logger.warn("Got recoverable error [%s] from %s %s, retry #%s in %ss" % (r.status_code, method, url, counter, delay))
+            # Hold back while the instance has asked us to slow down
+            pause = self.policy.pause()
+            if pause > 0:
+                time.sleep(pause)
+
+            started = time.monotonic()
+            try:
+                with self._slot(url) as outcome:
+                    started = time.monotonic()
+                    r = super(ResilientSession, self).request(method, url, **kwargs)
+                    outcome['status_code'] = r.status_code
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if self.metrics is not None:
+                    self.metrics.record(method, url, None, time.monotonic() - started)
+                delay = self.policy.backoff(counter, resilient=resilient)
+                if delay is None:
+                    self._give_up()
+                    raise
+                _logger.warning("Got recoverable error %s from %s %s, retry #%s in %.1fs", repr(e), method, url, counter, delay)
                 time.sleep(delay)
                 continue
+            if self.metrics is not None:
+                self.metrics.record(method, url, r.status_code, time.monotonic() - started,
+                                    request_metrics.body_size(r.request.body), len(r.content))
+
+            if self.policy.should_retry(r.status_code, resilient):
+                delay = self.policy.backoff(counter, r.status_code, r.headers.get('Retry-After'), resilient)
+                if delay is not None:
+                    _logger.warning("Got recoverable error [%s] from %s %s, retry #%s in %.1fs", r.status_code, method, url, counter, delay)
+                    time.sleep(delay)
+                    continue
+                self._give_up()
 
             return r
 
+    def _give_up(self):
+        if self.policy.exhausted():
+            _logger.warning('The retry budget of %d retries is spent, so failed requests will no longer be retried.', config.retry_budget)
+
+def _prepare_shift(shift: dict):
+    """Prepares a captured Shift object to be added back in
+
+    The captured Shift is left untouched, as its members are restored
+    from the same record afterwards.
+
+    Args:
+        shift (dict): The captured Shift
+
+    Return:
+        dict: The Shift payload to add
+    """
+    return {k: v for k, v in shift.items() if k not in ('group', 'links', 'members', 'id')}
+
 def _add_shifts(group_id: str, target_name: str, shifts: list):
     """Attempst to add the Shift objects from the shifts list.
         
-    Creates Shift objects based on the shifts list
+    Creates Shift objects based on the shifts list.  Each existing Shift of
+    the same name is deleted first, or when reconciling, only one that
+    changed, as xMatters can't update a Shift.
     
     Args:
         group_id (str): The UUID of the Group to add the shifts to
         target_name (str): The targetName field for the Group to add shifts to
         shifts (list): The list object containing the Shifts to add
+
+    Return:
+        tuple: The number of Shifts added (or unchanged), and False if the
+            unused Default Shift could not be removed
     """
+    # When reconciling, read the Group's existing shifts once up front
+    existing_shifts = None
+    if config.reconcile:
+        existing_shifts = yield from _get_shifts(group_id, target_name)
+
     had_new_default_shift = False
     shift_count = 0
     for shift in shifts:
@@ -723,68 +1675,127 @@ def _add_shifts(group_id: str, target_name: str, shifts: list):
         # If it did not, we will remove it later
         if shift['name'] == config.new_default_shift_name:
             had_new_default_shift = True
-    
-        # Delete any shift with matching name first, as we can't update an existin shift (yet)
-        deleted_shift = _del_shift(group_id, target_name, shift['name'])
 
-        # Update the shift
-        del shift['group']
-        del shift['links']
-        del shift['members']
-        del shift['id']
+        # Build the shift payload
+        shift = _prepare_shift(shift)
+
+        if existing_shifts is None:
+            # Delete any shift with matching name first, as we can't update an existin shift (yet)
+            deleted_shift = yield from _del_shift(group_id, target_name, shift['name'])
+        elif shift['name'] not in existing_shifts:
+            deleted_shift = False
+        elif _shift_matches(existing_shifts[shift['name']], shift):
+            _logger.info('Shift "%s|%s" is unchanged.  Skipping.', target_name, shift["name"])
+            shift_count += 1
+            continue
+        else:
+            # The shift has changed, and as we can't update it, replace it
+            # (which drops any Members that were not captured, even without
+            # config.prune_members)
+            deleted_shift = yield from _del_shift(group_id, target_name, shift['name'])
 
         # Set our resource URLs
         url = config.xmod_url + '/api/xm/1/groups/' + group_id + '/shifts'
-        _logger.debug(f'Attempting to create Shift "{shift["name"]}" for Group Id "{group_id}"\n\tvia url: {url}\n\twith payload: {json.dumps(shift)}')
+        shift_json = codec.dumps(shift)
+        _logger.debug('Attempting to create Shift "%s" for Group Id "%s"\n\tvia url: %s\n\twith payload: %s', shift["name"], group_id, url, common_logger.LazyJson(shift_json))
 
         # Make the request (using resilient session as _del_shift may take time to propogate)
-        try:
-            if deleted_shift:
-                s = ResilientSession()
-                response = s.post(url,
-                                  headers = {'Content-Type': 'application/json'},
-                                  data = json.dumps(shift),
-                                  auth=config.basic_auth)
-            else:
-                response = requests.post(url,
-                                        headers = {'Content-Type': 'application/json'},
-                                        data = json.dumps(shift),
-                                        auth=config.basic_auth)
-        except requests.exceptions.RequestException as e:
-            _logger.error(config.ERR_REQUEST_EXCEPTION_CODE, url, repr(e))
+        response = yield _Request('POST', url, shift_json, resilient=deleted_shift)
+        if response is None:
             continue
 
         # If the initial response fails, log and return null
         if response.status_code in [501]:
-            _logger.info(f'Shift "{target_name}|{shift["name"]}" already exits.  Skipping.')
+            _logger.info('Shift "%s|%s" already exits.  Skipping.', target_name, shift["name"])
             continue
         elif response.status_code not in [200, 201]:
             _log_xm_error(url, response)
             continue
 
         # Process the response
-        group_shift = response.json()
-        _logger.info(f'Created Shift "{target_name}|{shift["name"]}" - Id: {group_shift["id"]}')
+        group_shift = codec.loads(response.content)
+        with _dict_lock:
+            _new_shifts.add((group_id, shift['name']))
+        _logger.info('Created Shift "%s|%s" - Id: %s', target_name, shift["name"], group_shift["id"])
         shift_count += 1
         # _logger.debug(f'Created Shift "{group_shift["name"]}" - json body: {pprint.pformat(group_shift)}')
 
     # Before finishing, remove the New default shift name, if we did not have it before
     # (checks to see if the unused default shift exists first)
+    removed = True
     if not had_new_default_shift:
-        def_shift_id = _get_shift(group_id, target_name, config.new_default_shift_name)
-        if def_shift_id is not None:
-            _del_shift(group_id, target_name, config.new_default_shift_name)
+        if existing_shifts is None:
+            def_shift_id = yield from _get_shift(group_id, target_name, config.new_default_shift_name)
+        else:
+            def_shift_id = existing_shifts.get(config.new_default_shift_name, {}).get('id')
+        if def_shift_id is False:
+            removed = False
+        elif def_shift_id is not None:
+            removed = yield from _del_shift(group_id, target_name, config.new_default_shift_name)
+
+    _logger.debug('Added %d of a possible %d Shifts for Group %s', shift_count, len(shifts), target_name)
+
+    return (shift_count, removed)
+
+def _get_shift_members(group_id: str, target_name: str, shift_name: str):
+    """Get all of a Shift's existing members
+
+    Retrieves every Member of the Shift from xMatters in one listing.
+
+    Args:
+        group_id (str): Group's UUID
+        target_name (str): Group's name
+        shift_name (str): Name of the Shift
+
+    Return:
+        members (dict): The found Member objects by recipient id, or None
+            if they could not all be retrieved
+    """
+    # A Shift created during this run can not have any members yet
+    if (group_id, shift_name) in _new_shifts:
+        return {}
+
+    url = config.xmod_url + '/api/xm/1/groups/' + group_id + '/shifts/' + urllib.parse.quote(shift_name) + '/members'
+    members = {}
+    try:
+        yield from _get_paged(url, members, lambda member: member['recipient']['id'])
+    except _ListingError:
+        return None
+    _logger.debug('Retrieved %d existing Members for Shift "%s|%s"', len(members), target_name, shift_name)
 
-    _logger.debug(f'Added {shift_count} of a possible ' \
-                f'{len(shifts)} Shifts ' \
-                f'for Group {target_name}')
+    return members
 
-    return shift_count
+def _del_member(group_id: str, target_name: str, shift_name: str, member: dict):
+    """Attempst to remove an existing Member from a Shift
+
+    Args:
+        group_id (str): The UUID of the Group
+        target_name (str): The targetName field for the Group
+        shift_name (str): The name of the Shift to remove the member from
+        member (dict): The existing Member to remove
+    """
+    url = config.xmod_url + '/api/xm/1/groups/' + group_id + '/shifts/' + urllib.parse.quote(shift_name) + \
+          '/members/' + member['recipient']['id']
+    _logger.debug('Attempting to delete Shift Member "%s"\n\tvia url: %s', member["recipient"]["targetName"], url)
+
+    # Make request
+    response = yield _Request('DELETE', url)
+    if response is None:
+        return False
+
+    if response.status_code not in [200, 204]:
+        _log_xm_error(url, response)
+        return False
+
+    _logger.info('Deleted Shift Member "%s" from "%s|%s"', member["recipient"]["targetName"], target_name, shift_name)
+    return True
 
 def _add_shift_members(group_id: str, target_name: str, shifts: list):
     """Attempst to add the Member objects from the shifts list.
         
-    Creates Shift's Member objects based on the shifts list
+    Creates Shift's Member objects based on the shifts list.  When
+    reconciling, only the Members missing from each Shift are added (and
+    with config.prune_members, Members that were not captured are removed).
     
     Args:
         group_id (str): The UUID of the Group to add the shifts to
@@ -800,58 +1811,115 @@ def _add_shift_members(group_id: str, target_name: str, shifts: list):
                 for member in shift['members']['data']:
                     members.append(member)
 
-        # Add the members back now
+        # When reconciling, read the Shift's existing members once up front
+        existing_members = None
+        if config.reconcile:
+            existing_members = yield from _get_shift_members(group_id, target_name, shift["name"])
+
+        # Note the captured recipients, by targetName and id, as adding a
+        # member drops them from the captured record
+        captured = set()
+        for member in members:
+            captured.add(member['recipient']['targetName'])
+            if 'id' in member['recipient']:
+                captured.add(member['recipient']['id'])
+
+        # Add the members back now, in their captured order
         for member in members:
-            new_mem = _add_member(group_id, target_name, shift["name"], member)
+            new_mem = yield from _add_member(group_id, target_name, shift["name"], member, existing_members)
             mem_count += 1 if new_mem is not None else 0
+            if new_mem is not None:
+                captured.add(new_mem['recipient']['id'])
 
-    _logger.debug(f'Added {mem_count} of a possible ' \
-                f'{len(members)} Members ' \
-                f'from {len(shifts)} Shifts, ' \
-                f'for Group {target_name}')
+        # Remove any members that were not captured, keeping those that
+        # were even if they could not be added
+        if existing_members and config.prune_members:
+            for recipient_id, member in existing_members.items():
+                if recipient_id not in captured and member['recipient'].get('targetName') not in captured:
+                    yield from _del_member(group_id, target_name, shift["name"], member)
+
+    _logger.debug('Added %d of a possible %d Members from %d Shifts, for Group %s', mem_count, len(members), len(shifts), target_name)
 
     return mem_count
 
-def _add_group(group_json: str):
-    """Attempst to add a new Group object from the JSON string.
-        
-    Creates a dict object to pass to xMatters to create a new Group
-    
+def _supervisor_names(obj: dict):
+    """Returns the targetNames of a captured User's or Group's supervisors
+
     Args:
-        group_json (str): The JSON payload representing the User to add
+        obj (dict): The captured User or Group
+
+    Return:
+        list: The supervisors' targetNames
     """
-    # Convert the User JSON string to an object
-    full_group_obj = json.loads(group_json)
-    group_obj = full_group_obj['group']
+    if 'supervisors' in obj and obj['supervisors']['total'] > 0:
+        return [supervisor['targetName'] for supervisor in obj['supervisors']['data']]
+    return []
 
-    # Prepare the object for adding back in
-    del group_obj['links']
+def _prepare_group(group_obj: dict, site: dict, supervisor_ids: dict):
+    """Prepares a captured Group object to be added back in
+
+    Args:
+        group_obj (dict): The captured Group, updated in place
+        site (dict): The Group's Site, or None if it was not found
+        supervisor_ids (dict): The UUID of each supervisor by targetName,
+            or None if the supervisor was not found
+    """
     if 'site' in group_obj:
-        site = _get_site(group_obj['site'])
         if site is not None:
             group_obj['site'] = site['id']
         else:
             del group_obj['site']
 
-    # Build supervisors list to preserve after we get ID
     if 'supervisors' in group_obj and group_obj['supervisors']['total'] > 0:
         supervisors = []
-        for supervisor in group_obj['supervisors']['data']:
-            super_id = _get_user(supervisor['targetName'], False)
+        for supervisor in _supervisor_names(group_obj):
+            super_id = supervisor_ids.get(supervisor)
             if super_id:
                 supervisors.append(super_id)
             else:
-                _logger.warn(f'Unable to find Supervisor ({supervisor["targetName"]}) for Group ({group_obj["targetName"]}).')
+                _logger.warn('Unable to find Supervisor (%s) for Group (%s).', supervisor, group_obj["targetName"])
         del group_obj['supervisors']
         if len(supervisors) > 0:
             group_obj['supervisors'] = supervisors
 
-    # ?
-    tempID = group_obj['id']
+def _add_group(full_group_obj: dict):
+    """Attempst to add a new Group object from the captured record.
+        
+    Creates a dict object to pass to xMatters to create a new Group
+    
+    Args:
+        full_group_obj (dict): The captured Group (and Shifts) to add
+
+    Return:
+        dict: Whether the Group is new, the prepared Group, and whether
+            every one of its supervisors was found, or None if not restored
+    """
+    group_obj = full_group_obj['group']
+
+    # Prepare the object for adding back in
+    del group_obj['links']
+    site = None
+    if 'site' in group_obj:
+        site = yield from _get_site(group_obj['site'])
+
+    # Build supervisors list to preserve after we get ID
+    supervisor_ids = {}
+    for supervisor in _supervisor_names(group_obj):
+        supervisor_ids[supervisor] = yield from _get_user(supervisor, False)
+    found = all(supervisor_ids.values())
+    _prepare_group(group_obj, site, supervisor_ids)
+
+    # Skip the Group if it was last restored with the same payload
+    digest = _payload_hash(group_obj)
+    group_id = _cached_id('group', group_obj['targetName'], digest)
+    if group_id is not None:
+        with _dict_lock:
+            _group_dict[group_obj['targetName']] = group_id
+        return { 'is_new': False, 'group_obj': group_obj, 'found': found }
 
     # Attempt to get the group from XM based on targetName
     # If not found, remove the UUID so it can be recreated
-    xmGroupID = _get_group( group_obj['targetName'], True )
+    xmGroupID = yield from _get_group( group_obj['targetName'], True )
 
     if xmGroupID:
         group_obj['id'] = xmGroupID
@@ -861,16 +1929,12 @@ def _add_group(group_json: str):
 
     # Set our resource URLs
     url = config.xmod_url + '/api/xm/1/groups'
-    _logger.debug(f'Attempting to create Group with body:\n\t "{json.dumps(group_obj)}"\n\tvia url: {url}')
+    group_json = codec.dumps(group_obj)
+    _logger.debug('Attempting to create Group with body:\n\t "%s"\n\tvia url: %s', common_logger.LazyJson(group_json), url)
 
     # Initialize loop with first request
-    try:
-        response = requests.post(url,
-                                 headers = {'Content-Type': 'application/json'},
-                                 data = json.dumps(group_obj),
-                                 auth=config.basic_auth)
-    except requests.exceptions.RequestException as e:
-        _logger.error(config.ERR_REQUEST_EXCEPTION_CODE, url, repr(e))
+    response = yield _Request('POST', url, group_json)
+    if response is None:
         return None
 
     # If the initial response fails, log and return null
@@ -880,108 +1944,478 @@ def _add_group(group_json: str):
     is_new = True if response.status_code == 201 else False
 
     # Process the response
-    new_group_obj = response.json()
-    _group_dict[new_group_obj['targetName']] = new_group_obj['id']
+    new_group_obj = codec.loads(response.content)
+    with _dict_lock:
+        _group_dict[new_group_obj['targetName']] = new_group_obj['id']
+    _cache_payload('group', new_group_obj['targetName'], digest, new_group_obj['id'])
 
-    _logger.info(f'{"Created" if is_new else "Updated"} Group "{new_group_obj["targetName"]}" ' \
-                 f'- Id: {new_group_obj["id"]}.')
+    _logger.info('%s Group "%s" - Id: %s.', "Created" if is_new else "Updated", new_group_obj["targetName"], new_group_obj["id"])
     # _logger.debug(f'Created/Updated User "{new_group_obj["targetName"]}" - json body: {pprint.pformat(new_group_obj)}')
-    return { 'is_new': is_new, 'group_obj': group_obj }
+    return { 'is_new': is_new, 'group_obj': group_obj, 'found': found }
+
+def _restore_group_shifts(group_shifts: tuple):
+    """Restores the Shifts, then the Shift Members, of a Group
+
+    The Group is journaled once every one of its Shifts and Members has
+    been added, so a resumed run tries the Group's Shifts again otherwise.
+
+    Args:
+        group_shifts (tuple): The Group's targetName and captured Shifts
+
+    Return:
+        tuple: The number of Shifts in the record and the number added,
+            then the number of Members in the record and the number added,
+            then 1 and 1 again if the unused Default Shift was removed (or
+            there was none)
+    """
+    target_name, shifts = group_shifts
+    max_members = 0
+    for shift in shifts:
+        max_members += shift['members']['total']
+    # Try to get the "id" from the group dictionary, otherwise
+    # retrieve "id" field directly from xMatters as it may have
+    # changed upon recovery
+    group_id = yield from _get_group(target_name, False)
+    if group_id is None:
+        return (len(shifts), 0, max_members, 0, 1, 0)
+    num_shifts, removed = yield from _add_shifts(group_id, target_name, shifts)
+    # Every User and Group exists by now, so the Members can follow
+    # straight on from their Group's Shifts
+    num_members = yield from _add_shift_members(group_id, target_name, shifts)
+    if removed and num_shifts == len(shifts) and num_members == max_members:
+        _journal.record('shifts', target_name)
+    return (len(shifts), num_shifts, max_members, num_members, 1, 1 if removed else 0)
+
+def _restore_group(full_group_obj: dict):
+    """Restores a Group, and journals it
+
+    Args:
+        full_group_obj (dict): The captured Group (and Shifts)
+
+    Return:
+        dict: The result of _add_group(), or None if not restored with
+            every one of its supervisors
+    """
+    target_name = full_group_obj['group']['targetName']
+    group_obj = yield from _add_group(full_group_obj)
+    # Leave a Group restored without all of its supervisors out of the
+    # journal, so that a resumed run restores it again
+    if not group_obj or not group_obj['found']:
+        return None
+    group_id = yield from _get_group(target_name, False)
+    _journal.record('group', target_name, group_id)
+    return group_obj
 
 def _process_shifts():
     """Reads and restored the instances Group's Shift objects
 
-    Retrieves the Groups object records from the file system and adds/updates
-    the associated Shifts into the target xMatters instance.
+    Adds/updates the Shifts of each Group into the target xMatters instance,
+    followed by the Shift's Members, when the Groups themselves are not
+    being restored (otherwise _process_groups() restores the Shifts).
+    Every Group already exists, so the Groups are spread over the workers.
 
     Args:
         None
 
     Return:
-        None
+        bool: True if every Shift and Shift Member was restored
     """
-    _logger.info('Processing Shifts.')
-    # first Go through the Groups add all the Shifts
-    with open(config.groups_filename) as groups_file:
-        max_shifts = 0
-        num_shifts = 0
-        num_lines = 0
-        for group_json in groups_file:
-            # Ignore the opening array markers ("[\n" and "]\n")
-            if len(group_json) > 2:
-                # Remove trailing ",\n" or trailing "\n"
-                group_json = group_json[:-2] if group_json[-2:] == ',\n' else group_json[:-1]
-                num_lines += 1
-                full_group_obj = json.loads(group_json)
-                group_obj = full_group_obj['group']
-                max_shifts += len(full_group_obj['shifts'])
-                # Try to get the "id" from the group dictionary, otherwise
-                # retrieve "id" field directly from xMatters as it may have
-                # changed upon recovery
-                group_id = _get_group(group_obj['targetName'], False)
-                num_shifts += _add_shifts(group_id, group_obj['targetName'], full_group_obj['shifts'])
-        _logger.info(f"Restored {num_shifts} of a possible {max_shifts} Shifts from {num_lines} Groups.")
-
-    # Now go through the Shifts
-    _logger.info('Processing Shift Members.')
-    with open(config.groups_filename) as groups_file:
-        max_members = 0
-        num_members = 0
-        num_shifts = 0
-        num_lines = 0
-        for group_json in groups_file:
-            # Ignore the opening array markers ("[\n" and "]\n")
-            if len(group_json) > 2:
-                # Remove trailing ",\n" or trailing "\n"
-                group_json = group_json[:-2] if group_json[-2:] == ',\n' else group_json[:-1]
-                num_lines += 1
-                full_group_obj = json.loads(group_json)
-                group_obj = full_group_obj['group']
-                # Count max Members
-                num_shifts += len(full_group_obj['shifts'])
-                for shift in full_group_obj['shifts']:
-                    max_members += shift['members']['total']
-                # Try to get the "id" from the group dictionary, otherwise
-                # retrieve "id" field directly from xMatters as it may have
-                # changed upon recovery
-                group_id = _get_group(group_obj['targetName'], False)
-                num_members += _add_shift_members(group_id, group_obj['targetName'], full_group_obj['shifts'])
-        _logger.info(f"Restored {num_members} of a possible {max_members} Members from {num_shifts} Shifts in {num_lines} Groups.")
+    _logger.info('Processing Shifts and Shift Members.')
+    records = _changed(_read_capture(config.groups_filename, 'group', config.only_groups),
+                       'group', {'shifts'})
+    group_shifts = ((full_group_obj['group']['targetName'], full_group_obj['shifts'])
+                    for full_group_obj in records)
+
+    counts = {}
+    group_shifts = _pending(group_shifts, 'shifts', lambda group: group[0])
+    for result in _map_workers(functools.partial(_run, _restore_group_shifts), group_shifts):
+        _tally(counts, 'shifts', result)
+
+    _log_tally(counts, 'shifts')
+    return _tally_complete(counts, 'shifts')
+
+def _member_groups(shifts: list) -> list:
+    """Returns the targetNames of the Groups among the Members of Shifts"""
+    return [member['recipient']['targetName']
+            for shift in shifts for member in shift['members']['data']
+            if member['recipient']['recipientType'] == 'GROUP']
+
+def _order_groups(include_shifts: bool) -> tuple:
+    """Works out the order to restore the Groups in, nested Groups first
+
+    Scans the capture for the parts of each Group still to restore, and the
+    Groups among the Members of its Shifts.  Each Group is placed on a
+    level above those Groups, so its Shifts can be restored straight after
+    it.  The Shifts of a Group with Groups in a cycle among its Members
+    are left until every Group exists.  The same scan notes where each
+    Group sits in the capture, so _read_levels() can read them back
+    directly.
+
+    Args:
+        include_shifts (bool): If True, the Shifts are to be restored too
+
+    Return:
+        tuple: The level of each Group to restore by targetName (see
+            _dependency_levels()), the [offset, length] of each one, the
+            parts ('group' and 'shifts') to restore by targetName, and the
+            set of targetNames whose Shifts are left until every Group
+            exists
+    """
+    members = {}
+    spans = {}
+    parts = {}
+    num_unchanged = 0
+    num_skipped = 0
+    for offset, length, full_group_obj in _scan_capture(config.groups_filename, 'group', config.only_groups):
+        target_name = full_group_obj['group']['targetName']
+        changed_parts = _changed_parts('group', full_group_obj)
+        restore = set()
+        if 'group' not in changed_parts:
+            num_unchanged += 1
+        elif _journal.is_done('group', target_name):
+            num_skipped += 1
+        else:
+            restore.add('group')
+        if (include_shifts and 'shifts' in changed_parts
+                and not _journal.is_done('shifts', target_name)):
+            restore.add('shifts')
+        if restore:
+            spans[target_name] = [offset, length]
+            parts[target_name] = restore
+            members[target_name] = _member_groups(full_group_obj['shifts']) if 'shifts' in restore else []
+
+    if config.baseline_time_str is not None:
+        _logger.info('Skipped %d group records unchanged since the %s capture.', num_unchanged, config.baseline_time_str)
+    if num_skipped:
+        _logger.info('Skipped %d group records restored by the run being resumed.', num_skipped)
+
+    levels, deferred = _dependency_levels(members)
+    for target_name in deferred:
+        parts[target_name].discard('shifts')
+    if include_shifts and levels:
+        _logger.info('Restoring %d Groups in %d levels, nested Groups first.',
+                     len(levels), max(levels.values()) + 1)
+    if deferred:
+        _logger.info('Found %d Groups with Groups in a cycle among their Shift Members, '
+                     'whose Shifts are restored once every Group exists.', len(deferred))
+    return levels, spans, parts, set(deferred)
+
+def _restore_group_parts(parts: dict, full_group_obj: dict) -> dict:
+    """Restores a Group, then its Shifts, as far as they are to be restored
+
+    Args:
+        parts (dict): The parts to restore of each Group, by targetName
+        full_group_obj (dict): The captured Group (and Shifts)
+
+    Return:
+        dict: The result of _restore_group() and _restore_group_shifts(),
+            by phase, for the parts that were to be restored
+    """
+    target_name = full_group_obj['group']['targetName']
+    results = {}
+    if 'group' in parts[target_name]:
+        results['groups'] = yield from _restore_group(full_group_obj)
+    if 'shifts' in parts[target_name]:
+        results['shifts'] = yield from _restore_group_shifts((target_name, full_group_obj['shifts']))
+    return results
 
 def _process_groups(include_shifts: bool):
     """Reads and restored the instances Groups objects
 
     Retrieves the Groups object records from the file system and adds/updates
-    them into the target xMatters instance.
+    them into the target xMatters instance.  With include_shifts, each
+    Group's Shifts follow straight on from it, as the Groups are restored a
+    level at a time so that the Groups among the Members already exist.
 
     Args:
         include_shifts (bool): If True, restore the Group's shifts too
 
     Return:
-        None
+        tuple: True if every Group was restored, and True if every Shift
+            and Shift Member was
     """
-    # Iterate through and add all the groups first
-    with open(config.groups_filename) as groups_file:
-        num_lines = 0
-        num_new_groups = 0
-        num_updated_groups = 0
-        for group_json in groups_file:
-            # Ignore the opening array markers ("[\n" and "]\n")
-            if len(group_json) > 2:
-                # Remove trailing ",\n" or trailing "\n"
-                group_json = group_json[:-2] if group_json[-2:] == ',\n' else group_json[:-1]
-                num_lines += 1
-                group_obj = _add_group(group_json)
-                if group_obj:
-                    num_new_groups += 1 if group_obj['is_new'] else 0
-                    num_updated_groups += 0 if group_obj['is_new'] else 1
-
-    _logger.info(f"Restored {num_new_groups} new Groups and updated {num_updated_groups} existing Groups from a possible {num_lines} Groups.")
-
-    # Once the groups are added, then add the shifts (if requested)
+    levels, spans, parts, later = _order_groups(include_shifts)
+
+    # Keep hold of the Shifts left until every Group exists
+    later_shifts = []
+    def _retain(records):
+        for full_group_obj in records:
+            target_name = full_group_obj['group']['targetName']
+            if target_name in later:
+                later_shifts.append((target_name, full_group_obj['shifts']))
+            yield full_group_obj
+
+    counts = {}
+    restore_group = functools.partial(_run, _restore_group_parts, parts)
+    for records in _read_levels(config.groups_filename, levels, spans):
+        for results in _map_workers(restore_group, _retain(records)):
+            for phase, result in results.items():
+                _tally(counts, phase, result)
+    for result in _map_workers(functools.partial(_run, _restore_group_shifts), later_shifts):
+        _tally(counts, 'shifts', result)
+
+    _log_tally(counts, 'groups')
     if include_shifts:
-        _process_shifts()
+        _log_tally(counts, 'shifts')
+    return (_tally_complete(counts, 'groups'), _tally_complete(counts, 'shifts'))
+
+def _shift_dependencies(target_name: str, shifts: list) -> list:
+    """Returns the keys of the tasks a Group's Shifts depend on
+
+    Args:
+        target_name (str): The Group's targetName
+        shifts (list): The Group's captured Shifts
+
+    Return:
+        list: The Group itself, and every User and Group among the Members
+    """
+    deps = [('groups', target_name)]
+    for shift in shifts:
+        for member in shift['members']['data']:
+            recipient = member['recipient']
+            kind = 'groups' if recipient['recipientType'] == 'GROUP' else 'users'
+            deps.append((kind, recipient['targetName']))
+    return deps
+
+def _schedule(objects_to_process: list):
+    """Yields the requested records as tasks for a dependency scheduler
+
+    Each capture file is read once, in the order of the phases, and every
+    record still to restore becomes a task keyed by its phase and name,
+    along with the keys of the tasks it depends on:
+
+    * A User depends on its Site and supervisors, which are read first
+      (see _order_users()).
+    * The supervisors left for the second pass (those in a cycle) depend
+      on the User and each of them.
+    * A Group depends on its Site and supervisors.
+    * A Group's Shifts depend on the Group and each User and Group among
+      their Members.
+
+    The dependencies are worked out before the task is yielded, as it may
+    start (and update the record) straight away.
 
+    Args:
+        objects_to_process (list): The list of object types to restore.
+
+    Returns:
+        tuple: ('open', phase) before the first task of a phase, then
+            ('task', (phase, name), record, dependencies) for each record,
+            and ('close', phase) after the last one
+    """
+    if 'sites' in objects_to_process and _phase_pending('sites'):
+        yield ('open', 'sites')
+        records = _changed(_read_capture(config.sites_filename), 'site', {'site'})
+        for site_obj in _pending(records, 'site', lambda site: site['name']):
+            yield ('task', ('sites', site_obj['name']), site_obj, ())
+        yield ('close', 'sites')
+
+    if 'users' in objects_to_process:
+        if _phase_pending('users'):
+            # Each level's supervisors were submitted with the levels below
+            yield ('open', 'users')
+            levels, spans = _order_users({'user', 'devices'} if 'devices' in objects_to_process else {'user'})
+            for records in _read_levels(config.users_filename, levels, spans):
+                for full_user_obj in records:
+                    user_obj = full_user_obj['user']
+                    target_name = user_obj['targetName']
+                    later = _later_supervisors(target_name)
+                    deps = [('sites', user_obj['site']['name'])]
+                    deps += [('users', supervisor) for supervisor in _supervisor_names(user_obj)
+                             if supervisor in levels and supervisor not in later]
+                    yield ('task', ('users', target_name), full_user_obj, deps)
+            yield ('close', 'users')
+        if _phase_pending('supervisors'):
+            # Only the supervisors in a cycle are left, from this run or the
+            # run being resumed
+            yield ('open', 'supervisors')
+            for target_name, supervisors in _supervisors_left().items():
+                deps = [('users', target_name)] + [('users', supervisor) for supervisor in supervisors]
+                yield ('task', ('supervisors', target_name), target_name, deps)
+            yield ('close', 'supervisors')
+    elif 'devices' in objects_to_process and _phase_pending('devices'):
+        yield ('open', 'devices')
+        records = _changed(_read_capture(config.users_filename, 'user', config.only_users), 'user', {'devices'})
+        for full_user_obj in _pending(records, 'devices', lambda full_user_obj: full_user_obj['user']['targetName']):
+            yield ('task', ('devices', full_user_obj['user']['targetName']), full_user_obj, ())
+        yield ('close', 'devices')
+
+    phases = [phase for phase in ('groups', 'shifts')
+              if phase in objects_to_process and _phase_pending(phase)]
+    if phases:
+        for phase in phases:
+            yield ('open', phase)
+        for full_group_obj in _read_capture(config.groups_filename, 'group', config.only_groups):
+            group_obj = full_group_obj['group']
+            target_name = group_obj['targetName']
+            changed_parts = _changed_parts('group', full_group_obj)
+            shifts = None
+            if ('shifts' in phases and 'shifts' in changed_parts
+                    and not _journal.is_done('shifts', target_name)):
+                shifts = full_group_obj['shifts']
+                shift_deps = _shift_dependencies(target_name, shifts)
+            if ('groups' in phases and 'group' in changed_parts
+                    and not _journal.is_done('group', target_name)):
+                deps = [('users', supervisor) for supervisor in _supervisor_names(group_obj)]
+                if 'site' in group_obj:
+                    deps.append(('sites', group_obj['site']))
+                yield ('task', ('groups', target_name), full_group_obj, deps)
+            if shifts is not None:
+                yield ('task', ('shifts', target_name), (target_name, shifts), shift_deps)
+        for phase in phases:
+            yield ('close', phase)
+
+def _tally(counts: dict, phase: str, result):
+    """Adds the result of a scheduled task to the counts of its phase
+
+    Args:
+        counts (dict): The counts of each phase, updated in place
+        phase (str): The phase of the task
+        result: What the task's _restore_*() function returned
+    """
+    if phase in ('sites', 'users'):
+        result = (1 if result else 0,)
+    elif phase == 'supervisors':
+        result = (result,)
+    elif phase == 'groups':
+        result = (0, 0) if not result else ((1, 0) if result['is_new'] else (0, 1))
+    totals = counts.setdefault(phase, [0] * (len(result) + 1))
+    totals[0] += 1
+    for i, value in enumerate(result):
+        totals[i + 1] += value
+
+def _tally_complete(counts: dict, phase: str) -> bool:
+    """Returns True if every record tallied for a phase was restored"""
+    totals = counts.get(phase)
+    if not totals:
+        return True
+    if phase == 'groups':
+        return totals[1] + totals[2] == totals[0]
+    if phase in ('devices', 'shifts'):
+        # The possible and restored counts come in pairs
+        return all(totals[i] == totals[i + 1] for i in range(1, len(totals), 2))
+    return totals[1] == totals[0]
+
+def _finish_tallied(counts: dict, phase: str):
+    """Journals a scheduled phase as finished, unless any of its records failed"""
+    complete = _tally_complete(counts, phase)
+    if phase == 'supervisors':
+        # Restoring a User again replaces its supervisors, so the second
+        # pass stays open for as long as the Users do
+        complete = complete and _tally_complete(counts, 'users')
+    _finish_phase(phase, complete)
+
+def _log_tally(counts: dict, phase: str):
+    """Logs the counts of a scheduled phase, as the phase itself would"""
+    totals = counts.get(phase) or [0] * 5
+    if phase == 'sites':
+        _logger.info("Restored %d of a possible %d Sites.", totals[1], totals[0])
+    elif phase == 'users':
+        _logger.info("Restored %d of a possible %d Users.", totals[1], totals[0])
+    elif phase == 'supervisors':
+        _logger.info("Updated supervisors for %d of a possible %d Users.", totals[1], totals[0])
+    elif phase == 'devices':
+        _logger.info("Restored %d of a possible %d Devices from %d Users.", totals[2], totals[1], totals[0])
+    elif phase == 'groups':
+        _logger.info("Restored %d new Groups and updated %d existing Groups from a possible %d Groups.",
+                     totals[1], totals[2], totals[0])
+    elif phase == 'shifts':
+        _logger.info("Restored %d of a possible %d Shifts from %d Groups.", totals[2], totals[1], totals[0])
+        _logger.info("Restored %d of a possible %d Members from %d Shifts in %d Groups.",
+                     totals[4], totals[3], totals[1], totals[0])
+
+def _run_scheduled(objects_to_process: list):
+    """Runs the requested phases overlapped, on the worker threads
+
+    Rather than restoring every Site, then every User, and so on, each
+    record starts as soon as the records it depends on are restored (see
+    _schedule()).  Each phase is journaled as finished once its last record
+    is done, if none of its records failed.
+
+    Args:
+        objects_to_process (list): The list of object types to restore.
+    """
+    # Look up the existing objects up front
+    if set(objects_to_process) & {'sites', 'users', 'groups'}:
+        _run(_prefetch_sites)
+    if config.prefetch and set(objects_to_process) & {'users', 'devices', 'groups', 'shifts'}:
+        _run(_prefetch_users)
+    if config.prefetch and set(objects_to_process) & {'groups', 'shifts'}:
+        _run(_prefetch_groups)
+
+    restore = {
+        'sites': _restore_site,
+        'users': functools.partial(_restore_user, 'devices' in objects_to_process),
+        'supervisors': _restore_supervisors,
+        'devices': _add_user_devices,
+        'groups': _restore_group,
+        'shifts': _restore_group_shifts,
+    }
+    counts = {}
+    def run(phase, record):
+        result = _run(restore[phase], record)
+        with _dict_lock:
+            _tally(counts, phase, result)
+    def finish(phase):
+        _log_tally(counts, phase)
+        _finish_tallied(counts, phase)
+
+    with scheduler.Scheduler(config.workers, finish) as tasks:
+        for step in _schedule(objects_to_process):
+            if step[0] == 'open':
+                tasks.open(step[1])
+            elif step[0] == 'close':
+                tasks.close(step[1])
+            else:
+                key, record, deps = step[1:]
+                tasks.submit(key, functools.partial(run, key[0], record), deps)
+        tasks.wait()
+
+def _run_phases(objects_to_process: list):
+    """Runs the requested phases, skipping those already journaled
+
+    Args:
+        objects_to_process (list): The list of object types to restore.
+    """
+    # Look up the existing Sites up front
+    if set(objects_to_process) & {'sites', 'users', 'groups'}:
+        _run(_prefetch_sites)
+
+    # Look up the existing Users up front if requested
+    if config.prefetch and set(objects_to_process) & {'users', 'devices', 'groups', 'shifts'}:
+        _run(_prefetch_users)
+
+    # Read and restore the Site objects
+    if 'sites' in objects_to_process and _phase_pending('sites'):
+        _finish_phase('sites', _process_sites())
+
+    # Read and restore the User objects, and possibly devices, then
+    # their supervisors
+    if 'users' in objects_to_process:
+        users_complete = True
+        if _phase_pending('users'):
+            users_complete = _process_users('devices' in objects_to_process)
+            _finish_phase('users', users_complete)
+        if _phase_pending('supervisors'):
+            # Restoring a User again replaces its supervisors, so the second
+            # pass stays open for as long as the Users do
+            _finish_phase('supervisors', _process_supervisors() and users_complete)
+    elif 'devices' in objects_to_process and _phase_pending('devices'):
+        _finish_phase('devices', _process_devices())
+
+    # Look up the existing Groups up front if requested
+    if config.prefetch and set(objects_to_process) & {'groups', 'shifts'}:
+        _run(_prefetch_groups)
+
+    # Read and restore the Group objects, each followed by its Shifts
+    if 'groups' in objects_to_process and _phase_pending('groups'):
+        include_shifts = 'shifts' in objects_to_process and _phase_pending('shifts')
+        groups_complete, shifts_complete = _process_groups(include_shifts)
+        _finish_phase('groups', groups_complete)
+        if include_shifts:
+            _finish_phase('shifts', shifts_complete)
+    elif 'shifts' in objects_to_process and _phase_pending('shifts'):
+        _finish_phase('shifts', _process_shifts())
 
 def process(objects_to_process: list):
     """Capture objects for this instance.
@@ -995,25 +2429,38 @@ def process(objects_to_process: list):
         objects_to_process (list): The list of object types to restore.
     """
     global _logger # pylint: disable=global-statement
+    global _session # pylint: disable=global-statement
+    global _journal # pylint: disable=global-statement
+    global _cache # pylint: disable=global-statement
 
     ### Get the current logger
     _logger = common_logger.get_logger()
 
-    # Read and restore the Site objects
-    if 'sites' in objects_to_process:
-        _process_sites()
+    ### Create the shared HTTP session used by every request
+    _session = _create_session()
+    _logger.debug('Created HTTP session with a pool size of %d', _session.pool_size)
 
-    # Read and restore the User objects, and possibly devices
-    if 'users' in objects_to_process:
-        _process_users('devices' in objects_to_process)
-    elif 'devices' in objects_to_process:
-        _process_devices()
-
-    # Read and restore the Group objects
-    if 'groups' in objects_to_process:
-        _process_groups('shifts' in objects_to_process)
-    elif 'shifts' in objects_to_process:
-        _process_shifts()
+    ### Open the journal, and save it if interrupted
+    _journal = _open_journal()
+    _cache = _open_cache()
+    previous_handler = signal.signal(signal.SIGINT, _on_sigint)
+    try:
+        if config.overlap:
+            _run_scheduled(objects_to_process)
+        else:
+            _run_phases(objects_to_process)
+    except KeyboardInterrupt:
+        _logger.warning(config.ERR_INTERRUPTED_MSG, config.journal_filename)
+        sys.exit(config.ERR_INTERRUPTED_CODE)
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+        _journal.close()
+        _close_cache()
+        _logger.info('Retried %d requests.', _session.policy.retries)
+        if _session.controller is not None:
+            _session.controller.log_limits()
+        _write_metrics(_session.metrics)
+        _session.close()
 
 def main():
     """In case we need to execute the module directly"""
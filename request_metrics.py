@@ -0,0 +1,206 @@
+"""Counts and times every request a restore makes, by endpoint.
+
+Requests are grouped by endpoint family (sites, people, devices, groups,
+and shifts with their members, as in concurrency_control) and HTTP method.
+For each group the metrics keep the number of requests, a breakdown by
+status code (with 'error' for connection errors and timeouts), the bytes
+sent and received, and a histogram of latencies.  Every attempt counts, so
+retried requests show up under the status that caused the retry.
+
+The histogram buckets grow by a factor of sqrt(2) from 1ms to a little
+over two minutes, so memory stays the same however long the restore runs,
+and the percentiles read from it are within one bucket of the exact value.
+
+At the end of the run the metrics are written both as a JSON report and as
+a Prometheus textfile (for node_exporter's textfile collector):
+
+    xmatters_restore_requests_total{family="people",method="POST",status="201"} 200
+    xmatters_restore_request_duration_seconds_bucket{family="people",method="POST",le="0.0226"} 187
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+
+import bisect
+import collections
+import json
+import os
+import threading
+import time
+
+import concurrency_control
+
+BUCKETS = tuple(round(0.001 * 2 ** (i / 2), 4) for i in range(35))
+PERCENTILES = (50, 95, 99)
+
+_PREFIX = 'xmatters_restore_'
+
+
+def body_size(body) -> int:
+    """Returns the size in bytes of a request body, given as str or bytes"""
+    if body is None:
+        return 0
+    if isinstance(body, str):
+        return len(body.encode('utf-8'))
+    return len(body)
+
+
+class _EndpointMetrics:
+    """The metrics of one endpoint family and method"""
+
+    def __init__(self):
+        self.statuses = collections.Counter()
+        self.sent = 0
+        self.received = 0
+        self.seconds = 0.0
+        self.slowest = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    @property
+    def requests(self) -> int:
+        return sum(self.statuses.values())
+
+    def percentile(self, percent: float) -> float:
+        """Returns the latency below which percent of the requests fell
+
+        Interpolates within the bucket the percentile falls in, and never
+        returns more than the slowest request.
+        """
+        rank = self.requests * percent / 100.0
+        count = 0
+        for i, in_bucket in enumerate(self.buckets):
+            if in_bucket and count + in_bucket >= rank:
+                lower = BUCKETS[i - 1] if i > 0 else 0.0
+                upper = BUCKETS[i] if i < len(BUCKETS) else self.slowest
+                return min(self.slowest, lower + (upper - lower) * (rank - count) / in_bucket)
+            count += in_bucket
+        return 0.0
+
+    def report(self) -> dict:
+        requests = self.requests
+        return {
+            'requests': requests,
+            'statuses': {str(status): count for status, count in sorted(self.statuses.items(), key=str)},
+            'sentBytes': self.sent,
+            'receivedBytes': self.received,
+            'seconds': round(self.seconds, 3),
+            'latency': dict(
+                {'p%d' % percent: round(self.percentile(percent), 4) for percent in PERCENTILES},
+                mean=round(self.seconds / requests, 4) if requests else 0.0,
+                max=round(self.slowest, 4)),
+        }
+
+
+class RequestMetrics:
+    """Request metrics of a whole restore, safe to update from any thread
+
+    Attributes:
+        started (float): The time the metrics were started, from time.time()
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def record(self, method: str, url: str, status_code, seconds: float, sent: int = 0, received: int = 0):
+        """Adds one request
+
+        Args:
+            method (str): The HTTP method
+            url (str): The request URL
+            status_code (int): The response status, or None if no response
+                was received
+            seconds (float): How long the request took
+            sent (int): The size of the request body, in bytes
+            received (int): The size of the response body, in bytes
+        """
+        key = (concurrency_control.endpoint_family(url), method)
+        bucket = bisect.bisect_left(BUCKETS, seconds)
+        with self._lock:
+            metrics = self._endpoints.get(key)
+            if metrics is None:
+                metrics = self._endpoints[key] = _EndpointMetrics()
+            metrics.statuses[status_code if status_code is not None else 'error'] += 1
+            metrics.sent += sent
+            metrics.received += received
+            metrics.seconds += seconds
+            metrics.slowest = max(metrics.slowest, seconds)
+            metrics.buckets[bucket] += 1
+
+    def report(self) -> dict:
+        """Returns the metrics as a dict, ready to be written as JSON"""
+        with self._lock:
+            endpoints = [dict(family=family, method=method, **metrics.report())
+                         for (family, method), metrics in sorted(self._endpoints.items())]
+        return {
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+            'seconds': round(time.time() - self.started, 3),
+            'requests': sum(endpoint['requests'] for endpoint in endpoints),
+            'endpoints': endpoints,
+        }
+
+    def summary(self) -> str:
+        """Returns a table of the requests, bytes, and latencies per endpoint"""
+        report = self.report()
+        lines = ['%-8s  %-6s  %8s  %7s  %12s  %12s  %8s  %8s  %8s' % (
+            'Family', 'Method', 'Requests', 'Errors', 'Sent', 'Received', 'p50', 'p95', 'p99')]
+        for endpoint in report['endpoints']:
+            errors = sum(count for status, count in endpoint['statuses'].items()
+                         if status == 'error' or int(status) >= 400)
+            lines.append('%-8s  %-6s  %8d  %7d  %12d  %12d  %7.3fs  %7.3fs  %7.3fs' % (
+                endpoint['family'], endpoint['method'], endpoint['requests'], errors,
+                endpoint['sentBytes'], endpoint['receivedBytes'],
+                endpoint['latency']['p50'], endpoint['latency']['p95'], endpoint['latency']['p99']))
+        return '\n'.join(lines)
+
+    def prometheus(self) -> str:
+        """Returns the metrics in the Prometheus text exposition format"""
+        lines = []
+
+        def metric(name: str, kind: str, description: str):
+            lines.append('# HELP %s%s %s' % (_PREFIX, name, description))
+            lines.append('# TYPE %s%s %s' % (_PREFIX, name, kind))
+
+        def sample(name: str, labels: dict, value):
+            text = ','.join('%s="%s"' % item for item in labels.items())
+            lines.append('%s%s{%s} %s' % (_PREFIX, name, text, value))
+
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            metric('requests_total', 'counter', 'Requests made to the xMatters instance.')
+            for (family, method), metrics in endpoints:
+                for status, count in sorted(metrics.statuses.items(), key=str):
+                    sample('requests_total', {'family': family, 'method': method, 'status': status}, count)
+            for name, attribute, description in (
+                    ('request_sent_bytes_total', 'sent', 'Bytes sent in request bodies.'),
+                    ('response_received_bytes_total', 'received', 'Bytes received in response bodies.')):
+                metric(name, 'counter', description)
+                for (family, method), metrics in endpoints:
+                    sample(name, {'family': family, 'method': method}, getattr(metrics, attribute))
+            metric('request_duration_seconds', 'histogram', 'Time taken by each request.')
+            for (family, method), metrics in endpoints:
+                labels = {'family': family, 'method': method}
+                count = 0
+                for bound, in_bucket in zip(BUCKETS + ('+Inf',), metrics.buckets):
+                    count += in_bucket
+                    sample('request_duration_seconds_bucket', dict(labels, le=bound), count)
+                sample('request_duration_seconds_sum', labels, round(metrics.seconds, 6))
+                sample('request_duration_seconds_count', labels, count)
+        metric('last_run_timestamp_seconds', 'gauge', 'When the restore started.')
+        lines.append('%slast_run_timestamp_seconds %d' % (_PREFIX, self.started))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, json_filename: str, prometheus_filename: str):
+        """Writes the JSON report and the Prometheus textfile
+
+        Each file is written under a temporary name, then renamed, so a
+        collector never reads one half written.
+        """
+        for filename, text in ((json_filename, json.dumps(self.report(), indent=2)),
+                               (prometheus_filename, self.prometheus())):
+            partial = filename + '.tmp'
+            with open(partial, 'w') as metrics_file:
+                metrics_file.write(text)
+            os.replace(partial, filename)
@@ -22,6 +22,7 @@ import sys
 
 import config
 import cli
+import common_logger
 
 __all__ = []
 __version__ = config.VERSION
@@ -60,5 +61,7 @@ if __name__ == "__main__":
         if e.code != 0:
             raise
         else:
+            # os._exit() skips the atexit hooks, so write out the log first
+            common_logger.close()
             os._exit(0)
 
@@ -0,0 +1,126 @@
+"""Decides when and how long to wait before retrying a failed request.
+
+Shared by both restore engines, so every request follows the same rules:
+
+* Only temporary failures are retried: connection errors and timeouts,
+  429 (Too Many Requests), and 502-504.  501 is only retried for requests
+  made resilient, as xMatters also answers 501 when re-creating a Shift
+  that was just deleted, until the delete has taken effect; for any other
+  request (e.g. adding a Shift that already exists) it is final.
+* Each request gets a bounded number of attempts, waiting an exponentially
+  growing, randomly jittered delay between them.
+* A Retry-After header on a 429 or 503 sets the minimum delay, and pauses
+  every other request until it has passed, so a throttled restore slows
+  down as a whole instead of each request hammering the instance.
+* The whole run has a budget of retries.  Once it is spent, failures are
+  returned straight away rather than retried.
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+
+from email.utils import parsedate_to_datetime
+import random
+import threading
+import time
+
+RETRY_STATUSES = frozenset([429, 502, 503, 504])
+RESILIENT_RETRY_STATUSES = RETRY_STATUSES | {501}
+THROTTLE_STATUSES = frozenset([429, 503])
+
+
+def parse_retry_after(value: str):
+    """Returns the number of seconds a Retry-After header asks to wait
+
+    Args:
+        value (str): The header, either a number of seconds or an HTTP date
+
+    Return:
+        float: The seconds to wait, or None if missing or unreadable
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """Retry rules and budget shared by every request of a run
+
+    Attributes:
+        attempts (int): Attempts per request, including the first
+        budget (int): Retries left for the rest of the run
+        base_delay (float): Upper bound of the first delay, in seconds
+        max_delay (float): Upper bound of any delay, in seconds
+        retries (int): Number of retries made so far
+    """
+
+    def __init__(self, attempts: int, budget: int, base_delay: float = 0.5, max_delay: float = 60.0):
+        self.attempts = attempts
+        self.budget = budget
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+        self._resume_at = 0.0
+        self._exhausted_reported = False
+        self._lock = threading.Lock()
+
+    def should_retry(self, status_code: int, resilient: bool = False) -> bool:
+        """Returns True if a response with status_code may be retried
+
+        Args:
+            status_code (int): The response status
+            resilient (bool): If True, the request also retries 501
+        """
+        return status_code in (RESILIENT_RETRY_STATUSES if resilient else RETRY_STATUSES)
+
+    def pause(self) -> float:
+        """Returns how long to wait before sending, while throttled"""
+        return max(0.0, self._resume_at - time.monotonic())
+
+    def backoff(self, attempt: int, status_code: int = None, retry_after: str = None,
+                resilient: bool = False):
+        """Returns how long to wait before retrying, or None to give up
+
+        Args:
+            attempt (int): The number of the attempt that just failed
+            status_code (int): The response status, or None for an error
+            retry_after (str): The response's Retry-After header, if any
+            resilient (bool): If True, allow twice the usual attempts (for
+                requests that are expected to fail for a while)
+
+        Return:
+            float: The seconds to wait, or None if no retries are left
+        """
+        if attempt >= (self.attempts * 2 if resilient else self.attempts):
+            return None
+        with self._lock:
+            if self.budget <= 0:
+                return None
+            self.budget -= 1
+            self.retries += 1
+
+        # Full jitter, so retries from parallel requests spread out
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+        wait = parse_retry_after(retry_after) if status_code in THROTTLE_STATUSES else None
+        if wait is not None:
+            delay = max(delay, min(wait, self.max_delay))
+            with self._lock:
+                self._resume_at = max(self._resume_at, time.monotonic() + delay)
+        return delay
+
+    def exhausted(self) -> bool:
+        """Returns True the first time it is called once the budget is spent"""
+        with self._lock:
+            if self.budget > 0 or self._exhausted_reported:
+                return False
+            self._exhausted_reported = True
+            return True
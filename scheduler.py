@@ -0,0 +1,302 @@
+"""Runs restore tasks as soon as the tasks they depend on have finished.
+
+Each task restores one record (e.g. the User "jsmith") and is known by a
+(kind, name) key, such as ('users', 'jsmith').  A task names the keys it
+depends on, e.g. a User depends on its Site, and a Group's Shifts depend on
+the Group and on every User and Group among their Members.  Tasks of
+different kinds are submitted one capture file after another, and each one
+starts as soon as its dependencies have finished, so the kinds overlap
+instead of running one whole phase after the other.
+
+A dependency on a key that has not been submitted is handled by its kind:
+
+* If the kind was never opened (e.g. Sites are not being restored), or has
+  been closed (every task of the kind was submitted), the dependency is
+  taken to be met, as the object either already exists or never will.
+* If the kind is still open, the task waits until the key is submitted or
+  the kind is closed.  Such a task is "parked", along with any task
+  depending on it.
+
+To keep memory use bounded, submit() waits while too many tasks are
+queued or running.  Parked tasks don't count towards that limit, since
+only more submissions can release them.
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+
+class _Task:
+    """A task and the state of its dependencies"""
+
+    def __init__(self, key: tuple, func):
+        self.key = key
+        self.func = func
+        self.blocked = 0
+        self.parked = 0
+        self.dependents = []
+        self.done = False
+
+
+class DependencyGraph:
+    """Keeps track of which tasks may run, for one of the schedulers below
+
+    Attributes:
+        max_pending (int): The most tasks queued or running before submit()
+            waits; parked tasks don't count
+    """
+
+    def __init__(self, max_pending: int, on_finish=None):
+        """
+        Args:
+            max_pending (int): The most tasks queued or running at once
+            on_finish (callable): Called with a kind once it is closed and
+                every one of its tasks has finished
+        """
+        self.max_pending = max_pending
+        self._on_finish = on_finish
+        self._lock = threading.RLock()
+        self._tasks = {}
+        self._unknown = {}
+        self._open = set()
+        self._outstanding = {}
+        self._active = 0
+        self._running = 0
+        self._error = None
+
+    def open(self, kind: str):
+        """Declares that tasks of kind are about to be submitted
+
+        Every task of a kind must be submitted between open() and close().
+        """
+        with self._lock:
+            self._open.add(kind)
+            self._outstanding.setdefault(kind, 0)
+
+    def _add(self, key: tuple, func, deps) -> list:
+        """Adds a task, returning the tasks that are now ready to run"""
+        task = _Task(key, func)
+        self._tasks[key] = task
+        self._outstanding[key[0]] = (self._outstanding.get(key[0]) or 0) + 1
+        for dep in set(deps):
+            dep_task = self._tasks.get(dep)
+            if dep_task is not None:
+                if dep_task.done:
+                    continue
+                dep_task.dependents.append(task)
+                task.blocked += 1
+                task.parked += 1 if dep_task.parked else 0
+            elif dep[0] in self._open:
+                self._unknown.setdefault(dep, []).append(task)
+                task.blocked += 1
+                task.parked += 1
+        if not task.parked:
+            self._active += 1
+
+        # Tasks waiting for this key now wait on this task instead
+        ready = []
+        for waiter in self._unknown.pop(key, []):
+            task.dependents.append(waiter)
+            if not task.parked:
+                self._unpark(waiter)
+        if not task.blocked:
+            ready.append(task)
+        return ready
+
+    def _unpark(self, task: _Task):
+        """Removes one reason a task is parked, along with its dependents"""
+        stack = [task]
+        while stack:
+            task = stack.pop()
+            task.parked -= 1
+            if task.parked == 0:
+                self._active += 1
+                stack.extend(dependent for dependent in task.dependents if not dependent.done)
+
+    def _close(self, kind: str) -> tuple:
+        """Closes a kind, returning the tasks now ready and kinds now finished"""
+        self._open.discard(kind)
+        ready = []
+        for key in [key for key in self._unknown if key[0] == kind]:
+            for waiter in self._unknown.pop(key):
+                self._unpark(waiter)
+                waiter.blocked -= 1
+                if not waiter.blocked:
+                    ready.append(waiter)
+        return ready, self._finished(kind)
+
+    def _done(self, task: _Task) -> tuple:
+        """Marks a task as finished, returning the tasks now ready and kinds
+        now finished"""
+        task.done = True
+        task.func = None
+        self._active -= 1
+        self._running -= 1
+        self._outstanding[task.key[0]] -= 1
+        ready = []
+        for dependent in task.dependents:
+            dependent.blocked -= 1
+            if not dependent.blocked:
+                ready.append(dependent)
+        task.dependents = None
+        return ready, self._finished(task.key[0])
+
+    def _finished(self, kind: str) -> list:
+        if kind in self._open or self._outstanding.get(kind) != 0:
+            return []
+        # Only report a kind once
+        self._outstanding[kind] = None
+        return [kind]
+
+    def _report(self, kinds: list):
+        if self._on_finish is not None:
+            for kind in kinds:
+                self._on_finish(kind)
+
+    def _pending(self) -> bool:
+        return any(count for count in self._outstanding.values())
+
+    def _finished_all(self) -> bool:
+        """Returns True once every task has finished, or one has failed
+
+        With every kind closed and nothing running, any tasks left can only
+        be waiting on each other, which is reported as an error.
+        """
+        if self._error is None and not self._open and not self._running and self._pending():
+            waiting = [key for key, task in self._tasks.items() if not task.done]
+            self._error = RuntimeError('Circular dependency between %s' % waiting[:10])
+        return self._error is not None or not self._pending()
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+
+class Scheduler(DependencyGraph):
+    """Runs the tasks on a pool of worker threads
+
+    Tasks are functions taking no arguments.  Use as a context manager, so
+    the worker threads are shut down once every task has finished.
+    """
+
+    def __init__(self, workers: int, on_finish=None):
+        super(Scheduler, self).__init__(workers * 2, on_finish)
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._changed = threading.Condition(self._lock)
+        self._stopped = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        # If interrupted, let the running tasks finish without starting more
+        with self._lock:
+            self._stopped = True
+        self._executor.shutdown(wait=True)
+
+    def _run(self, task: _Task):
+        try:
+            task.func()
+        except Exception as e: # pylint: disable=broad-except
+            with self._lock:
+                self._error = self._error or e
+        with self._lock:
+            ready, kinds = self._done(task)
+            self._start(ready)
+            self._changed.notify_all()
+        self._report(kinds)
+
+    def _start(self, ready: list):
+        if self._stopped:
+            return
+        for task in ready:
+            self._running += 1
+            self._executor.submit(self._run, task)
+
+    def submit(self, key: tuple, func, deps=()):
+        """Adds a task, waiting first while too many are queued or running
+
+        Args:
+            key (tuple): The (kind, name) of the task
+            func (callable): Restores the record, called without arguments
+            deps (iterable): The keys of the tasks it depends on
+        """
+        with self._lock:
+            self._changed.wait_for(lambda: self._error is not None or self._active < self.max_pending)
+            self._raise_error()
+            self._start(self._add(key, func, deps))
+
+    def close(self, kind: str):
+        """Declares that every task of kind has been submitted"""
+        with self._lock:
+            ready, kinds = self._close(kind)
+            self._start(ready)
+        self._report(kinds)
+
+    def wait(self):
+        """Waits until every task has finished"""
+        with self._lock:
+            self._changed.wait_for(self._finished_all)
+            self._raise_error()
+
+
+class AsyncScheduler(DependencyGraph):
+    """Runs the tasks on the running event loop
+
+    Tasks are coroutine functions taking no arguments.
+    """
+
+    def __init__(self, concurrency: int, on_finish=None):
+        super(AsyncScheduler, self).__init__(concurrency * 2, on_finish)
+        self._changed = asyncio.Event()
+        self._futures = set()
+
+    async def _run(self, task: _Task):
+        try:
+            await task.func()
+        except Exception as e: # pylint: disable=broad-except
+            self._error = self._error or e
+        ready, kinds = self._done(task)
+        self._start(ready)
+        self._changed.set()
+        self._report(kinds)
+
+    def _start(self, ready: list):
+        for task in ready:
+            self._running += 1
+            future = asyncio.ensure_future(self._run(task))
+            self._futures.add(future)
+            future.add_done_callback(self._futures.discard)
+
+    async def submit(self, key: tuple, func, deps=()):
+        """Adds a task, waiting first while too many are queued or running
+
+        Args:
+            key (tuple): The (kind, name) of the task
+            func (coroutine function): Restores the record, called without
+                arguments
+            deps (iterable): The keys of the tasks it depends on
+        """
+        while self._error is None and self._active >= self.max_pending:
+            self._changed.clear()
+            await self._changed.wait()
+        self._raise_error()
+        self._start(self._add(key, func, deps))
+
+    def close(self, kind: str):
+        """Declares that every task of kind has been submitted"""
+        ready, kinds = self._close(kind)
+        self._start(ready)
+        self._report(kinds)
+
+    async def wait(self):
+        """Waits until every task has finished"""
+        while not self._finished_all():
+            self._changed.clear()
+            await self._changed.wait()
+        self._raise_error()
@@ -0,0 +1,54 @@
+"""Tests finding the parts of a record changed since the baseline capture"""
+
+import json
+import os
+import tempfile
+import unittest
+
+import capture_diff
+
+PARTS = {'user': lambda record: record['user'], 'devices': lambda record: record.get('devices', [])}
+BASELINE = [
+    {'user': {'targetName': 'amy', 'firstName': 'Amy', 'lastName': 'Ames'},
+     'devices': [{'name': 'Work Email', 'emailAddress': 'amy@example.com'}]},
+    {'user': {'targetName': 'bob', 'firstName': 'Bob'}},
+]
+
+
+class ChangedPartsTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        filename = os.path.join(directory.name, 'users.json')
+        with open(filename, 'w') as capture_file:
+            json.dump(BASELINE, capture_file, indent=1)
+        self.baseline = capture_diff.load_hashes(filename, lambda record: record['user']['targetName'], PARTS)
+
+    def changed(self, record: dict) -> set:
+        return capture_diff.changed_parts(self.baseline, record['user']['targetName'], record, PARTS)
+
+    def test_unchanged(self):
+        self.assertEqual(set(self.baseline), {'amy', 'bob'})
+        for record in BASELINE:
+            self.assertEqual(self.changed(record), set())
+
+    def test_key_order_is_ignored(self):
+        record = {'devices': BASELINE[0]['devices'],
+                  'user': {'lastName': 'Ames', 'firstName': 'Amy', 'targetName': 'amy'}}
+        self.assertEqual(self.changed(record), set())
+
+    def test_changed_part(self):
+        record = dict(BASELINE[0], devices=[{'name': 'Work Email', 'emailAddress': 'amy@example.org'}])
+        self.assertEqual(self.changed(record), {'devices'})
+        record = dict(BASELINE[1], devices=[{'name': 'Work Email', 'emailAddress': 'bob@example.com'}])
+        self.assertEqual(self.changed(record), {'devices'})
+        record = {'user': dict(BASELINE[1]['user'], lastName='Brown')}
+        self.assertEqual(self.changed(record), {'user'})
+
+    def test_new_record(self):
+        self.assertEqual(self.changed({'user': {'targetName': 'cat'}}), {'user', 'devices'})
+
+
+if __name__ == '__main__':
+    unittest.main()
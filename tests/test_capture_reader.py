@@ -0,0 +1,70 @@
+"""Tests reading the records of capture files in their different layouts"""
+
+import json
+import os
+import tempfile
+import unittest
+
+import capture_reader
+
+RECORDS = [{'user': {'targetName': 'amy'}, 'devices': []},
+           {'user': {'targetName': 'zoë'}, 'note': 'ü€ },\n'},
+           {'user': {'targetName': 'bob'}, 'devices': [{'name': 'Work Email'}]}]
+
+LAYOUTS = {
+    'array, one per line': '[\n' + ',\n'.join(json.dumps(record) for record in RECORDS) + '\n]\n',
+    'array, windows lines': '[\r\n' + ',\r\n'.join(json.dumps(record) for record in RECORDS) + '\r\n]\r\n',
+    'array, one line': json.dumps(RECORDS),
+    'array, pretty': json.dumps(RECORDS, indent=2),
+    'array, commas first': '[' + '\n,'.join(json.dumps(record) for record in RECORDS) + ']',
+    'array, mixed': ('[\n' + json.dumps(RECORDS[0]) + ',\n' + json.dumps(RECORDS[1], indent=1)
+                     + ', ' + json.dumps(RECORDS[2]) + '\n]'),
+    'json lines': ''.join(json.dumps(record) + '\n' for record in RECORDS),
+    'json lines, no last newline': '\n'.join(json.dumps(record) for record in RECORDS),
+    'json lines, unescaped': ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in RECORDS),
+}
+
+
+class CaptureReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.filename = os.path.join(directory.name, 'capture.json')
+
+    def write(self, text: str):
+        with open(self.filename, 'w', encoding='utf-8', newline='') as capture_file:
+            capture_file.write(text)
+
+    def test_layouts(self):
+        for layout, text in LAYOUTS.items():
+            for chunk_size in (7, 64, capture_reader.CHUNK_SIZE):
+                with self.subTest(layout=layout, chunk_size=chunk_size):
+                    self.write(text)
+                    self.assertEqual(list(capture_reader.read_records(self.filename, chunk_size)), RECORDS)
+
+    def test_scanned_offsets_read_back(self):
+        for layout, text in LAYOUTS.items():
+            for chunk_size in (7, capture_reader.CHUNK_SIZE):
+                with self.subTest(layout=layout, chunk_size=chunk_size):
+                    self.write(text)
+                    scanned = list(capture_reader.scan_records(self.filename, chunk_size))
+                    self.assertEqual([record for _, _, record in scanned], RECORDS)
+                    spans = [[offset, length] for offset, length, _ in scanned]
+                    self.assertEqual(list(capture_reader.read_spans(self.filename, spans)), RECORDS)
+
+    def test_empty(self):
+        for text in ('', '[]', ' [\n]\n'):
+            self.write(text)
+            self.assertEqual(list(capture_reader.read_records(self.filename)), [])
+
+    def test_malformed(self):
+        for text in ('[\n{"a": 1},\n{"b": 2},\n]\n', '[\n{"a": 1},\n{"b": 2}\n', '[\n{"a": 1}\n{"b": 2}\n]'):
+            with self.subTest(text=text):
+                self.write(text)
+                with self.assertRaises(ValueError):
+                    list(capture_reader.read_records(self.filename))
+
+
+if __name__ == '__main__':
+    unittest.main()
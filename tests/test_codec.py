@@ -0,0 +1,50 @@
+"""Tests that the codec decodes the same with or without orjson"""
+
+import unittest
+from unittest import mock
+
+import codec
+
+RECORD = {'user': {'targetName': 'zoë', 'roles': {'data': [{'name': 'Standard User'}]}, 'active': True}}
+TEXT = '{"user":{"targetName":"zoë","roles":{"data":[{"name":"Standard User"}]},"active":true}}'
+CODECS = ('json', 'orjson') if codec.orjson is not None else ('json',)
+
+
+def _using(name: str):
+    """Puts the codec in use, leaving out orjson for 'json'"""
+    return mock.patch.object(codec, 'orjson', codec.orjson if name == 'orjson' else None)
+
+
+class CodecTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        for name in CODECS:
+            with self.subTest(codec=name), _using(name):
+                data = codec.dumps(RECORD)
+                self.assertIsInstance(data, bytes)
+                self.assertNotIn(b'": ', data)
+                self.assertNotIn(b', "', data)
+                self.assertEqual(codec.loads(data), RECORD)
+                self.assertEqual(codec.loads(TEXT), RECORD)
+
+    def test_whitespace_and_bytes(self):
+        # The json scanner alone can't decode these, so they go through
+        # json.loads when orjson is missing
+        for name in CODECS:
+            with self.subTest(codec=name), _using(name):
+                for data in (' ' + TEXT, '\n\t' + TEXT + '\n', TEXT + ' ', TEXT.encode('utf-8'),
+                             (' ' + TEXT).encode('utf-8'), ('\n' + TEXT + '\n').encode('utf-8')):
+                    self.assertEqual(codec.loads(data), RECORD, data)
+                for data, obj in ((' 42', 42), ('"x"', 'x'), ('null', None), (b'[1, 2]', [1, 2])):
+                    self.assertEqual(codec.loads(data), obj, data)
+
+    def test_errors(self):
+        for name in CODECS:
+            with self.subTest(codec=name), _using(name):
+                for data in ('', ' ', '{"a": 1} {"b": 2}', '{"a": 1},', '{"a": ', b'{"a": 1}x', '[1,]'):
+                    with self.assertRaises(ValueError, msg=data):
+                        codec.loads(data)
+
+
+if __name__ == '__main__':
+    unittest.main()
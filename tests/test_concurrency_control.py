@@ -0,0 +1,75 @@
+"""Tests how the adaptive concurrency limits rise and fall"""
+
+import unittest
+
+import concurrency_control
+
+
+class AdaptiveLimitTest(unittest.TestCase):
+
+    def limit(self, maximum=100):
+        return concurrency_control.AdaptiveLimit('people', maximum, initial=4)
+
+    def test_slow_start_adds_one_per_response(self):
+        limit = self.limit()
+        for _ in range(6):
+            self.assertIsNone(limit.update(0.01, 200))
+        self.assertEqual(limit.allowed(), 10)
+
+    def test_never_above_maximum(self):
+        limit = self.limit(maximum=6)
+        for _ in range(10):
+            limit.update(0.01, 201)
+        self.assertEqual(limit.allowed(), 6)
+
+    def test_congestion_halves_the_limit(self):
+        for status_code in (429, 502, 503, 504, None):
+            with self.subTest(status_code=status_code):
+                limit = self.limit()
+                for _ in range(4):
+                    limit.update(0.01, 200)
+                self.assertIsNotNone(limit.update(0.01, status_code))
+                self.assertEqual(limit.allowed(), 4)
+
+    def test_growth_is_additive_after_a_decrease(self):
+        limit = self.limit()
+        for _ in range(4):
+            limit.update(0.01, 200)
+        limit.update(0.01, 429)
+        # About one more per round of (limit) responses
+        for _ in range(4):
+            limit.update(0.01, 200)
+        self.assertEqual(limit.allowed(), 4)
+        for _ in range(5):
+            limit.update(0.01, 200)
+        self.assertEqual(limit.allowed(), 5)
+
+    def test_other_errors_are_healthy(self):
+        # e.g. the 501 for a Shift that already exists, or a lookup's 404
+        for status_code in (400, 404, 409, 500, 501):
+            with self.subTest(status_code=status_code):
+                limit = self.limit()
+                self.assertIsNone(limit.update(0.01, status_code))
+                self.assertEqual(limit.allowed(), 5)
+
+    def test_slow_responses_cut_by_a_quarter(self):
+        limit = self.limit()
+        for _ in range(4):
+            limit.update(0.01, 200)
+        self.assertTrue(limit.update(1.0, 200).startswith('latency'))
+        self.assertEqual(limit.allowed(), 6)
+
+
+class EndpointFamilyTest(unittest.TestCase):
+
+    def test_families(self):
+        base = 'https://example.xmatters.com/api/xm/1/'
+        for path, family in (('sites', 'sites'), ('people/amy', 'people'), ('people/abc/devices', 'devices'),
+                             ('devices', 'devices'), ('groups/ops', 'groups'),
+                             ('groups/abc/shifts/Day/members', 'shifts'), ('plans', 'other')):
+            self.assertEqual(concurrency_control.endpoint_family(base + path), family, path)
+        self.assertEqual(concurrency_control.endpoint_family('https://example.com/login'), 'other')
+
+
+if __name__ == '__main__':
+    unittest.main()
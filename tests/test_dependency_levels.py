@@ -0,0 +1,157 @@
+"""Tests the ordering of Users by supervisor, and of Groups by nesting"""
+
+import json
+import logging
+import os
+import tempfile
+import unittest
+
+import config
+import journal
+import planner
+import processor
+
+
+class DependencyLevelsTest(unittest.TestCase):
+
+    def assertOrdered(self, dependencies: dict) -> tuple:
+        """Checks every record is placed above the dependencies not deferred"""
+        levels, deferred = processor._dependency_levels(dependencies)
+        self.assertEqual(set(levels), set(dependencies))
+        for name, names in dependencies.items():
+            self.assertLessEqual(deferred.get(name, set()), set(names))
+            for dependency in names:
+                if dependency in dependencies and dependency not in deferred.get(name, ()):
+                    self.assertLess(levels[dependency], levels[name], (name, dependency))
+        return levels, deferred
+
+    def test_no_cycles(self):
+        levels, deferred = self.assertOrdered({'a': ['b'], 'b': ['c'], 'c': [], 'd': ['missing']})
+        self.assertEqual(levels, {'a': 2, 'b': 1, 'c': 0, 'd': 0})
+        self.assertEqual(deferred, {})
+
+    def test_self_loop(self):
+        levels, deferred = self.assertOrdered({'a': ['a']})
+        self.assertEqual(levels, {'a': 0})
+        self.assertEqual(deferred, {'a': {'a'}})
+
+    def test_self_loops_in_a_cycle(self):
+        self.assertOrdered({'n0': ['n0', 'n1'], 'n1': ['n1', 'n0']})
+
+    def test_overlapping_cycles(self):
+        self.assertOrdered({'n0': ['n1', 'n3'], 'n1': ['n2', 'n0'], 'n2': ['n1', 'n3'], 'n3': ['n1', 'n2']})
+
+    def test_every_record_in_every_cycle(self):
+        names = ['n%d' % i for i in range(6)]
+        self.assertOrdered({name: list(names) for name in names})
+
+    def test_records_below_a_cycle(self):
+        levels, deferred = self.assertOrdered({'boss': ['peer'], 'peer': ['boss'],
+                                               'lead': ['boss'], 'staff': ['lead', 'peer']})
+        self.assertEqual(len(deferred), 1)
+        self.assertGreater(levels['lead'], levels['boss'])
+        self.assertGreater(levels['staff'], levels['lead'])
+
+
+
+def _group(target_name: str, member_groups: list) -> dict:
+    """Returns a captured Group with the Groups as Members of its one Shift"""
+    members = [{'recipient': {'targetName': name, 'recipientType': 'GROUP'}} for name in member_groups]
+    members.append({'recipient': {'targetName': 'someone', 'recipientType': 'PERSON'}})
+    return {'group': {'targetName': target_name},
+            'shifts': [{'name': 'Default Shift', 'members': {'total': len(members), 'data': members}}]}
+
+
+class OrderGroupsTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.filename = os.path.join(directory.name, 'groups.json')
+        saved = (config.groups_filename, config.only_groups, config.baseline_time_str,
+                 processor._journal, processor._logger)
+        def restore():
+            (config.groups_filename, config.only_groups, config.baseline_time_str,
+             processor._journal, processor._logger) = saved
+        self.addCleanup(restore)
+        config.groups_filename = self.filename
+        config.only_groups = None
+        config.baseline_time_str = None
+        processor._journal = journal.Journal(os.path.join(directory.name, 'journal'))
+        self.addCleanup(processor._journal.close)
+        processor._logger = logging.getLogger(__name__)
+
+    def test_interlocking_nesting_cycles(self):
+        nesting = {'n0': ['n1', 'n3'], 'n1': ['n2', 'n0'], 'n2': ['n1', 'n3'], 'n3': ['n1', 'n2'],
+                   'outer': ['n2'], 'plain': []}
+        with open(self.filename, 'w') as capture_file:
+            json.dump([_group(name, groups) for name, groups in nesting.items()], capture_file, indent=1)
+
+        levels, spans, parts, later = processor._order_groups(True)
+        self.assertEqual(set(levels), set(nesting))
+        self.assertEqual(set(spans), set(nesting))
+        for name, groups in nesting.items():
+            if name not in later:
+                self.assertEqual(parts[name], {'group', 'shifts'})
+                for group in groups:
+                    self.assertLess(levels[group], levels[name], (name, group))
+        self.assertTrue(later)
+        self.assertLessEqual(later, {'n0', 'n1', 'n2', 'n3'})
+        self.assertEqual(levels['plain'], 0)
+
+        # The records read back from the noted offsets are the captured ones
+        records = [record for level in processor._read_levels(self.filename, levels, spans) for record in level]
+        self.assertEqual(sorted(record['group']['targetName'] for record in records), sorted(nesting))
+
+
+def _user(target_name: str, supervisors: list) -> dict:
+    """Returns a captured User with the given supervisors"""
+    return {'user': {'id': 'captured-' + target_name, 'targetName': target_name, 'links': {},
+                     'roles': {'data': [{'name': 'Standard User'}]}, 'site': {'name': 'HQ'},
+                     'supervisors': {'total': len(supervisors),
+                                     'data': [{'targetName': name} for name in supervisors]}}}
+
+
+class RestoreSupervisorsTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.filename = os.path.join(directory.name, 'users.json')
+        saved = (config.users_filename, config.only_users, config.baseline_time_str, config.xmod_url,
+                 processor._journal, processor._logger, processor._session, processor._cache)
+        def restore():
+            (config.users_filename, config.only_users, config.baseline_time_str, config.xmod_url,
+             processor._journal, processor._logger, processor._session, processor._cache) = saved
+            for shared in (processor._site_dict, processor._user_dict,
+                           processor._supervisor_dict, processor._deferred_supervisors):
+                shared.clear()
+        self.addCleanup(restore)
+        config.users_filename = self.filename
+        config.only_users = None
+        config.baseline_time_str = None
+        config.xmod_url = 'https://example.xmatters.com'
+        processor._journal = journal.Journal(os.path.join(directory.name, 'journal'))
+        self.addCleanup(processor._journal.close)
+        processor._logger = logging.getLogger(__name__)
+        processor._cache = None
+        self.instance = planner.SimulatedInstance()
+        self.instance.add('sites', {'name': 'HQ'})
+        processor._session = planner.PlanningSession(self.instance)
+
+    def test_cycle_keeps_the_other_supervisors(self):
+        supervisors = {'lead': [], 'mix': ['lead', 'mix2'], 'mix2': ['mix'], 'self': ['self', 'lead']}
+        with open(self.filename, 'w') as capture_file:
+            json.dump([_user(name, names) for name, names in supervisors.items()], capture_file)
+
+        processor._process_users(False)
+        processor._process_supervisors()
+
+        people = {person['id']: person for person in self.instance._people.values()}
+        for person in people.values():
+            names = {people[supervisor]['targetName'] for supervisor in person.get('supervisors', [])}
+            self.assertEqual(names, set(supervisors[person['targetName']]), person['targetName'])
+
+
+if __name__ == '__main__':
+    unittest.main()
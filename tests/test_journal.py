@@ -0,0 +1,172 @@
+"""Tests resuming a restore from its journal"""
+
+import json
+import logging
+import os
+import tempfile
+import unittest
+
+import config
+import journal
+import planner
+import processor
+
+SITES = [{'id': 'captured-hq', 'name': 'HQ'}]
+USERS = [{'user': {'id': 'captured-' + name, 'targetName': name, 'links': {},
+                   'roles': {'data': [{'name': 'Standard User'}]}, 'site': {'name': 'HQ'}},
+          'devices': [{'id': 'captured-' + name + '-email', 'targetName': name + '|Work Email',
+                       'name': 'Work Email', 'links': {},
+                       'deviceType': 'EMAIL', 'emailAddress': name + '@example.com'}]}
+         for name in ('amy', 'bob')]
+GROUPS = [{'group': {'id': 'captured-ops', 'targetName': 'ops', 'links': {}},
+           'shifts': [{'id': 'captured-day', 'name': 'Day', 'links': {}, 'group': {},
+                       'members': {'total': 2, 'data': [
+                           {'shift': {}, 'position': 1, 'recipient': {'targetName': 'amy', 'recipientType': 'PERSON'}},
+                           {'shift': {}, 'position': 2, 'recipient': {'targetName': 'bob', 'recipientType': 'PERSON'}}]}}]}]
+
+_SHARED = (processor._site_dict, processor._user_dict, processor._supervisor_dict,
+           processor._deferred_supervisors, processor._group_dict, processor._new_shifts)
+
+
+class _FailingSession(planner.PlanningSession):
+    """Answers with a 503 the POSTs picked out by fail(url, body)"""
+
+    def __init__(self, instance: planner.SimulatedInstance, fail):
+        super().__init__(instance)
+        self.fail = fail
+
+    def request(self, method, url, params=None, data=None, **kwargs):
+        if method == 'POST' and self.fail(url, json.loads(data)):
+            return planner._Response(503, None)
+        return super().request(method, url, params=params, data=data, **kwargs)
+
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.filename = os.path.join(directory.name, 'journal.jsonl')
+
+    def reopen(self, resume: bool) -> journal.Journal:
+        reopened = journal.Journal(self.filename, resume)
+        self.addCleanup(reopened.close)
+        return reopened
+
+    def test_resume_reads_back_earlier_entries(self):
+        first = journal.Journal(self.filename)
+        first.record('user', 'amy', {'id': 'a1'})
+        first.record('user', 'amy', {'id': 'a2'})
+        first.finish_phase('sites')
+        # Only what an earlier run recorded counts as done
+        self.assertFalse(first.is_done('user', 'amy'))
+        self.assertFalse(first.phase_done('sites'))
+        first.close()
+
+        resumed = self.reopen(True)
+        self.assertTrue(resumed.resumed)
+        self.assertTrue(resumed.is_done('user', 'amy'))
+        self.assertFalse(resumed.is_done('user', 'bob'))
+        self.assertFalse(resumed.is_done('group', 'amy'))
+        self.assertEqual(resumed.get('user'), {'amy': {'id': 'a2'}})
+        self.assertEqual(resumed.get('group'), {})
+        self.assertTrue(resumed.phase_done('sites'))
+        self.assertFalse(resumed.phase_done('users'))
+
+    def test_without_resume_starts_over(self):
+        first = journal.Journal(self.filename)
+        first.record('site', 'HQ')
+        first.close()
+
+        restarted = self.reopen(False)
+        self.assertFalse(restarted.resumed)
+        self.assertFalse(restarted.is_done('site', 'HQ'))
+        restarted.close()
+        self.assertEqual(os.path.getsize(self.filename), 0)
+
+    def test_resume_without_a_journal(self):
+        resumed = self.reopen(True)
+        self.assertFalse(resumed.resumed)
+        self.assertFalse(resumed.phase_done('sites'))
+
+    def test_line_cut_short_is_ignored(self):
+        with open(self.filename, 'w') as journal_file:
+            journal_file.write('{"kind": "site", "name": "HQ", "value": null}\n{"kind": "site", "na')
+        resumed = journal.Journal(self.filename, True)
+        self.assertTrue(resumed.is_done('site', 'HQ'))
+        resumed.record('site', 'Annex')
+        resumed.close()
+
+        # The next entry went on a line of its own
+        self.assertTrue(self.reopen(True).is_done('site', 'Annex'))
+
+
+class ResumeTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        names = ('sites_filename', 'users_filename', 'groups_filename', 'journal_filename', 'resume',
+                 'only_users', 'only_groups', 'baseline_time_str', 'xmod_url')
+        saved_config = {name: getattr(config, name) for name in names}
+        saved = (processor._journal, processor._logger, processor._session, processor._cache)
+        def restore():
+            for name, value in saved_config.items():
+                setattr(config, name, value)
+            processor._journal, processor._logger, processor._session, processor._cache = saved
+            for shared in _SHARED:
+                shared.clear()
+        self.addCleanup(restore)
+        for kind, records in (('sites', SITES), ('users', USERS), ('groups', GROUPS)):
+            filename = os.path.join(directory.name, kind + '.json')
+            with open(filename, 'w') as capture_file:
+                json.dump(records, capture_file)
+            setattr(config, kind + '_filename', filename)
+        config.journal_filename = os.path.join(directory.name, 'journal.jsonl')
+        config.only_users = None
+        config.only_groups = None
+        config.baseline_time_str = None
+        config.xmod_url = 'https://example.xmatters.com'
+        processor._logger = logging.getLogger(__name__)
+        processor._cache = None
+        self.instance = planner.SimulatedInstance()
+
+    def restore(self, resume: bool, fail=lambda url, body: False):
+        """Runs a restore of every phase, as a new run would"""
+        for shared in _SHARED:
+            shared.clear()
+        config.resume = resume
+        processor._session = _FailingSession(self.instance, fail)
+        processor._journal = processor._open_journal()
+        try:
+            processor._run_phases(['sites', 'users', 'devices', 'groups', 'shifts'])
+        finally:
+            processor._journal.close()
+
+    def test_resume_retries_what_failed(self):
+        # bob's Device and Shift Member fail the first time around
+        def fail(url, body):
+            if body.get('emailAddress') == 'bob@example.com':
+                return True
+            return 'recipient' in body and body['recipient']['id'] == processor._user_dict['bob']
+        self.restore(False, fail)
+        resumed = journal.Journal(config.journal_filename, True)
+        resumed.close()
+        self.assertTrue(resumed.phase_done('sites'))
+        self.assertTrue(resumed.phase_done('groups'))
+        self.assertFalse(resumed.phase_done('users'))
+        self.assertFalse(resumed.phase_done('shifts'))
+        self.assertFalse(resumed.is_done('user', 'bob'))
+        self.assertFalse(resumed.is_done('shifts', 'ops'))
+
+        self.restore(True)
+        self.assertEqual(sorted(device['targetName'] for device in self.instance._devices.values()),
+                         ['amy|Work Email', 'bob|Work Email'])
+        people = {person['id']: person['targetName'] for person in self.instance._people.values()}
+        group = next(iter(self.instance._groups.values()))
+        self.assertEqual([people[member['recipient']['id']] for member in group['_shifts']['Day']['_members']],
+                         ['amy', 'bob'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+"""Tests remembering the payloads restored to an instance"""
+
+import os
+import tempfile
+import unittest
+
+import payload_cache
+
+URL = 'https://example.xmatters.com'
+
+
+class PayloadCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.filename = os.path.join(directory.name, 'restore-cache.db')
+
+    def open(self, url: str = URL) -> payload_cache.PayloadCache:
+        cache = payload_cache.PayloadCache(self.filename, url)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_unchanged_payload_is_a_hit(self):
+        cache = self.open()
+        self.assertIsNone(cache.lookup('user', 'amy', b'1'))
+        cache.store('user', 'amy', b'1', 'a1')
+        self.assertEqual(cache.lookup('user', 'amy', b'1'), 'a1')
+        self.assertEqual(cache.hits, 1)
+
+    def test_changed_payload_is_a_miss(self):
+        cache = self.open()
+        cache.store('user', 'amy', b'1', 'a1')
+        self.assertIsNone(cache.lookup('user', 'amy', b'2'))
+        cache.store('user', 'amy', b'2', 'a2')
+        self.assertEqual(cache.lookup('user', 'amy', b'2'), 'a2')
+        self.assertIsNone(cache.lookup('user', 'amy', b'1'))
+        self.assertEqual(cache.hits, 1)
+
+    def test_kept_per_instance_and_kind(self):
+        cache = payload_cache.PayloadCache(self.filename, URL)
+        cache.store('user', 'amy', b'1', 'a1')
+        self.assertIsNone(cache.lookup('group', 'amy', b'1'))
+        cache.close()
+        self.assertIsNone(self.open('https://other.xmatters.com').lookup('user', 'amy', b'1'))
+
+    def test_saved_on_close(self):
+        cache = payload_cache.PayloadCache(self.filename, URL)
+        cache.store('site', 'HQ', b'1', 's1')
+        cache.close()
+        self.assertEqual(self.open().lookup('site', 'HQ', b'1'), 's1')
+
+
+if __name__ == '__main__':
+    unittest.main()
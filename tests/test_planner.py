@@ -0,0 +1,39 @@
+"""Tests the simulated instance that answers a restore plan's requests"""
+
+import unittest
+
+import planner
+
+
+class SimulatedInstanceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.instance = planner.SimulatedInstance()
+
+    def test_duplicates_are_refused_as_xmatters_does(self):
+        self.assertEqual(self.instance.handle('POST', 'sites', body={'name': 'HQ'})[0], 201)
+        self.assertEqual(self.instance.handle('POST', 'sites', body={'name': 'HQ'})[0], 409)
+        self.assertEqual(self.instance.handle('POST', 'people', body={'targetName': 'amy'})[0], 201)
+        self.assertEqual(self.instance.handle('POST', 'people', body={'targetName': 'amy'})[0], 409)
+        status, group = self.instance.handle('POST', 'groups', body={'targetName': 'ops'})
+        self.assertEqual(status, 201)
+        self.assertEqual(self.instance.handle('POST', 'groups', body={'targetName': 'ops'})[0], 409)
+
+        # processor._add_shifts() expects a 501 for a Shift that already exists
+        shifts = 'groups/' + group['id'] + '/shifts'
+        self.assertEqual(self.instance.handle('POST', shifts, body={'name': 'Day'})[0], 201)
+        self.assertEqual(self.instance.handle('POST', shifts, body={'name': 'Day'})[0], 501)
+
+    def test_update_by_id(self):
+        _, site = self.instance.handle('POST', 'sites', body={'name': 'HQ'})
+        status, updated = self.instance.handle('POST', 'sites', body={'id': site['id'], 'name': 'HQ', 'city': 'Oslo'})
+        self.assertEqual(status, 200)
+        self.assertEqual(updated['city'], 'Oslo')
+
+    def test_endpoint(self):
+        url = 'https://example.xmatters.com/api/xm/1/groups/abc/shifts/Day/members'
+        self.assertEqual(planner.endpoint(url), '/groups/{id}/shifts/{id}/members')
+
+
+if __name__ == '__main__':
+    unittest.main()
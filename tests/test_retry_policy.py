@@ -0,0 +1,29 @@
+"""Tests which responses the retry policy retries"""
+
+import unittest
+
+import retry_policy
+
+
+class ShouldRetryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.policy = retry_policy.RetryPolicy(5, 100)
+
+    def test_temporary_failures_are_retried(self):
+        for status_code in (429, 502, 503, 504):
+            self.assertTrue(self.policy.should_retry(status_code), status_code)
+            self.assertTrue(self.policy.should_retry(status_code, resilient=True), status_code)
+
+    def test_501_is_only_retried_when_resilient(self):
+        # Adding a Shift that already exists is answered with a 501
+        self.assertFalse(self.policy.should_retry(501))
+        self.assertTrue(self.policy.should_retry(501, resilient=True))
+
+    def test_other_statuses_are_final(self):
+        for status_code in (200, 201, 400, 404, 409, 500):
+            self.assertFalse(self.policy.should_retry(status_code, resilient=True), status_code)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+"""Tests the order the schedulers run dependent tasks in"""
+
+import asyncio
+import threading
+import unittest
+
+import scheduler
+
+# Submitted in this order: a User before its Site, and Shifts before the
+# User and Group among their Members
+TASKS = [
+    (('users', 'amy'), [('sites', 'HQ')]),
+    (('groups', 'ops'), [('users', 'amy')]),
+    (('shifts', 'ops'), [('groups', 'ops'), ('users', 'bob'), ('groups', 'dev')]),
+    (('sites', 'HQ'), []),
+    (('users', 'bob'), [('sites', 'HQ'), ('sites', 'Annex')]),
+    (('groups', 'dev'), [('users', 'bob'), ('users', 'zed')]),
+]
+KINDS = ('sites', 'users', 'groups', 'shifts')
+
+
+class _Recorder:
+    """Notes the order the tasks finished in, and each kind's finish"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.order = []
+
+    def task(self, key):
+        def run():
+            with self.lock:
+                self.order.append(key)
+        return run
+
+    def async_task(self, key):
+        async def run():
+            await asyncio.sleep(0)
+            self.order.append(key)
+        return run
+
+    def finish(self, kind):
+        with self.lock:
+            self.order.append(kind)
+
+
+class SchedulerTest(unittest.TestCase):
+
+    def assertOrdered(self, order):
+        # Every task ran once, after the tasks it depends on, and each kind
+        # finished after all of its tasks
+        self.assertCountEqual(order, [key for key, _ in TASKS] + list(KINDS))
+        for key, deps in TASKS:
+            for dep in deps:
+                if dep in order:
+                    self.assertLess(order.index(dep), order.index(key), (dep, key))
+            self.assertLess(order.index(key), order.index(key[0]))
+
+    def test_threads_run_dependencies_first(self):
+        recorder = _Recorder()
+        with scheduler.Scheduler(4, recorder.finish) as tasks:
+            for kind in KINDS:
+                tasks.open(kind)
+            for key, deps in TASKS:
+                tasks.submit(key, recorder.task(key), deps)
+            for kind in KINDS:
+                tasks.close(kind)
+            tasks.wait()
+        self.assertOrdered(recorder.order)
+
+    def test_tasks_run_dependencies_first(self):
+        recorder = _Recorder()
+        async def run():
+            tasks = scheduler.AsyncScheduler(4, recorder.finish)
+            for kind in KINDS:
+                tasks.open(kind)
+            for key, deps in TASKS:
+                await tasks.submit(key, recorder.async_task(key), deps)
+            for kind in KINDS:
+                tasks.close(kind)
+            await tasks.wait()
+        asyncio.run(run())
+        self.assertOrdered(recorder.order)
+
+    def test_waits_for_an_open_kind_only(self):
+        recorder = _Recorder()
+        with scheduler.Scheduler(2, recorder.finish) as tasks:
+            tasks.open('users')
+            # Sites were never opened, so the Site is taken to exist
+            tasks.submit(('users', 'amy'), recorder.task(('users', 'amy')), [('sites', 'HQ')])
+            # bob is never submitted, so ops waits until users is closed
+            tasks.submit(('groups', 'ops'), recorder.task(('groups', 'ops')), [('users', 'bob')])
+            tasks.close('users')
+            tasks.close('groups')
+            tasks.wait()
+        self.assertEqual(recorder.order[0], ('users', 'amy'))
+        self.assertIn(('groups', 'ops'), recorder.order)
+        self.assertLess(recorder.order.index('users'), recorder.order.index('groups'))
+
+    def test_circular_dependency(self):
+        with scheduler.Scheduler(2) as tasks:
+            tasks.open('groups')
+            tasks.submit(('groups', 'a'), lambda: None, [('groups', 'b')])
+            tasks.submit(('groups', 'b'), lambda: None, [('groups', 'a')])
+            tasks.close('groups')
+            with self.assertRaises(RuntimeError):
+                tasks.wait()
+
+    def test_failed_task(self):
+        def fail():
+            raise ValueError('failed')
+        with scheduler.Scheduler(2) as tasks:
+            tasks.open('sites')
+            tasks.submit(('sites', 'HQ'), fail)
+            tasks.close('sites')
+            with self.assertRaises(ValueError):
+                tasks.wait()
+
+
+if __name__ == '__main__':
+    unittest.main()